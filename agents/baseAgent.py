@@ -1,14 +1,21 @@
 import os
-import json
 import logging
-import re
 from string import Template
 import functools
 import asyncio
 
 import yaml
-from openai import AsyncOpenAI
-from dotenv import load_dotenv
+
+from agents.jsonRepair import JSONRepairError, parse_json_response
+from agents.endpointBalancer import get_endpoint_pool
+from agents.modelRouter import RouteConfigError, expand_endpoints, get_client, load_agent_config, resolve_route
+from deadline import current_deadline, run_stage
+from metrics import LLM_TOKENS, histogram, counter
+from utils import get_env, load_env
+
+LLM_CALL_SECONDS = histogram('insightfocus_llm_call_seconds', '单次大模型调用耗时（秒）', ('agent', 'route', 'model'))
+LLM_CALL_ERRORS = counter('insightfocus_llm_call_errors_total', '大模型调用失败次数', ('agent', 'route', 'model'))
+LLM_JSON_FAILURES = counter('insightfocus_llm_json_failures_total', '本地修复后仍无法使用的AI响应数', ('agent', 'task'))
 
 class ConfigError(Exception):
     pass
@@ -29,54 +36,108 @@ def async_retry(max_tries=3, delay_seconds=1):
                     if tries == max_tries:
                         logging.error(f"函数 {func.__name__} 在 {max_tries} 次尝试后失败: {str(e)}")
                         raise
+                    # 条目的时间预算不足以再重试一次时直接放弃
+                    deadline = current_deadline()
+                    if deadline is not None and deadline.remaining() <= delay_seconds:
+                        logging.warning(f"函数 {func.__name__} 失败且剩余时间预算不足，不再重试: {str(e)}")
+                        raise
                     logging.warning(f"函数 {func.__name__} 失败，正在重试 ({tries}/{max_tries}): {str(e)}")
                     await asyncio.sleep(delay_seconds)
         return wrapper
     return decorator    # ... (保持原有实现不变)
 
 def load_config():
-    load_dotenv()
+    load_env()
     with open(os.path.join('./conf', 'prompts.yaml'), 'r', encoding='utf-8') as file:
         prompts = yaml.safe_load(file)
     return prompts
 
+def load_schemas():
+    with open(os.path.join('./conf', 'schemas.yaml'), 'r', encoding='utf-8') as file:
+        return yaml.safe_load(file) or {}
+
 PROMPTS = load_config()
+SCHEMAS = load_schemas()
 
 class BaseAgent:
     def __init__(self, config_name):
+        self.config_name = config_name
+        try:
+            self.config = load_agent_config(config_name)
+        except RouteConfigError as e:
+            raise ConfigError(str(e))
         self.client = self.create_ai_client(config_name)
-        self.config = json.loads(os.getenv(f'{config_name}_CONFIG'))
 
-    def create_ai_client(self, config_name):
+    def create_ai_client(self, config_name, route=None):
         try:
-            config = json.loads(os.getenv(f'{config_name}_CONFIG'))
-            return AsyncOpenAI(api_key=config['api_key'], base_url=config['base_url'])
-        except (json.JSONDecodeError, KeyError) as e:
+            return get_client(expand_endpoints(resolve_route(route, self.config))[0])
+        except RouteConfigError as e:
             raise ConfigError(f"Invalid configuration for {config_name}: {str(e)}")
 
-    @async_retry(max_tries=3, delay_seconds=2)
-    async def call_ai_api(self, system_message, user_message):
+    def get_route_config(self, route):
         try:
-            response = await self.client.chat.completions.create(
-                model=self.config['model'],
-                messages=[
-                    {"role": "system", "content": system_message},
-                    {"role": "user", "content": user_message}
-                ]
-            )
-            content = response.choices[0].message.content
-            try:
-                return json.loads(content)
-            except json.JSONDecodeError:
-                json_match = re.search(r'\{.*\}', content, re.DOTALL)
-                if json_match:
-                    return json.loads(json_match.group(0))
-                else:
-                    logging.error(f"无法解析 AI 响应为 JSON: {content}")
-                    raise ValueError("Invalid JSON response from AI")
-        except Exception as e:
-            logging.error(f"AI API 调用失败: {str(e)}")
+            return resolve_route(route, self.config)
+        except RouteConfigError as e:
+            raise ConfigError(str(e))
+
+    def build_response_format(self, config, task):
+        """按模型配置中的response_format开启JSON模式：json_object 或 json_schema（使用任务schema）"""
+        mode = config.get('response_format')
+        if mode == 'json_object':
+            return {"type": "json_object"}
+        if mode == 'json_schema' and task in SCHEMAS:
+            return {"type": "json_schema", "json_schema": {"name": task, "schema": SCHEMAS[task]}}
+        return None
+
+    def parse_response(self, content, task=None):
+        try:
+            return parse_json_response(content, SCHEMAS.get(task) if task else None)
+        except JSONRepairError as e:
+            LLM_JSON_FAILURES.inc(agent=self.config_name, task=task or 'default')
+            logging.error(f"无法解析 AI 响应为 JSON: {str(e)}: {content}")
             raise
 
+    @async_retry(max_tries=3, delay_seconds=2)
+    async def call_ai_api(self, system_message, user_message, route=None, task=None):
+        """调用大模型并解析JSON结果，route为MODEL_ROUTES中的路由名，未配置时使用agent自身的模型；
+        task对应conf/schemas.yaml中的响应结构，用于本地修复后的校验"""
+        config = self.get_route_config(route)
+        route_label = route or 'default'
+        # 配置了多个等价端点时按负载与耗时选择端点，可选对冲请求
+        pool = get_endpoint_pool(expand_endpoints(config), hedge=config.get('hedge', get_env('LLM_HEDGE', False, bool)))
+        messages = [
+            {"role": "system", "content": system_message},
+            {"role": "user", "content": user_message}
+        ]
+
+        async def send(endpoint):
+            request = {"model": endpoint.model, "messages": messages}
+            response_format = self.build_response_format(config, task)
+            if response_format:
+                request["response_format"] = response_format
+            try:
+                with LLM_CALL_SECONDS.time(agent=self.config_name, route=route_label, model=endpoint.model):
+                    response = await endpoint.client.chat.completions.create(**request)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                LLM_CALL_ERRORS.inc(agent=self.config_name, route=route_label, model=endpoint.model)
+                logging.error(f"AI API 调用失败（{endpoint.base_url}）: {str(e)}")
+                raise
+            self._record_usage(route_label, endpoint.model, response)
+            return response
+
+        response = await run_stage('llm', pool.call(send))
+        return self.parse_response(response.choices[0].message.content, task)
+
+    def _record_usage(self, route, model, response):
+        usage = getattr(response, 'usage', None)
+        if usage is None:
+            return
+        for kind in ('prompt_tokens', 'completion_tokens'):
+            value = getattr(usage, kind, None)
+            if value:
+                LLM_TOKENS.inc(value, agent=self.config_name, route=route, model=model, kind=kind.split('_')[0])
+
 
 
@@ -0,0 +1,180 @@
+import asyncio
+import logging
+import time
+from collections import deque
+
+from agents.modelRouter import get_client
+from metrics import counter, gauge
+from utils import get_env
+
+LLM_ENDPOINT_OUTSTANDING = gauge('insightfocus_llm_endpoint_outstanding', '各大模型端点进行中的请求数', ('endpoint',))
+LLM_ENDPOINT_LATENCY = gauge('insightfocus_llm_endpoint_latency_ewma_seconds', '各大模型端点耗时的指数移动平均（秒）', ('endpoint',))
+LLM_HEDGES = counter('insightfocus_llm_hedges_total', '对冲请求数及其结果', ('result',))
+LLM_ENDPOINT_FAILOVERS = counter('insightfocus_llm_endpoint_failovers_total', '端点出错后改用其它端点重试的次数')
+
+_endpoints = {}
+_pools = {}
+
+
+class Endpoint:
+    """一个等价的模型端点（base_url + api_key + model），统计信息在所有agent之间共享"""
+
+    def __init__(self, base_url, api_key, model, alpha=0.2, window=200):
+        self.base_url = base_url
+        self.api_key = api_key
+        self.model = model
+        self.name = f'{base_url}#{model}'
+        self.alpha = alpha
+        self.outstanding = 0
+        self.ewma = None
+        self.failures = 0
+        self.cooldown_until = 0.0
+        self._latencies = deque(maxlen=window)
+        self._p95 = None
+
+    @property
+    def client(self):
+        return get_client({'base_url': self.base_url, 'api_key': self.api_key})
+
+    def begin(self):
+        self.outstanding += 1
+        LLM_ENDPOINT_OUTSTANDING.set(self.outstanding, endpoint=self.name)
+        return time.monotonic()
+
+    def end(self, started, ok, cooldown):
+        self.outstanding -= 1
+        LLM_ENDPOINT_OUTSTANDING.set(self.outstanding, endpoint=self.name)
+        if ok:
+            elapsed = time.monotonic() - started
+            self.ewma = elapsed if self.ewma is None else self.alpha * elapsed + (1 - self.alpha) * self.ewma
+            self._latencies.append(elapsed)
+            self._p95 = None
+            self.failures = 0
+            LLM_ENDPOINT_LATENCY.set(self.ewma, endpoint=self.name)
+        else:
+            # 连续失败的端点暂时降低优先级，冷却时间随失败次数加倍
+            self.failures += 1
+            self.cooldown_until = time.monotonic() + cooldown * 2 ** min(self.failures - 1, 6)
+
+    def p95(self, min_samples=20):
+        if len(self._latencies) < min_samples:
+            return None
+        if self._p95 is None:
+            ordered = sorted(self._latencies)
+            self._p95 = ordered[int(len(ordered) * 0.95) - 1]
+        return self._p95
+
+    def score(self, now, default_ewma):
+        """越小越优先：冷却中的端点排在最后，其余按 (进行中请求数 + 1) × 耗时EWMA；
+        尚无耗时数据的端点按池中最快端点的EWMA估计，以便被试探"""
+        cooling = self.cooldown_until > now
+        return cooling, (self.outstanding + 1) * (self.ewma if self.ewma is not None else default_ewma)
+
+
+class EndpointPool:
+    """在一组等价端点之间做负载均衡：选 进行中请求数 × 耗时EWMA 最小的端点。
+    开启对冲时，若首个请求超过该端点的p95耗时仍未返回，向另一个端点发送相同请求，先返回者胜出，另一个被取消"""
+
+    def __init__(self, endpoints, hedge=False, hedge_min_delay=None, cooldown=None):
+        self.endpoints = endpoints
+        self.hedge = hedge and len(endpoints) > 1
+        self.hedge_min_delay = hedge_min_delay if hedge_min_delay is not None else get_env('LLM_HEDGE_MIN_DELAY', 1.0, float)
+        self.cooldown = cooldown if cooldown is not None else get_env('LLM_ENDPOINT_COOLDOWN', 5.0, float)
+
+    def pick(self, exclude=()):
+        candidates = [endpoint for endpoint in self.endpoints if endpoint not in exclude]
+        if not candidates:
+            return None
+        now = time.monotonic()
+        known = [endpoint.ewma for endpoint in self.endpoints if endpoint.ewma is not None]
+        default_ewma = min(known) if known else 1.0
+        return min(candidates, key=lambda endpoint: endpoint.score(now, default_ewma))
+
+    def _send(self, endpoint, send):
+        # 选中端点时立即计入进行中请求数，同一时刻发起的请求才能被分散到不同端点
+        return self._track(endpoint, endpoint.begin(), send)
+
+    async def _track(self, endpoint, started, send):
+        ok = False
+        try:
+            result = await send(endpoint)
+            ok = True
+            return result
+        except asyncio.CancelledError:
+            # 被取消的对冲请求不计为端点失败，也不计入耗时统计
+            ok = None
+            raise
+        finally:
+            if ok is None:
+                endpoint.outstanding -= 1
+                LLM_ENDPOINT_OUTSTANDING.set(endpoint.outstanding, endpoint=endpoint.name)
+            else:
+                endpoint.end(started, ok, self.cooldown)
+
+    async def call(self, send):
+        """send(endpoint) 为发送请求的协程函数，返回其结果。请求出错（非取消）时换一个未尝试过的端点重试一次，
+        所有尝试的端点都失败时抛出最后一个异常"""
+        primary = self.pick()
+        tried = [primary]
+        try:
+            if self.hedge:
+                return await self._hedged(primary, send, tried)
+            return await self._send(primary, send)
+        except Exception as e:
+            fallback = self.pick(exclude=tried)
+            if fallback is None:
+                raise
+            LLM_ENDPOINT_FAILOVERS.inc()
+            logging.warning("端点 %s 调用失败（%s），改用 %s 重试", tried[-1].name, e, fallback.name)
+            return await self._send(fallback, send)
+
+    async def _hedged(self, primary, send, tried):
+        # 端点积累足够样本、有了p95之后才对冲
+        p95 = primary.p95()
+        delay = max(p95, self.hedge_min_delay) if p95 is not None else None
+        first = asyncio.create_task(self._send(primary, send))
+        tasks = {first: primary}
+        try:
+            if delay is not None:
+                done, _ = await asyncio.wait({first}, timeout=delay)
+                if not done:
+                    secondary = self.pick(exclude=(primary,))
+                    if secondary is not None:
+                        LLM_HEDGES.inc(result='sent')
+                        logging.debug("端点 %s 超过p95（%.2f秒）未返回，向 %s 发送对冲请求", primary.name, delay, secondary.name)
+                        tasks[asyncio.create_task(self._send(secondary, send))] = secondary
+                        tried.append(secondary)
+
+            error = None
+            pending = set(tasks)
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if len(tasks) > 1:
+                            LLM_HEDGES.inc(result='hedge_won' if task is not first else 'primary_won')
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+
+
+def _endpoint(config):
+    key = (config['base_url'], config['api_key'], config['model'])
+    endpoint = _endpoints.get(key)
+    if endpoint is None:
+        endpoint = _endpoints[key] = Endpoint(*key)
+    return endpoint
+
+
+def get_endpoint_pool(endpoint_configs, hedge=False):
+    """按端点组合复用EndpointPool，endpoint_configs为含base_url、api_key、model的配置列表"""
+    endpoints = tuple(_endpoint(config) for config in endpoint_configs)
+    key = (tuple(endpoint.name for endpoint in endpoints), hedge)
+    pool = _pools.get(key)
+    if pool is None:
+        pool = _pools[key] = EndpointPool(list(endpoints), hedge)
+    return pool
@@ -0,0 +1,295 @@
+import json
+import re
+
+# 模型常把JSON包在```json代码块中，或在前后附带说明文字
+_FENCE_RE = re.compile(r'```(?:json|JSON)?\s*(.*?)(?:```|$)', re.DOTALL)
+_LITERALS = {'True': 'true', 'False': 'false', 'None': 'null'}
+_CLOSERS = {'{': '}', '[': ']'}
+
+
+class JSONRepairError(ValueError):
+    pass
+
+
+def _strip_fence(text):
+    match = _FENCE_RE.search(text)
+    if match and match.group(1).strip():
+        return match.group(1)
+    return text
+
+
+def _find_start(text):
+    positions = [pos for pos in (text.find('{'), text.find('[')) if pos != -1]
+    return min(positions) if positions else -1
+
+
+def _drop_dangling(out):
+    """去掉截断处残留的逗号、冒号以及缺少值的键"""
+    while True:
+        stripped = ''.join(out).rstrip()
+        if stripped.endswith(','):
+            out[:] = list(stripped[:-1])
+            continue
+        if stripped.endswith(':'):
+            # 去掉整个 "key": 片段
+            body = stripped[:-1].rstrip()
+            if body.endswith('"'):
+                start = body.rfind('"', 0, len(body) - 1)
+                while start > 0 and body[start - 1] == '\\':
+                    start = body.rfind('"', 0, start - 1)
+                body = body[:start] if start != -1 else body
+            out[:] = list(body)
+            continue
+        if stripped.endswith('"') and _is_dangling_key(stripped):
+            start = stripped.rfind('"', 0, len(stripped) - 1)
+            out[:] = list(stripped[:start])
+            continue
+        out[:] = list(stripped)
+        return
+
+
+def _is_dangling_key(text):
+    """对象中末尾只有一个孤立的字符串（即缺少冒号和值的键）"""
+    start = text.rfind('"', 0, len(text) - 1)
+    if start == -1:
+        return False
+    before = text[:start].rstrip()
+    return before.endswith('{') or (before.endswith(',') and _innermost(before) == '{')
+
+
+def _innermost(text):
+    stack = []
+    in_string = False
+    escape = False
+    for ch in text:
+        if in_string:
+            if escape:
+                escape = False
+            elif ch == '\\':
+                escape = True
+            elif ch == '"':
+                in_string = False
+        elif ch == '"':
+            in_string = True
+        elif ch in _CLOSERS:
+            stack.append(ch)
+        elif ch in '}]' and stack:
+            stack.pop()
+    return stack[-1] if stack else None
+
+
+def repair_json(text):
+    """将模型输出修复为合法JSON文本：去除代码块与前后说明、单引号转双引号、
+    Python字面量转换、去掉注释和多余逗号，并补全被截断的字符串与括号"""
+    if text is None:
+        raise JSONRepairError("AI 响应为空")
+    text = _strip_fence(text)
+    start = _find_start(text)
+    if start == -1:
+        raise JSONRepairError("AI 响应中没有JSON对象")
+
+    out = []
+    stack = []
+    quote = None
+    escape = False
+    i = start
+    length = len(text)
+    while i < length:
+        ch = text[i]
+        if quote:
+            if escape:
+                escape = False
+                if quote == "'" and ch == "'":
+                    # 单引号字符串里的 \' 在JSON中不需要转义
+                    out[-1] = "'"
+                else:
+                    out.append(ch)
+            elif ch == '\\':
+                escape = True
+                out.append(ch)
+            elif ch == quote:
+                # 字符串内未转义的引号：其后不是分隔符时视为正文的一部分
+                following = text[i + 1:].lstrip()[:1]
+                if following and following not in ',:}]"\'':
+                    out.append('\\"' if ch == '"' else ch)
+                else:
+                    quote = None
+                    out.append('"')
+            elif ch == '"':
+                out.append('\\"')
+            elif ch == '\n':
+                out.append('\\n')
+            elif ch == '\r':
+                out.append('\\r')
+            elif ch == '\t':
+                out.append('\\t')
+            else:
+                out.append(ch)
+            i += 1
+            continue
+
+        if ch in ('"', "'"):
+            quote = ch
+            out.append('"')
+        elif ch in _CLOSERS:
+            stack.append(ch)
+            out.append(ch)
+        elif ch in '}]':
+            if not stack:
+                break
+            # 去掉 }/] 之前多余的逗号
+            while out and out[-1].isspace():
+                out.pop()
+            if out and out[-1] == ',':
+                out.pop()
+            out.append(_CLOSERS[stack.pop()])
+            if not stack:
+                i += 1
+                break
+        elif ch == '#' or (ch == '/' and text[i + 1:i + 2] == '/'):
+            newline = text.find('\n', i)
+            i = length if newline == -1 else newline
+            continue
+        elif ch.isalpha() or ch == '_':
+            word = re.match(r'\w+', text[i:]).group(0)
+            i += len(word)
+            literal = _LITERALS.get(word, word)
+            if literal in ('true', 'false', 'null'):
+                out.append(literal)
+            else:
+                # 未加引号的键或字符串值
+                out.append(json.dumps(word, ensure_ascii=False))
+            continue
+        else:
+            out.append(ch)
+        i += 1
+
+    if quote:
+        if escape:
+            out.pop()
+        out.append('"')
+    if stack:
+        _drop_dangling(out)
+        # 丢弃残缺键值后，需要按实际剩余内容重新计算未闭合的括号
+        remaining = []
+        in_string = False
+        escaped = False
+        for ch in out:
+            if in_string:
+                if escaped:
+                    escaped = False
+                elif ch == '\\':
+                    escaped = True
+                elif ch == '"':
+                    in_string = False
+            elif ch == '"':
+                in_string = True
+            elif ch in _CLOSERS:
+                remaining.append(ch)
+            elif ch in '}]' and remaining:
+                remaining.pop()
+        out.extend(_CLOSERS[opener] for opener in reversed(remaining))
+    return ''.join(out)
+
+
+def _coerce(value, expected):
+    """对小模型常见的类型偏差做本地纠正，例如 "3" -> 3、"true" -> True"""
+    if expected == 'integer':
+        if isinstance(value, str) and re.fullmatch(r'\s*-?\d+\s*', value):
+            return int(value)
+        if isinstance(value, float) and value.is_integer():
+            return int(value)
+    elif expected == 'number':
+        if isinstance(value, str):
+            try:
+                return float(value)
+            except ValueError:
+                return value
+    elif expected == 'boolean':
+        if isinstance(value, str) and value.strip().lower() in ('true', 'false', '是', '否', 'yes', 'no'):
+            return value.strip().lower() in ('true', '是', 'yes')
+        if isinstance(value, int) and value in (0, 1):
+            return bool(value)
+    elif expected == 'array':
+        if isinstance(value, str):
+            return [part.strip() for part in re.split(r'[,，、]', value) if part.strip()]
+    elif expected == 'string':
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            return str(value)
+        if isinstance(value, list):
+            return '\n'.join(str(part) for part in value)
+    return value
+
+
+_TYPE_CHECKS = {
+    'object': lambda v: isinstance(v, dict),
+    'array': lambda v: isinstance(v, list),
+    'string': lambda v: isinstance(v, str),
+    'integer': lambda v: isinstance(v, int) and not isinstance(v, bool),
+    'number': lambda v: isinstance(v, (int, float)) and not isinstance(v, bool),
+    'boolean': lambda v: isinstance(v, bool),
+    'null': lambda v: v is None,
+}
+
+
+def validate(value, schema, path='$'):
+    """按JSON Schema的常用子集（type/properties/required/items/enum/minimum/maximum/maxItems）
+    校验并纠正结果，返回 (纠正后的值, 错误列表)"""
+    errors = []
+    expected = schema.get('type')
+    types = expected if isinstance(expected, list) else [expected] if expected else []
+    if types and not any(_TYPE_CHECKS[t](value) for t in types):
+        for t in types:
+            coerced = _coerce(value, t)
+            if _TYPE_CHECKS[t](coerced):
+                value = coerced
+                break
+        else:
+            return value, [f"{path}: 期望类型 {expected}，实际为 {type(value).__name__}"]
+
+    if 'enum' in schema and value not in schema['enum']:
+        errors.append(f"{path}: {value!r} 不在可选值 {schema['enum']} 中")
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        if 'minimum' in schema and value < schema['minimum']:
+            errors.append(f"{path}: {value} 小于 {schema['minimum']}")
+        if 'maximum' in schema and value > schema['maximum']:
+            errors.append(f"{path}: {value} 大于 {schema['maximum']}")
+
+    if isinstance(value, dict):
+        for key in schema.get('required', []):
+            if key not in value:
+                errors.append(f"{path}: 缺少字段 {key}")
+        for key, sub_schema in schema.get('properties', {}).items():
+            if key in value:
+                value[key], sub_errors = validate(value[key], sub_schema, f"{path}.{key}")
+                errors.extend(sub_errors)
+    elif isinstance(value, list):
+        if 'maxItems' in schema and len(value) > schema['maxItems']:
+            # 超出数量限制时直接截断，不值得为此重新请求
+            value = value[:schema['maxItems']]
+        if 'items' in schema:
+            checked = []
+            for index, item in enumerate(value):
+                item, sub_errors = validate(item, schema['items'], f"{path}[{index}]")
+                checked.append(item)
+                errors.extend(sub_errors)
+            value = checked
+    return value, errors
+
+
+def parse_json_response(content, schema=None):
+    """解析模型输出的JSON，失败时先在本地修复，再按schema校验；仍不可用时抛出JSONRepairError"""
+    try:
+        result = json.loads(content, strict=False)
+    except (json.JSONDecodeError, TypeError):
+        repaired = repair_json(content)
+        try:
+            result = json.loads(repaired, strict=False)
+        except json.JSONDecodeError as e:
+            raise JSONRepairError(f"修复后仍无法解析JSON: {str(e)}")
+
+    if schema:
+        result, errors = validate(result, schema)
+        if errors:
+            raise JSONRepairError(f"AI 响应不符合schema: {'; '.join(errors)}")
+    return result
@@ -0,0 +1,88 @@
+import json
+import os
+
+from config import ConfigError, get_settings
+
+# 可路由的任务：SummaryAgent的五档内容模板，以及分类、相关性判断与关注点编译
+CONTENT_TIERS = ('veryshort', 'short', 'normal', 'longer', 'longest')
+ROUTE_NAMES = CONTENT_TIERS + ('classify', 'relevance', 'compile_focus')
+
+_clients = {}
+_routes = None
+
+
+class RouteConfigError(Exception):
+    pass
+
+
+def load_agent_config(config_name):
+    """从缓存的配置对象中取agent配置，不再每次实例化时重新解析JSON"""
+    try:
+        return get_settings().agent_config(config_name)
+    except ConfigError as e:
+        raise RouteConfigError(str(e))
+
+
+def load_routes():
+    """解析MODEL_ROUTES路由表，值可以是完整/部分的模型配置，或另一个*_CONFIG的前缀名"""
+    global _routes
+    if _routes is not None:
+        return _routes
+
+    get_settings()
+    raw = os.getenv('MODEL_ROUTES')
+    routes = {}
+    if raw:
+        try:
+            table = json.loads(raw)
+        except json.JSONDecodeError as e:
+            raise RouteConfigError(f"MODEL_ROUTES 不是合法的JSON: {str(e)}")
+        for name, target in table.items():
+            if name not in ROUTE_NAMES:
+                raise RouteConfigError(f"未知的路由名: {name}，可选值: {', '.join(ROUTE_NAMES)}")
+            if isinstance(target, str):
+                target = load_agent_config(target)
+            if not isinstance(target, dict):
+                raise RouteConfigError(f"路由 {name} 的配置必须是对象或配置名")
+            routes[name] = target
+    _routes = routes
+    return routes
+
+
+def expand_endpoints(config):
+    """配置中的endpoints为一组等价端点，每项可只写base_url，api_key、model等未写的字段沿用外层配置；
+    没有endpoints时外层配置本身就是唯一的端点"""
+    endpoints = config.get('endpoints')
+    if not endpoints:
+        return [config]
+    if not isinstance(endpoints, list):
+        raise RouteConfigError("endpoints 必须是数组")
+    base = {key: value for key, value in config.items() if key != 'endpoints'}
+    return [dict(base, **endpoint) for endpoint in endpoints]
+
+
+def resolve_route(route, default_config):
+    """返回路由对应的模型配置，未配置的字段沿用agent自身的配置"""
+    config = dict(default_config)
+    if route:
+        route_config = load_routes().get(route, {})
+        # 路由指定了单个端点时不再沿用agent配置中的端点列表
+        if 'base_url' in route_config and 'endpoints' not in route_config:
+            config.pop('endpoints', None)
+        config.update(route_config)
+    for endpoint in expand_endpoints(config):
+        missing = [key for key in ('api_key', 'base_url', 'model') if not endpoint.get(key)]
+        if missing:
+            raise RouteConfigError(f"路由 {route} 缺少配置项: {', '.join(missing)}")
+    return config
+
+
+def get_client(config):
+    """按endpoint复用AsyncOpenAI客户端，使同一端点的连接池在各agent实例间共享"""
+    key = (config['base_url'], config['api_key'])
+    client = _clients.get(key)
+    if client is None:
+        # openai SDK导入耗时较长，首次调用大模型时才导入
+        from openai import AsyncOpenAI
+        client = _clients[key] = AsyncOpenAI(api_key=config['api_key'], base_url=config['base_url'])
+    return client
@@ -1,30 +1,41 @@
 import logging
 from string import Template
-import tiktoken
+import functools
 from agents.baseAgent import PROMPTS, IntelligentAPIError, BaseAgent, ConfigError
 from conf.consts import GENRES, TOPICS
 
 
+@functools.lru_cache(maxsize=None)
+def get_encoding():
+    # tiktoken首次加载编码表较慢，第一次计算token数时才导入
+    import tiktoken
+    return tiktoken.get_encoding("cl100k_base")
+
+
 class SummaryAgent(BaseAgent):
     def __init__(self):
         super().__init__('CONTENT_PROCESSOR')
 
+    @staticmethod
+    def content_tier(content_token_count):
+        if content_token_count > 10000:
+            return 'longest'
+        elif content_token_count > 3000:
+            return 'longer'
+        elif content_token_count > 500:
+            return 'normal'
+        elif content_token_count > 100:
+            return 'short'
+        return 'veryshort'
+
     async def process_content(self, title, content):
         # 使用编码器计算token数
-        tokens = tiktoken.get_encoding("cl100k_base").encode(content)
+        tokens = get_encoding().encode(content)
         content_token_count =  len(tokens)
         
         # 根据token长度选择对应的模板
-        if content_token_count > 10000:
-            prompt_template = PROMPTS.get('process_content_longest')
-        elif content_token_count > 3000:
-            prompt_template = PROMPTS.get('process_content_longer')
-        elif content_token_count > 500:
-            prompt_template = PROMPTS.get('process_content_normal')
-        elif content_token_count > 100:
-            prompt_template = PROMPTS.get('process_content_short')
-        else:
-            prompt_template = PROMPTS.get('process_content_veryshort')
+        tier = self.content_tier(content_token_count)
+        prompt_template = PROMPTS.get(f'process_content_{tier}')
         
         if not prompt_template:
             raise ConfigError("process_content prompt not found")
@@ -32,7 +43,8 @@ class SummaryAgent(BaseAgent):
         prompt = Template(prompt_template).safe_substitute(title=title, content=content)
         
         try:
-            result = await self.call_ai_api(PROMPTS.get('process_content_system', ""), prompt)
+            # 各档位可在MODEL_ROUTES中路由到不同的模型，短内容走小模型，长内容走长上下文模型
+            result = await self.call_ai_api(PROMPTS.get('process_content_system', ""), prompt, route=tier, task='process_content')
             return {
                 'processed_content': result.get('processed_content', ''),
                 'summary': result.get('summary', ''),
@@ -42,20 +54,55 @@ class SummaryAgent(BaseAgent):
             logging.error(f"Content processing failed: {str(e)}")
             return {'processed_content': '', 'summary': '', 'tags': []}
 
-    async def classify_article(self, title, summary, tags):
+    @staticmethod
+    def categories_info():
         topics_info = "\n".join(f"{id}. {name}- {description}" for id, name, description in TOPICS)
         genres_info = "\n".join(f"{id}. {name} - {description}" for id, name, description in GENRES)
+        return topics_info, genres_info
+
+    async def classify_article(self, title, summary, tags):
+        topics_info, genres_info = self.categories_info()
 
         prompt = Template(PROMPTS['classify_article']).safe_substitute(
             topics_info=topics_info, genres_info=genres_info, title=title, summary=summary, tags=', '.join(tags)
         )
         
         try:
-            result = await self.call_ai_api(PROMPTS['classify_article_system'], prompt)
+            result = await self.call_ai_api(PROMPTS['classify_article_system'], prompt, route='classify', task='classify_article')
             return {
                 'topic_id': result.get('topic_id'),
                 'genre_id': result.get('genre_id')
             }
         except IntelligentAPIError as e:
             logging.error(f"Article genre and topic identification failed: {str(e)}")
-            return {'topic_id': None, 'genre_id': None}
\ No newline at end of file
+            return {'topic_id': None, 'genre_id': None}
+
+    async def classify_articles(self, articles, summary_limit=300):
+        """一次请求对多篇文章进行分类，articles为包含id/title/summary/tags的字典列表，返回 {id: {'topic_id', 'genre_id'}}；
+        模型漏掉的文章不会出现在结果中，由调用方决定是否单独重试"""
+        topics_info, genres_info = self.categories_info()
+        articles_info = "\n\n".join(
+            f"[{index}] 标题: {article['title']}\n摘要: {(article.get('summary') or '')[:summary_limit]}\n"
+            f"标签: {', '.join(article.get('tags') or [])}"
+            for index, article in enumerate(articles, 1)
+        )
+        prompt = Template(PROMPTS['classify_articles_batch']).safe_substitute(
+            topics_info=topics_info, genres_info=genres_info, articles_info=articles_info, count=len(articles)
+        )
+
+        try:
+            result = await self.call_ai_api(PROMPTS['classify_article_system'], prompt, route='classify',
+                                            task='classify_articles_batch')
+        except IntelligentAPIError as e:
+            logging.error(f"Batch article classification failed: {str(e)}")
+            return {}
+
+        classified = {}
+        for entry in result.get('results', []):
+            index = entry.get('index')
+            if 1 <= index <= len(articles):
+                classified[articles[index - 1]['id']] = {
+                    'topic_id': entry.get('topic_id'),
+                    'genre_id': entry.get('genre_id')
+                }
+        return classified
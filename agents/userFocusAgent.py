@@ -1,6 +1,7 @@
 import logging
 from string import Template
 from agents.baseAgent import PROMPTS, BaseAgent, ConfigError, IntelligentAPIError
+from agents.summaryAgent import SummaryAgent
 
 
 class UserFocusAgent(BaseAgent):
@@ -19,13 +20,31 @@ class UserFocusAgent(BaseAgent):
         )
         
         try:
-            result = await self.call_ai_api(PROMPTS.get('judge_article_relevance_system', ""), prompt)
+            result = await self.call_ai_api(PROMPTS.get('judge_article_relevance_system', ""), prompt, route='relevance', task='judge_article_relevance')
 
             isPass = result.get('is_relevant')
             reason = result.get('reason')
-            logging.info(f"{isPass}：{reason}")
+            logging.debug("%s：%s", isPass, reason)
 
             return result.get('is_relevant', False)
         except IntelligentAPIError as e:
             logging.error(f"Article relevance judgment failed: {str(e)}")
-            return False
\ No newline at end of file
+            return False
+
+    async def compile_focus(self, focus):
+        """把自由文本的关注内容编译为结构化过滤条件，失败时返回None"""
+        prompt_template = PROMPTS.get('compile_focus')
+        if not prompt_template:
+            raise ConfigError("compile_focus prompt not found")
+
+        topics_info, genres_info = SummaryAgent.categories_info()
+        prompt = Template(prompt_template).safe_substitute(
+            topics_info=topics_info, genres_info=genres_info, focus_content=focus
+        )
+
+        try:
+            return await self.call_ai_api(PROMPTS.get('compile_focus_system', ""), prompt, route='compile_focus', task='compile_focus')
+        except Exception as e:
+            # 单个关注点编译失败（网络、模型或JSON修复失败）不影响其它关注点，该关注点改由大模型逐篇判断
+            logging.error(f"Focus compilation failed: {str(e)}")
+            return None
\ No newline at end of file
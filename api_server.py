@@ -0,0 +1,242 @@
+import asyncio
+import base64
+import gzip
+import hashlib
+import json
+import logging
+import time
+from collections import OrderedDict
+from datetime import datetime
+
+from db_operations import register_focus_listener, unregister_focus_listener
+from digest import get_digest_store
+from log_config import setup_logging
+from metrics import counter, histogram
+from storage import open_storage
+from utils import get_env
+
+API_REQUEST_SECONDS = histogram('insightfocus_api_request_seconds', '读取侧API请求耗时（秒）', ('route',))
+API_CACHE_REQUESTS = counter('insightfocus_api_cache_requests_total', '读取侧API响应缓存查询次数', ('result',))
+
+STATUSES = ('unread', 'read', 'read_later')
+
+
+class InvalidCursor(Exception):
+    pass
+
+
+class UserResponseCache:
+    """按用户分桶的响应缓存：关注清单或阅读状态变化时整桶失效，TTL兜底跨进程写入的情况"""
+
+    def __init__(self, ttl=30, max_users=10000):
+        self.ttl = ttl
+        self.max_users = max_users
+        self._users = OrderedDict()
+
+    def get(self, user_id, key):
+        entries = self._users.get(user_id)
+        entry = entries.get(key) if entries else None
+        if entry is None or entry[0] < time.monotonic():
+            API_CACHE_REQUESTS.inc(result='miss')
+            return None
+        self._users.move_to_end(user_id)
+        API_CACHE_REQUESTS.inc(result='hit')
+        return entry[1], entry[2]
+
+    def put(self, user_id, key, body, etag):
+        entries = self._users.setdefault(user_id, {})
+        entries[key] = (time.monotonic() + self.ttl, body, etag)
+        self._users.move_to_end(user_id)
+        while len(self._users) > self.max_users:
+            self._users.popitem(last=False)
+
+    def invalidate(self, user_id):
+        self._users.pop(user_id, None)
+
+
+def encode_cursor(created_at, row_id):
+    raw = f"{created_at.isoformat()}|{row_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        created_at, row_id = raw.rsplit('|', 1)
+        return datetime.fromisoformat(created_at), int(row_id)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise InvalidCursor(str(e))
+
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"无法序列化的类型: {type(value).__name__}")
+
+
+def dump_json(data):
+    return json.dumps(data, ensure_ascii=False, default=_json_default, separators=(',', ':')).encode('utf-8')
+
+
+def etag_for(body):
+    return '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+
+
+def create_app(storage, cache=None):
+    from aiohttp import web
+
+    cache = cache or UserResponseCache(
+        ttl=get_env('API_CACHE_TTL', 30, int),
+        max_users=get_env('API_CACHE_MAX_USERS', 10000, int)
+    )
+    page_size = get_env('API_PAGE_SIZE', 20, int)
+    page_max = get_env('API_PAGE_MAX', 100, int)
+    status_batch_max = get_env('API_STATUS_BATCH_MAX', 500, int)
+
+    def error(status, message):
+        return web.json_response({'error': message}, status=status, dumps=lambda data: dump_json(data).decode())
+
+    def respond(request, body, etag, max_age=0):
+        headers = {'ETag': etag, 'Cache-Control': f'private, max-age={max_age}'}
+        if etag in request.headers.get('If-None-Match', ''):
+            return web.Response(status=304, headers=headers)
+        return web.Response(body=body, content_type='application/json', charset='utf-8', headers=headers)
+
+    def int_param(value, name):
+        try:
+            return int(value)
+        except (TypeError, ValueError):
+            raise web.HTTPBadRequest(text=f"{name} 必须是整数")
+
+    async def handle_focused_articles(request):
+        with API_REQUEST_SECONDS.time(route='focused_articles'):
+            user_id = int_param(request.match_info['user_id'], 'user_id')
+            limit = min(max(int_param(request.query.get('limit', page_size), 'limit'), 1), page_max)
+            cursor = request.query.get('cursor')
+            cache_key = (cursor, limit)
+
+            cached = cache.get(user_id, cache_key)
+            if cached:
+                return respond(request, *cached)
+
+            try:
+                before = decode_cursor(cursor) if cursor else None
+            except InvalidCursor:
+                return error(400, 'cursor 无效')
+
+            # 多取一行用于判断是否还有下一页
+            rows = await storage.get_focused_articles_page(user_id, limit + 1, before)
+            next_cursor = None
+            if len(rows) > limit:
+                rows = rows[:limit]
+                next_cursor = encode_cursor(rows[-1]['created_at'], rows[-1]['focused_id'])
+
+            body = dump_json({'items': rows, 'next_cursor': next_cursor})
+            etag = etag_for(body)
+            cache.put(user_id, cache_key, body, etag)
+            return respond(request, body, etag)
+
+    async def handle_article_detail(request):
+        with API_REQUEST_SECONDS.time(route='article_detail'):
+            article_id = int_param(request.match_info['article_id'], 'article_id')
+            article = await storage.get_article_detail(article_id)
+            if article is None:
+                return error(404, '文章不存在')
+            body = dump_json(article)
+            return respond(request, body, etag_for(body), max_age=300)
+
+    async def handle_status_update(request):
+        with API_REQUEST_SECONDS.time(route='status_update'):
+            user_id = int_param(request.match_info['user_id'], 'user_id')
+            try:
+                payload = await request.json()
+            except (ValueError, UnicodeDecodeError):
+                return error(400, '请求体不是合法的UTF-8 JSON')
+
+            items = payload.get('updates') if isinstance(payload, dict) else None
+            if not isinstance(items, list) or not items:
+                return error(400, 'updates 必须是非空数组')
+            if len(items) > status_batch_max:
+                return error(400, f'单次最多更新 {status_batch_max} 条')
+
+            updates = {}
+            for item in items:
+                if not isinstance(item, dict) or item.get('status') not in STATUSES:
+                    return error(400, f"status 必须是 {', '.join(STATUSES)} 之一")
+                # 同一文章多次出现时以最后一条为准
+                updates[int_param(item.get('article_id'), 'article_id')] = item['status']
+
+            updated = await storage.update_user_article_statuses(user_id, list(updates.items()))
+            return web.json_response({'updated': updated})
+
+    async def handle_feed(request):
+        """直接返回预生成的压缩订阅源文件，304只需一次stat，不查询数据库"""
+        fmt = request.match_info['fmt']
+        with API_REQUEST_SECONDS.time(route=f'feed_{fmt}'):
+            user_id = int_param(request.match_info['user_id'], 'user_id')
+            store = get_digest_store()
+            etag = store.etag(user_id, fmt)
+            if etag is None:
+                return error(404, '订阅源尚未生成')
+            headers = {'ETag': etag, 'Cache-Control': 'private, max-age=300', 'Vary': 'Accept-Encoding'}
+            if etag in request.headers.get('If-None-Match', ''):
+                return web.Response(status=304, headers=headers)
+
+            body = await asyncio.to_thread(store.read, user_id, fmt)
+            if body is None:
+                return error(404, '订阅源尚未生成')
+            if 'gzip' in request.headers.get('Accept-Encoding', ''):
+                headers['Content-Encoding'] = 'gzip'
+            else:
+                body = gzip.decompress(body)
+            return web.Response(body=body, content_type=store.content_type(fmt), charset='utf-8', headers=headers)
+
+    app = web.Application()
+    app.router.add_get('/users/{user_id}/articles', handle_focused_articles)
+    app.router.add_get(r'/users/{user_id}/feed.{fmt:atom|json}', handle_feed)
+    app.router.add_post('/users/{user_id}/status', handle_status_update)
+    app.router.add_get('/articles/{article_id}', handle_article_detail)
+
+    register_focus_listener(cache.invalidate)
+
+    async def on_cleanup(app):
+        unregister_focus_listener(cache.invalidate)
+
+    app.on_cleanup.append(on_cleanup)
+    return app
+
+
+async def start_api_server(storage, port=None, host=None):
+    """启动读取侧HTTP API，端口为0时不启动。与处理流程在同一进程时，写入关注清单会立即失效对应用户的缓存。
+    接口没有鉴权，任何能连上的客户端都可以修改任意用户的阅读状态，只应监听本机地址或放在带鉴权的反向代理之后"""
+    port = get_env('API_PORT', 0, int) if port is None else port
+    if not port:
+        return None
+    host = host or get_env('API_HOST', '127.0.0.1')
+
+    from aiohttp import web
+
+    runner = web.AppRunner(create_app(storage), access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, host, port)
+    await site.start()
+    logging.info(f"读取侧API已启动：http://{host}:{port}")
+    return runner
+
+
+async def main():
+    """独立运行API服务，此时其他进程的写入只能依靠 API_CACHE_TTL 过期"""
+    setup_logging()
+    storage = await open_storage()
+    # 独立运行时API_PORT为0（嵌入模式的“不启动”）没有意义，使用默认端口
+    runner = await start_api_server(storage, port=get_env('API_PORT', 0, int) or 8080)
+    try:
+        await asyncio.Event().wait()
+    finally:
+        if runner:
+            await runner.cleanup()
+        await storage.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,89 @@
+import asyncio
+import logging
+
+from db_operations import build_article_data
+from metrics import counter, histogram
+from utils import get_env
+
+ARTICLE_BATCH_SIZE = histogram('insightfocus_article_batch_size', '每次批量写入的文章数', buckets=(1, 5, 10, 25, 50, 100, 250))
+ARTICLE_WRITES = counter('insightfocus_article_writes_total', '文章写入结果', ('result',))
+
+
+class ArticleWriter:
+    """文章写回缓冲：处理完成的条目先进入缓冲区，攒够batch_size条或距第一条超过flush_ms毫秒时一次写入。
+    整批失败时逐条重试，单条坏数据不会拖累整批"""
+
+    def __init__(self, storage, batch_size=None, flush_ms=None):
+        self.storage = storage
+        self.batch_size = batch_size or get_env('ARTICLE_BATCH_SIZE', 50, int)
+        self.flush_interval = (flush_ms or get_env('ARTICLE_FLUSH_MS', 2000, int)) / 1000
+        self._buffer = []
+        self._pending_hashes = set()
+        self._timer = None
+        self._flushing = set()
+        self._lock = asyncio.Lock()
+
+    def is_pending(self, url_hash=None, html_hash=None):
+        """尚未落库的条目也参与去重，避免同一轮里重复处理同一篇文章"""
+        return bool((url_hash and url_hash in self._pending_hashes) or (html_hash and html_hash in self._pending_hashes))
+
+    async def submit(self, item, url_hash, html_hash, plain_content, summary, tags, genre_id, topic_id, language, read_time):
+        args = (item, url_hash, html_hash, plain_content, summary, tags, genre_id, topic_id, language, read_time)
+        self._buffer.append(args)
+        self._pending_hashes.update(h for h in (url_hash, html_hash) if h)
+        if len(self._buffer) >= self.batch_size:
+            # 写入放在独立任务中并屏蔽取消，条目超时被取消时已缓冲的整批数据不会丢失
+            await asyncio.shield(self._start_flush())
+        elif self._timer is None:
+            self._timer = asyncio.create_task(self._flush_later())
+
+    async def _flush_later(self):
+        await asyncio.sleep(self.flush_interval)
+        self._timer = None
+        await self._start_flush()
+
+    def _start_flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        rows, self._buffer = self._buffer, []
+        task = asyncio.create_task(self._flush(rows))
+        self._flushing.add(task)
+        task.add_done_callback(self._flushing.discard)
+        return task
+
+    async def _flush(self, rows):
+        if not rows:
+            return
+        async with self._lock:
+            try:
+                written = await self.storage.insert_articles_batch([
+                    (build_article_data(item, url_hash, html_hash, plain_content, summary, genre_id, topic_id, language, read_time), tags)
+                    for item, url_hash, html_hash, plain_content, summary, tags, genre_id, topic_id, language, read_time in rows
+                ])
+                ARTICLE_BATCH_SIZE.observe(len(rows))
+                ARTICLE_WRITES.inc(written, result='batch')
+                logging.info(f"批量写入 {written} 篇文章")
+            except Exception as e:
+                logging.warning(f"批量写入 {len(rows)} 篇文章失败，改为逐条写入: {str(e)}")
+                for args in rows:
+                    try:
+                        await self.storage.save_article(*args)
+                        ARTICLE_WRITES.inc(result='single')
+                    except Exception as row_error:
+                        ARTICLE_WRITES.inc(result='failed')
+                        logging.error(f"写入文章失败 {args[0].get('url')}: {str(row_error)}")
+            finally:
+                for args in rows:
+                    self._pending_hashes.difference_update(h for h in (args[1], args[2]) if h)
+
+    async def flush(self):
+        await self._start_flush()
+        if self._flushing:
+            await asyncio.gather(*self._flushing, return_exceptions=True)
+
+    async def close(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        await self.flush()
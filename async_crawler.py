@@ -2,27 +2,19 @@ from threading import Lock
 from typing import Dict, Union
 from urllib.parse import urlparse
 
-from pyppeteer import launch
 import httpx
-from gne import GeneralNewsExtractor
-import trafilatura
 import json
 import logging
 
-from utils import get_env
+from browser_pool import get_browser_pool, close_browser_pool
+from deadline import time_left
+from html_fetcher import BodyTooLarge, UnsupportedContent, read_html
+from metrics import timed
+from politeness import get_domain_scheduler
 
 class AsyncCrawler:
     _instance = None
     _lock = Lock()
-    _browser = None
-    _pages = []
-    _page_index = 0
-    _restart_threshold = 1000
-    _page_count = 0
-    
-    # 从环境变量读取参数值
-    PAGE_POOL_SIZE = get_env('PAGE_POOL_SIZE', 10, int)
-    _restart_threshold = get_env('BROWSER_RESTART_COUNT', 1000, int)
 
     def __new__(cls):
         with cls._lock:
@@ -36,72 +28,59 @@ class AsyncCrawler:
         }
         self.ajax_domains = ["36kr.com"]
 
-    async def get_browser(self):
-        if self._browser is None or self._page_count >= self._restart_threshold:
-            await self.close_browser()  # 确保旧的浏览器被关闭
-            with self._lock:
-                if self._browser is None or self._page_count >= self._restart_threshold:
-                    self._browser = await launch(headless=True, args=['--no-sandbox', '--disable-setuid-sandbox'])
-                    self._pages = []
-                    for _ in range(self.PAGE_POOL_SIZE):  # 使用PAGE_POOL_SIZE常量
-                        page = await self._browser.newPage()
-                        self._pages.append(page)
-                    self._page_index = 0
-                    self._page_count = 0
-                    logging.info(f"New browser instance created with {self.PAGE_POOL_SIZE} pages")
-        return self._browser
-
-    async def close_browser(self):
-        if self._browser:
-            for page in self._pages:
-                await page.close()
-            await self._browser.close()
-            self._browser = None
-            self._pages = []
-            self._page_count = 0
-            logging.info("Browser instance and all pages closed")
+    async def render_page(self, page, url: str) -> Union[str, None]:
+        await page.goto(url, waitUntil='networkidle0', timeout=int((time_left('fetch') or 30) * 1000))
+        return await page.content()
 
     async def fetch_with_pyppeteer(self, url: str) -> Union[str, None]:
-        await self.get_browser()  # 确保浏览器和页面已初始化
-        page = self._pages[self._page_index]
-        self._page_index = (self._page_index + 1) % len(self._pages)
-        self._page_count += 1
+        # 浏览器实例的分配、按内存回收与崩溃后重试都由浏览器池负责
         try:
-            await page.goto(url, waitUntil='networkidle0')
-            content = await page.content()
-            return content
+            return await get_browser_pool().run(self.render_page, url)
         except Exception as e:
             logging.error(f"Pyppeteer error: {e}")
             return None
-        finally:
-            logging.debug(f"Page used. Total pages used: {self._page_count}")
 
     async def fetch_with_httpx(self, url: str) -> Union[str, None]:
         async with httpx.AsyncClient() as client:
             try:
                 headers = {'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'}
-                response = await client.get(url, headers=headers, timeout=30)
-                response.raise_for_status()
-                return response.text
+                async with client.stream('GET', url, headers=headers, timeout=30) as response:
+                    get_domain_scheduler().record(url, response.status_code, response.headers.get('Retry-After'))
+                    response.raise_for_status()
+                    return await read_html(response)
+            except (UnsupportedContent, BodyTooLarge) as e:
+                logging.warning(f"Skipping {url}: {e}")
+                return None
+            except httpx.HTTPStatusError as e:
+                logging.error(f"HTTPX status error: {e}")
+                return None
             except httpx.RequestError as e:
+                get_domain_scheduler().record(url, error=True)
                 logging.error(f"HTTPX error: {e}")
                 return None
 
+    @timed('fetch_html')
     async def fetch_html(self, url: str) -> Union[str, None]:
         domain = urlparse(url).netloc
-        if domain in self.ajax_domains:
-            return await self.fetch_with_pyppeteer(url)
-        else:
+        scheduler = get_domain_scheduler()
+        if not await scheduler.allowed(url):
+            logging.info("robots.txt disallows %s, skipping", url)
+            return None
+        async with scheduler.slot(url):
+            if domain in self.ajax_domains:
+                return await self.fetch_with_pyppeteer(url)
             return await self.fetch_with_httpx(url)
 
+    @timed('extract_content')
     def extract_content(self, html_content: str, url: str) -> Dict[str, str]:
         result = {
             "title": "",
             "author": "",
             "publish_date": "",
-            "content": html_content,
             "plain_content": ""
         }
+        import trafilatura
+        from gne import GeneralNewsExtractor
         try:
             extractor = GeneralNewsExtractor()
             gne_result = extractor.extract(html_content, noise_node_list=['//div[@class="comment-list"]'])
@@ -110,7 +89,7 @@ class AsyncCrawler:
                 result['author'] = gne_result.get('author', '')
                 result['publish_date'] = gne_result.get('publish_time', '')
                 result['plain_content'] = gne_result.get('content', '')
-                logging.info("GNE: Content extraction successful")
+                logging.debug("GNE: Content extraction successful")
             else:
                 logging.warning("GNE: Content extraction failed, trying Trafilatura")
 
@@ -122,7 +101,7 @@ class AsyncCrawler:
                     result['author'] = result['author'] or trafilatura_result.get('author', '')
                     result['publish_date'] = result['publish_date'] or trafilatura_result.get('date', '')
                     result['plain_content'] = result['plain_content'] or trafilatura_result.get('text', '')
-                    logging.info("Trafilatura: Content extraction successful")
+                    logging.debug("Trafilatura: Content extraction successful")
                 else:
                     logging.warning("Trafilatura: Content extraction failed")
 
@@ -141,6 +120,7 @@ class AsyncCrawler:
             "plain_content": "Example WeChat Content"
         }
 
+    @timed('crawl')
     async def crawl(self, url: str) -> Dict[str, Union[int, str, dict]]:
         result = {
             "status_code": 200,
@@ -176,13 +156,12 @@ class AsyncCrawler:
     @classmethod
     async def create(cls):
         instance = cls()
-        await instance.get_browser()  # 确保浏览器和页面已初始化
+        await get_browser_pool().start()  # 确保浏览器池已启动
         return instance
 
     @classmethod
     async def cleanup(cls):
-        if cls._instance:
-            await cls._instance.close_browser()
+        await close_browser_pool()
 
 
 # 创建实例
@@ -0,0 +1,247 @@
+import argparse
+import asyncio
+import json
+import logging
+import os
+import time
+
+from agents.summaryAgent import SummaryAgent
+from log_config import setup_logging
+from storage import open_storage
+
+
+class Checkpoint:
+    """记录已完成并写回的最大连续文章ID；批次乱序完成时只推进到最早未完成批次之前"""
+
+    def __init__(self, path):
+        self.path = path
+        self.last_id = 0
+        self._pending = []
+        self._done = set()
+        if os.path.exists(path):
+            with open(path, 'r') as f:
+                self.last_id = json.load(f).get('last_id', 0)
+
+    def submit(self, batch_last_id):
+        self._pending.append(batch_last_id)
+
+    def complete(self, batch_last_id):
+        self._done.add(batch_last_id)
+        advanced = False
+        while self._pending and self._pending[0] in self._done:
+            self.last_id = self._pending.pop(0)
+            self._done.discard(self.last_id)
+            advanced = True
+        return advanced
+
+    def save(self):
+        tmp_path = f'{self.path}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump({'last_id': self.last_id, 'updated_at': time.strftime('%Y-%m-%d %H:%M:%S')}, f)
+        os.replace(tmp_path, self.path)
+
+
+class FailureLog:
+    """记录分类失败的文章（每行一篇JSON），检查点越过它们之前先落盘，供 --retry-failed 重跑"""
+
+    def __init__(self, path):
+        self.path = path
+        self.retrying_path = f'{path}.retrying'
+
+    def append(self, articles):
+        with open(self.path, 'a', encoding='utf-8') as f:
+            for article in articles:
+                f.write(json.dumps(article, ensure_ascii=False) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+
+    def take(self):
+        """取出待重试的文章：先把失败记录移到 .retrying，重跑中断时下次仍从该文件继续"""
+        if not os.path.exists(self.retrying_path) and os.path.exists(self.path):
+            os.replace(self.path, self.retrying_path)
+        articles = {}
+        for path in (self.retrying_path, self.path):
+            if not os.path.exists(path):
+                continue
+            with open(path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    if line.strip():
+                        article = json.loads(line)
+                        articles[article['id']] = article
+        return [articles[article_id] for article_id in sorted(articles)]
+
+    def finish_retry(self):
+        if os.path.exists(self.retrying_path):
+            os.remove(self.retrying_path)
+
+
+class ClassificationBackfill:
+    def __init__(self, storage, checkpoint, failures, prompt_batch=10, concurrency=8, update_batch=200,
+                 read_chunk=500):
+        self.storage = storage
+        self.checkpoint = checkpoint
+        self.failures = failures
+        self.prompt_batch = prompt_batch
+        self.update_batch = update_batch
+        self.concurrency = concurrency
+        self.read_chunk = read_chunk
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.agent = SummaryAgent()
+        self.pending_updates = []
+        # 分类失败的文章，与更新一起在推进检查点之前写入失败记录
+        self.pending_failures = []
+        # 已分类但尚未写回数据库的批次，写回后才能推进检查点
+        self.unflushed_batches = []
+        self.flush_lock = asyncio.Lock()
+        self.classified = 0
+        self.failed = 0
+        # 写回失败时记录异常并中止，不再继续分类
+        self.error = None
+
+    async def classify_batch(self, articles, track=True):
+        async with self.semaphore:
+            try:
+                results = await self.agent.classify_articles(articles)
+            except Exception as e:
+                logging.error(f"批量分类失败，改为逐篇分类：{str(e)}")
+                results = {}
+
+            # 模型漏掉的文章逐篇补充分类
+            for article in articles:
+                if article['id'] in results:
+                    continue
+                try:
+                    single = await self.agent.classify_article(article['title'], article['summary'], article['tags'])
+                    if single.get('topic_id') is not None and single.get('genre_id') is not None:
+                        results[article['id']] = single
+                except Exception as e:
+                    logging.warning(f"文章 {article['id']} 分类失败：{str(e)}")
+
+        self.classified += len(results)
+        self.failed += len(articles) - len(results)
+        self.pending_updates.extend(
+            (article_id, result['topic_id'], result['genre_id']) for article_id, result in results.items()
+        )
+        self.pending_failures.extend(article for article in articles if article['id'] not in results)
+        if track:
+            self.unflushed_batches.append(articles[-1]['id'])
+        if len(self.pending_updates) >= self.update_batch:
+            await self.flush()
+
+    async def flush(self):
+        async with self.flush_lock:
+            updates, self.pending_updates = self.pending_updates, []
+            failures, self.pending_failures = self.pending_failures, []
+            batches, self.unflushed_batches = self.unflushed_batches, []
+            if updates:
+                await self.storage.update_articles_classification(updates)
+            if failures:
+                await asyncio.to_thread(self.failures.append, failures)
+            advanced = False
+            for batch_last_id in batches:
+                advanced = self.checkpoint.complete(batch_last_id) or advanced
+            if advanced:
+                self.checkpoint.save()
+
+    def _on_task_done(self, tasks, task):
+        tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None and self.error is None:
+            self.error = task.exception()
+
+    async def _raise_if_failed(self, tasks):
+        if self.error is None:
+            return
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        logging.error(f"写回分类结果失败，中止重新分类，检查点停在ID：{self.checkpoint.last_id}")
+        raise self.error
+
+    async def _submit(self, tasks, articles, track=True):
+        if track:
+            self.checkpoint.submit(articles[-1]['id'])
+        task = asyncio.create_task(self.classify_batch(articles, track=track))
+        tasks.add(task)
+        task.add_done_callback(lambda t: self._on_task_done(tasks, t))
+        # 控制在途任务数量，避免流式读取远远跑在分类前面占用内存
+        while len(tasks) >= self.concurrency * 2:
+            await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        await self._raise_if_failed(tasks)
+
+    async def _drain(self, tasks):
+        if tasks:
+            await asyncio.wait(tasks)
+        await self._raise_if_failed(tasks)
+        await self.flush()
+
+    async def run(self, since=None):
+        started = time.monotonic()
+        tasks = set()
+        batch = []
+        submitted = 0
+
+        async def submit(articles):
+            await self._submit(tasks, articles)
+
+        # 每段游标读取的行数不宜过大：消费变慢时服务端会阻塞在写出结果上，超过net_write_timeout会断开
+        stream = self.storage.stream_articles_for_classification(after_id=self.checkpoint.last_id, since=since,
+                                                              chunk_size=self.read_chunk)
+        async for article in stream:
+            batch.append(article)
+            if len(batch) >= self.prompt_batch:
+                await submit(batch)
+                batch = []
+                submitted += 1
+                if submitted % 100 == 0:
+                    rate = (self.classified + self.failed) / max(time.monotonic() - started, 1e-6)
+                    logging.info(f"已分类 {self.classified} 篇，失败 {self.failed} 篇，速度 {rate:.1f} 篇/秒，检查点ID：{self.checkpoint.last_id}")
+        if batch:
+            await submit(batch)
+        await self._drain(tasks)
+        logging.info(f"重新分类完成：成功 {self.classified} 篇，失败 {self.failed} 篇，耗时 {time.monotonic() - started:.0f} 秒")
+
+    async def retry_failed(self):
+        """重跑失败记录中的文章，不读写检查点；仍失败的文章重新写入失败记录"""
+        started = time.monotonic()
+        articles = await asyncio.to_thread(self.failures.take)
+        tasks = set()
+        for start in range(0, len(articles), self.prompt_batch):
+            await self._submit(tasks, articles[start:start + self.prompt_batch], track=False)
+        await self._drain(tasks)
+        await asyncio.to_thread(self.failures.finish_retry)
+        logging.info(f"失败重试完成：共 {len(articles)} 篇，成功 {self.classified} 篇，仍失败 {self.failed} 篇，"
+                     f"耗时 {time.monotonic() - started:.0f} 秒")
+
+
+async def main():
+    arg_parser = argparse.ArgumentParser(description='批量重新分类已入库文章的主题与题材，可从检查点断点续跑')
+    arg_parser.add_argument('--since', help='只处理该时间之后抓取的文章，例如 2024-08-01')
+    arg_parser.add_argument('--checkpoint', default='backfill_classify.checkpoint.json', help='检查点文件路径')
+    arg_parser.add_argument('--restart', action='store_true', help='忽略已有检查点，从头开始')
+    arg_parser.add_argument('--failures', default='backfill_classify.failed.jsonl', help='分类失败文章的记录文件路径')
+    arg_parser.add_argument('--retry-failed', action='store_true', help='只重跑失败记录中的文章，不移动检查点')
+    arg_parser.add_argument('--prompt-batch', type=int, default=10, help='每次请求分类的文章数')
+    arg_parser.add_argument('--concurrency', type=int, default=8, help='同时进行的分类请求数')
+    arg_parser.add_argument('--update-batch', type=int, default=200, help='每次写回数据库的文章数')
+    arg_parser.add_argument('--read-chunk', type=int, default=500, help='每段服务端游标读取的文章数')
+    args = arg_parser.parse_args()
+
+    if args.restart and os.path.exists(args.checkpoint):
+        os.remove(args.checkpoint)
+
+    storage = await open_storage()
+    try:
+        backfill = ClassificationBackfill(storage, Checkpoint(args.checkpoint), FailureLog(args.failures),
+                                          prompt_batch=args.prompt_batch, concurrency=args.concurrency,
+                                          update_batch=args.update_batch, read_chunk=args.read_chunk)
+        if args.retry_failed:
+            await backfill.retry_failed()
+        else:
+            await backfill.run(since=args.since)
+    finally:
+        await storage.close()
+
+
+if __name__ == "__main__":
+    setup_logging()
+    asyncio.run(main())
@@ -0,0 +1,287 @@
+import asyncio
+import logging
+import os
+
+from config import get_settings
+from metrics import counter, gauge
+
+BROWSER_RSS = gauge('insightfocus_browser_rss_bytes', '浏览器实例（含子进程）的常驻内存（字节）', ('instance',))
+BROWSER_OPEN_PAGES = gauge('insightfocus_browser_open_pages', '浏览器实例当前打开的页面数', ('instance',))
+BROWSER_RESTARTS = counter('insightfocus_browser_restarts_total', '浏览器实例重启次数', ('reason',))
+BROWSER_REROUTES = counter('insightfocus_browser_reroutes_total', '因浏览器崩溃转到其他实例重试的页面数')
+
+LAUNCH_ARGS = ['--no-sandbox', '--disable-setuid-sandbox', '--disable-dev-shm-usage']
+
+
+def process_tree_rss(pid):
+    """统计进程及其所有子进程（Chromium的渲染、GPU进程）的RSS，优先用psutil，否则读/proc"""
+    try:
+        import psutil
+    except ImportError:
+        psutil = None
+    if psutil:
+        try:
+            root = psutil.Process(pid)
+            return sum(p.memory_info().rss for p in [root] + root.children(recursive=True))
+        except psutil.Error:
+            return 0
+
+    if not os.path.isdir('/proc'):
+        return 0
+    page_size = os.sysconf('SC_PAGE_SIZE')
+    children, rss = {}, {}
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entry}/stat', 'r') as f:
+                fields = f.read().rsplit(')', 1)[1].split()
+        except (OSError, IndexError):
+            continue
+        # ')' 之后依次为 state, ppid, ...，rss（页数）是其后第22个字段
+        children.setdefault(int(fields[1]), []).append(int(entry))
+        rss[int(entry)] = int(fields[21]) * page_size
+    total, stack = 0, [pid]
+    while stack:
+        current = stack.pop()
+        total += rss.get(current, 0)
+        stack.extend(children.get(current, []))
+    return total
+
+
+class BrowserCrashed(Exception):
+    pass
+
+
+class BrowserInstance:
+    def __init__(self, index, cpus=None):
+        self.index = index
+        self.name = f'browser-{index}'
+        self.cpus = cpus
+        self.browser = None
+        self.active = 0
+        self.served = 0
+        self.draining = False
+        self.restarting = False
+
+    @property
+    def process(self):
+        return getattr(self.browser, 'process', None)
+
+    def alive(self):
+        process = self.process
+        return self.browser is not None and (process is None or process.poll() is None)
+
+    def usable(self):
+        return self.alive() and not self.draining and not self.restarting
+
+    async def launch(self):
+        # pyppeteer只在真正需要无头浏览器时导入
+        from pyppeteer import launch
+        self.browser = await launch(headless=True, args=LAUNCH_ARGS, ignoreHTTPSErrors=True, autoClose=False)
+        self.served = 0
+        self.draining = False
+        process = self.process
+        # 把各实例绑定到不同的CPU核上，之后fork出的渲染进程会继承该亲和性
+        if self.cpus and process and hasattr(os, 'sched_setaffinity'):
+            try:
+                os.sched_setaffinity(process.pid, self.cpus)
+            except OSError as e:
+                logging.debug(f"{self.name} 设置CPU亲和性失败: {e}")
+        logging.info(f"{self.name} 已启动（pid {process.pid if process else '?'}）")
+
+    async def close(self):
+        browser, self.browser = self.browser, None
+        if browser is None:
+            return
+        try:
+            await asyncio.wait_for(browser.close(), 10)
+        except Exception as e:
+            logging.warning(f"{self.name} 未能正常关闭，强制结束: {e}")
+            process = getattr(browser, 'process', None)
+            if process and process.poll() is None:
+                process.kill()
+
+
+class BrowserPool:
+    """受监督的多浏览器实例池：页面分配到负载最低的实例；后台定期做健康检查，
+    按实测内存（RSS）与打开的页面数回收实例，回收前先等待进行中的页面结束；
+    实例崩溃时，其上的页面转到其他实例重试"""
+
+    def __init__(self, size=None, pages_per_browser=None, max_rss_mb=None, max_open_pages=None,
+                 max_pages_served=None, check_interval=None):
+        settings = get_settings()
+        self.size = size or settings.browser_pool_size
+        self.pages_per_browser = pages_per_browser or settings.page_pool_size
+        self.max_rss = (max_rss_mb or settings.browser_max_rss_mb) * 1024 * 1024
+        # 默认允许的打开页面数为并发上限的两倍（另加浏览器自带的空白页）
+        self.max_open_pages = max_open_pages or settings.browser_max_open_pages or self.pages_per_browser * 2 + 1
+        # 兜底的累计页面数上限，0表示只按内存回收
+        self.max_pages_served = max_pages_served if max_pages_served is not None else settings.browser_restart_count
+        self.check_interval = check_interval or settings.browser_check_interval
+        self._instances = []
+        self._condition = asyncio.Condition()
+        self._start_lock = asyncio.Lock()
+        self._supervisor = None
+        self._restarts = set()
+
+    async def start(self):
+        async with self._start_lock:
+            if self._instances:
+                return
+            cpus = sorted(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else []
+            self._instances = [
+                BrowserInstance(index, set(cpus[index::self.size]) if len(cpus) >= self.size else None)
+                for index in range(self.size)
+            ]
+            results = await asyncio.gather(*(instance.launch() for instance in self._instances), return_exceptions=True)
+            for instance, result in zip(self._instances, results):
+                if isinstance(result, Exception):
+                    logging.error(f"{instance.name} 启动失败，稍后由监督任务重试: {result}")
+            if not any(instance.alive() for instance in self._instances):
+                self._instances = []
+                raise BrowserCrashed("没有可用的浏览器实例")
+            self._supervisor = asyncio.create_task(self._supervise())
+            logging.info(f"浏览器池已启动：{self.size} 个实例，每个最多 {self.pages_per_browser} 个并发页面")
+
+    async def close(self):
+        if self._supervisor:
+            self._supervisor.cancel()
+            self._supervisor = None
+        for task in list(self._restarts):
+            task.cancel()
+        await asyncio.gather(*(instance.close() for instance in self._instances), return_exceptions=True)
+        self._instances = []
+        logging.info("浏览器池已关闭")
+
+    async def _acquire(self, avoid=()):
+        async with self._condition:
+            while True:
+                candidates = [i for i in self._instances if i.usable() and i.active < self.pages_per_browser]
+                if candidates:
+                    # 优先选择没有失败过的实例，其次选负载最低的
+                    instance = min(candidates, key=lambda i: (i in avoid, i.active))
+                    instance.active += 1
+                    instance.served += 1
+                    return instance
+                await self._condition.wait()
+
+    async def _release(self, instance):
+        async with self._condition:
+            instance.active -= 1
+            self._condition.notify_all()
+        if instance.draining and instance.active == 0 and not instance.restarting:
+            self._schedule_restart(instance, None)
+
+    async def run(self, func, *args, attempts=2):
+        """在新页面中执行 func(page, *args)，结束后关闭页面；实例崩溃导致的失败会换一个实例重试"""
+        await self.start()
+        tried = set()
+        for attempt in range(attempts):
+            instance = await self._acquire(tried)
+            page = None
+            try:
+                page = await instance.browser.newPage()
+                return await func(page, *args)
+            except Exception as e:
+                if instance.alive() and not isinstance(e, BrowserCrashed):
+                    raise
+                tried.add(instance)
+                self._schedule_restart(instance, 'crashed')
+                if attempt == attempts - 1:
+                    raise BrowserCrashed(f"{instance.name} 已崩溃: {e}")
+                BROWSER_REROUTES.inc()
+                logging.warning(f"{instance.name} 已崩溃，页面转到其他实例重试: {e}")
+            finally:
+                if page is not None and instance.alive():
+                    try:
+                        await page.close()
+                    except Exception as e:
+                        logging.debug(f"关闭页面失败: {e}")
+                await self._release(instance)
+
+    def _schedule_restart(self, instance, reason):
+        if instance.restarting:
+            return
+        instance.restarting = True
+        task = asyncio.create_task(self._restart(instance, reason or instance.draining or 'recycle'))
+        self._restarts.add(task)
+        task.add_done_callback(self._restarts.discard)
+
+    async def _restart(self, instance, reason):
+        try:
+            BROWSER_RESTARTS.inc(reason=reason)
+            logging.info(f"重启 {instance.name}（原因：{reason}，累计页面 {instance.served}）")
+            await instance.close()
+            await instance.launch()
+        except Exception as e:
+            logging.error(f"{instance.name} 重启失败，下次检查时重试: {e}")
+        finally:
+            instance.restarting = False
+            async with self._condition:
+                self._condition.notify_all()
+
+    def _drain(self, instance, reason):
+        """停止向实例分配新页面，进行中的页面结束后再重启；同一时间只回收一个实例以保留容量"""
+        if any(other.draining for other in self._instances if other is not instance) and self.size > 1:
+            return
+        instance.draining = reason
+        logging.info(f"{instance.name} 进入回收（原因：{reason}，进行中页面 {instance.active}）")
+        if instance.active == 0:
+            self._schedule_restart(instance, reason)
+
+    async def _check(self, instance):
+        if instance.restarting:
+            return
+        if not instance.alive():
+            if instance.browser is None or instance.active == 0:
+                self._schedule_restart(instance, 'crashed')
+            return
+        try:
+            await asyncio.wait_for(instance.browser.version(), 5)
+            open_pages = len(await asyncio.wait_for(instance.browser.pages(), 5))
+        except Exception as e:
+            logging.warning(f"{instance.name} 健康检查失败: {e}")
+            self._schedule_restart(instance, 'unhealthy')
+            return
+
+        process = instance.process
+        rss = await asyncio.to_thread(process_tree_rss, process.pid) if process else 0
+        BROWSER_RSS.set(rss, instance=instance.name)
+        BROWSER_OPEN_PAGES.set(open_pages, instance=instance.name)
+        if instance.draining:
+            return
+        # 刚启动、尚未使用的实例不因内存回收，避免阈值设得过低时反复重启
+        if self.max_rss and rss > self.max_rss and instance.served:
+            self._drain(instance, 'memory')
+        elif self.max_open_pages and open_pages > self.max_open_pages:
+            # 打开的页面远多于正在使用的页面，说明有页面泄漏（弹窗、未关闭的标签等）
+            self._drain(instance, 'open_pages')
+        elif self.max_pages_served and instance.served >= self.max_pages_served:
+            self._drain(instance, 'pages_served')
+
+    async def _supervise(self):
+        while True:
+            await asyncio.sleep(self.check_interval)
+            for instance in list(self._instances):
+                try:
+                    await self._check(instance)
+                except Exception as e:
+                    logging.error(f"{instance.name} 检查出错: {e}")
+
+
+_pool = None
+
+
+def get_browser_pool():
+    global _pool
+    if _pool is None:
+        _pool = BrowserPool()
+    return _pool
+
+
+async def close_browser_pool():
+    global _pool
+    if _pool is not None:
+        await _pool.close()
+        _pool = None
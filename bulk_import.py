@@ -0,0 +1,370 @@
+import argparse
+import asyncio
+import gzip
+import json
+import logging
+import os
+import time
+import uuid
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+from article_writer import ArticleWriter
+from backfill_classify import Checkpoint
+from content_processor import process_fetched_item, process_rss_item, requeue_item
+from deadline import Deadline, DeadlineExceeded, run_stage
+from general_crawler import extract_article
+from html_fetcher import is_html_content_type, sniff_charset
+from log_config import setup_logging
+from metrics import counter
+from politeness import interleave_by_domain
+from rss_parser import feed_items, fetch_rss_feed
+from storage import open_storage
+from utils import get_env, hash_text, parse_datetime
+
+BULK_IMPORT_ITEMS = counter('insightfocus_bulk_import_items_total', '批量导入条目的处理结果', ('result',))
+
+FEED_CONTENT_TYPES = ('rss', 'atom', 'xml')
+
+
+def _open(path):
+    return gzip.open(path, 'rb') if path.endswith('.gz') else open(path, 'rb')
+
+
+def detect_format(path):
+    name = path[:-3] if path.endswith('.gz') else path
+    extension = os.path.splitext(name)[1].lower()
+    if extension in ('.opml', '.xml'):
+        return 'opml'
+    if extension in ('.jsonl', '.ndjson', '.json'):
+        return 'jsonl'
+    if extension == '.warc':
+        return 'warc'
+    raise ValueError(f"无法从文件名判断导入格式，请用 --format 指定：{path}")
+
+
+def _feed(url, name=None, description=None, content=None):
+    return 'feed', {'url': url, 'name': name or url, 'description': description, 'content': content}
+
+
+def _article(url, title=None, published_at=None, source_id=None, html=None):
+    return 'article', {
+        'source_id': source_id,
+        'guid': str(uuid.uuid4()),
+        'url': url,
+        'title': title,
+        'published_at': published_at or datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        'html': html,
+    }
+
+
+def read_opml(path):
+    """OPML订阅列表：每个带xmlUrl的outline为一个订阅源，分组嵌套不影响读取"""
+    from lxml import etree
+    with _open(path) as f:
+        tree = etree.parse(f, etree.XMLParser(recover=True))
+    for outline in tree.iter('outline'):
+        url = outline.get('xmlUrl')
+        if url:
+            yield _feed(url.strip(), outline.get('title') or outline.get('text'), outline.get('description'))
+
+
+def read_jsonl(path):
+    """每行一个JSON对象：{"feed": 订阅源URL, "name": ...} 为订阅源，
+    {"url": 文章URL, "title": ..., "published_at": ..., "source_id": ..., "html": ...} 为文章，带html时不再抓取"""
+    with _open(path) as f:
+        for line_number, line in enumerate(f, 1):
+            if not line.strip():
+                yield None
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError as e:
+                logging.warning(f"第 {line_number} 行不是有效的JSON，跳过：{str(e)}")
+                yield None
+                continue
+            if record.get('feed'):
+                yield _feed(record['feed'], record.get('name'), record.get('description'))
+            elif record.get('url'):
+                yield _article(record['url'], record.get('title'), record.get('published_at'),
+                               record.get('source_id'), record.get('html'))
+            else:
+                logging.warning(f"第 {line_number} 行缺少 feed 或 url 字段，跳过")
+                yield None
+
+
+def _read_headers(f):
+    headers = {}
+    for line in iter(f.readline, b''):
+        line = line.strip()
+        if not line:
+            break
+        name, _, value = line.decode('utf-8', 'replace').partition(':')
+        headers[name.strip().lower()] = value.strip()
+    return headers
+
+
+def _dechunk(body):
+    parts = []
+    while body:
+        size_line, _, body = body.partition(b'\r\n')
+        size = int(size_line.split(b';')[0].strip() or b'0', 16)
+        if size == 0:
+            break
+        parts.append(body[:size])
+        body = body[size + 2:]
+    return b''.join(parts)
+
+
+def parse_http_response(block):
+    """返回 (状态码, 响应头, 解码传输编码后的正文字节)"""
+    head, _, body = block.partition(b'\r\n\r\n')
+    lines = head.decode('iso-8859-1').split('\r\n')
+    status = int(lines[0].split()[1])
+    headers = {}
+    for line in lines[1:]:
+        name, _, value = line.partition(':')
+        headers[name.strip().lower()] = value.strip()
+    if 'chunked' in headers.get('transfer-encoding', '').lower():
+        body = _dechunk(body)
+    encoding = headers.get('content-encoding', '').lower()
+    if encoding in ('gzip', 'x-gzip'):
+        body = gzip.decompress(body)
+    elif encoding == 'deflate':
+        body = zlib.decompress(body, -zlib.MAX_WBITS if body[:1] != b'\x78' else zlib.MAX_WBITS)
+    return status, headers, body
+
+
+def read_warc(path):
+    """WARC归档（可为.warc.gz）：状态200的HTML响应作为文章，不再抓取；RSS/Atom响应作为订阅源并导入其中的条目"""
+    with _open(path) as f:
+        for line in iter(f.readline, b''):
+            if not line.strip():
+                continue
+            if not line.startswith(b'WARC/'):
+                raise ValueError(f"WARC记录头无效：{line[:50]!r}")
+            headers = _read_headers(f)
+            block = f.read(int(headers.get('content-length', 0)))
+            url = headers.get('warc-target-uri', '').strip('<>')
+            if headers.get('warc-type') != 'response' or not url.startswith('http'):
+                yield None
+                continue
+            try:
+                status, http_headers, body = parse_http_response(block)
+            except Exception as e:
+                logging.warning(f"WARC记录解析失败 {url}: {str(e)}")
+                yield None
+                continue
+            content_type = http_headers.get('content-type', '')
+            if status != 200:
+                yield None
+            elif any(kind in content_type.lower() for kind in FEED_CONTENT_TYPES):
+                yield _feed(url, content=body)
+            elif is_html_content_type(content_type):
+                html = body.decode(sniff_charset(content_type, body[:4096]), errors='replace')
+                yield _article(url, published_at=headers.get('warc-date'), html=html)
+            else:
+                yield None
+
+
+READERS = {'opml': read_opml, 'jsonl': read_jsonl, 'warc': read_warc}
+
+
+class BulkImporter:
+    """批量导入：按批读取记录，订阅源写入rssSources，文章按url_hash批量去重后并发走抓取、提取、摘要流程，
+    按批写回并推进检查点（已完成的最大连续记录序号），中断后可从检查点续跑"""
+
+    def __init__(self, storage, checkpoint, source_id=None, fetch_feeds=True, batch_size=500, concurrency=32,
+                 workers=None):
+        self.storage = storage
+        self.checkpoint = checkpoint
+        self.source_id = source_id
+        self.fetch_feeds = fetch_feeds
+        self.batch_size = batch_size
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.item_budget = get_env('ITEM_DEADLINE', 180, float)
+        # 归档中的页面在进程池中提取正文
+        self.executor = ProcessPoolExecutor(max_workers=workers)
+        self.writer = ArticleWriter(storage)
+        # 本次导入中已提交的url_hash，输入中重复的URL不会进入同一轮
+        self.seen = set()
+        self.counts = {}
+        self.failed_batch = None
+
+    def count(self, result, amount=1):
+        self.counts[result] = self.counts.get(result, 0) + amount
+        BULK_IMPORT_ITEMS.inc(amount, result=result)
+
+    async def import_feeds(self, feeds):
+        """写入订阅源，返回其中的条目；归档中带内容的订阅源直接解析，其余在fetch_feeds时在线抓取"""
+        import feedparser
+        parsed = {}
+        for feed in feeds:
+            if feed['content'] is not None:
+                parsed[feed['url']] = feedparser.parse(feed['content'])
+                feed['name'] = parsed[feed['url']].feed.get('title') or feed['name']
+        source_ids = await self.storage.add_rss_sources([(feed['url'], feed['name'][:255], feed['description'])
+                                                         for feed in feeds])
+        self.count('feeds', len(feeds))
+
+        async def fetch(url):
+            async with self.semaphore:
+                return await fetch_rss_feed(url)
+
+        pending = [url for url in source_ids if url not in parsed] if self.fetch_feeds else []
+        parsed.update(zip(pending, await asyncio.gather(*[fetch(url) for url in pending])))
+        return [item for url, feed in parsed.items() if url in source_ids
+                for item in feed_items(source_ids[url], feed)]
+
+    async def dedupe(self, items):
+        """按url_hash一次查询整批，去掉已入库与本次导入中重复的条目"""
+        fresh = {}
+        for item in items:
+            url_hash = hash_text(item['url'])
+            if url_hash not in self.seen:
+                fresh.setdefault(url_hash, item)
+        existing = await self.storage.get_existing_url_hashes(list(fresh)) if fresh else set()
+        self.count('duplicate', len(items) - len(fresh) + len(existing))
+        self.seen.update(fresh)
+        return [item for url_hash, item in fresh.items() if url_hash not in existing]
+
+    async def extract(self, html, url):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, extract_article, html, url)
+
+    async def process_archived(self, item):
+        html = item.pop('html')
+        extracted = await run_stage('extract', self.extract(html, item['url']))
+        if not extracted.get('plain_content'):
+            logging.warning("归档页面正文提取失败：%s", item['url'])
+            return None
+        item['title'] = item.get('title') or extracted.get('title') or item['url']
+        # 页面中提取到的发布时间优先于归档时间
+        item['published_at'] = parse_datetime(extracted.get('publish_date')) or item['published_at']
+        return await process_fetched_item(self.storage, item, hash_text(item['url']), html,
+                                          extracted['plain_content'], self.writer)
+
+    async def process_item(self, item):
+        async with self.semaphore:
+            deadline = Deadline(self.item_budget)
+            with deadline.activate():
+                try:
+                    if item.get('html'):
+                        processed = await run_stage('item', self.process_archived(item))
+                    else:
+                        item.pop('html', None)
+                        processed = await run_stage('item', process_rss_item(self.storage, item, self.writer))
+                    self.count('processed' if processed else 'skipped')
+                except DeadlineExceeded as e:
+                    # 放回主循环的重试队列，不带归档HTML，重试时在线抓取
+                    item.pop('html', None)
+                    requeue_item(item, str(e))
+                    self.count('timeout')
+                except Exception as e:
+                    # 检查点会越过本批，失败条目同样放回重试队列，不会随批次一起丢失
+                    logging.error(f"导入条目失败，已放回重试队列 {item['url']}: {str(e)}")
+                    item.pop('html', None)
+                    requeue_item(item, str(e))
+                    self.count('failed')
+
+    async def process_batch(self, records):
+        last_ordinal = records[-1][0]
+        try:
+            feeds = [payload for _, kind, payload in records if kind == 'feed']
+            items = await self.import_feeds(feeds) if feeds else []
+            for _, kind, item in records:
+                if kind != 'article':
+                    continue
+                item['source_id'] = item['source_id'] or self.source_id
+                if item['source_id'] is None:
+                    logging.warning(f"文章缺少source_id且未指定 --source-id，跳过：{item['url']}")
+                    self.count('no_source')
+                    continue
+                items.append(item)
+            items = await self.dedupe(items)
+            # 同一站点的条目交错排列，并发时不会都挤在同一站点的礼貌限速上
+            await asyncio.gather(*[self.process_item(item) for item in interleave_by_domain(items)])
+            await self.writer.flush()
+        except Exception as e:
+            # 失败的批次不推进检查点，导入在此停止，续跑时从这一批重新开始
+            logging.error(f"处理第 {records[0][0]}-{last_ordinal} 条记录的批次失败：{str(e)}")
+            self.count('failed', len(records))
+            self.failed_batch = (records[0][0], last_ordinal)
+            return
+        if self.checkpoint.complete(last_ordinal):
+            self.checkpoint.save()
+
+    async def run(self, records):
+        started = time.monotonic()
+        tasks = set()
+        batch = []
+
+        async def submit(batch):
+            self.checkpoint.submit(batch[-1][0])
+            task = asyncio.create_task(self.process_batch(batch))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+            # 下一批在上一批收尾时就开始，避免批次末尾并发度下降；同时限制读取不会远远跑在处理前面
+            while len(tasks) >= 2:
+                await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+            elapsed = max(time.monotonic() - started, 1e-6)
+            processed = self.counts.get('processed', 0)
+            logging.info(f"导入进度：{self.counts}，{processed / elapsed * 3600:.0f} 篇/小时，检查点：{self.checkpoint.last_id}")
+
+        try:
+            for ordinal, record in enumerate(records, 1):
+                if ordinal <= self.checkpoint.last_id:
+                    continue
+                # 空行与跳过的记录也占用序号，续跑时与输入文件一一对应
+                batch.append((ordinal,) + (record or (None, None)))
+                if len(batch) >= self.batch_size:
+                    await submit(batch)
+                    batch = []
+                if self.failed_batch:
+                    break
+            else:
+                if batch:
+                    await submit(batch)
+            if tasks:
+                await asyncio.gather(*tasks)
+        finally:
+            await self.writer.close()
+            self.executor.shutdown()
+        if self.failed_batch:
+            raise RuntimeError(f"第 {self.failed_batch[0]}-{self.failed_batch[1]} 条记录处理失败，导入已停止，"
+                               f"检查点停在 {self.checkpoint.last_id}，修正后重新运行即可从该批续跑")
+        logging.info(f"批量导入完成：{self.counts}，耗时 {time.monotonic() - started:.0f} 秒")
+
+
+async def main():
+    arg_parser = argparse.ArgumentParser(description='从OPML订阅列表或JSONL/WARC归档批量导入订阅源与文章，可从检查点断点续跑')
+    arg_parser.add_argument('input', help='OPML、JSONL或WARC文件，可为.gz压缩')
+    arg_parser.add_argument('--format', choices=sorted(READERS), help='输入格式，默认按文件扩展名判断')
+    arg_parser.add_argument('--source-id', type=int, help='未指定source_id的文章归入的RSS源')
+    arg_parser.add_argument('--sources-only', action='store_true', help='只写入订阅源，不抓取其中的条目')
+    arg_parser.add_argument('--checkpoint', help='检查点文件路径，默认为 bulk_import.<输入文件名>.checkpoint.json')
+    arg_parser.add_argument('--restart', action='store_true', help='忽略已有检查点，从头开始')
+    arg_parser.add_argument('--batch-size', type=int, default=500, help='每批去重与处理的记录数')
+    arg_parser.add_argument('--concurrency', type=int, default=32, help='同时处理的条目数')
+    arg_parser.add_argument('--workers', type=int, default=os.cpu_count(), help='提取归档页面正文的进程数')
+    args = arg_parser.parse_args()
+
+    checkpoint_path = args.checkpoint or f'bulk_import.{os.path.basename(args.input)}.checkpoint.json'
+    if args.restart and os.path.exists(checkpoint_path):
+        os.remove(checkpoint_path)
+    reader = READERS[args.format or detect_format(args.input)]
+
+    storage = await open_storage()
+    try:
+        importer = BulkImporter(storage, Checkpoint(checkpoint_path), source_id=args.source_id,
+                                fetch_feeds=not args.sources_only, batch_size=args.batch_size,
+                                concurrency=args.concurrency, workers=args.workers)
+        await importer.run(reader(args.input))
+    finally:
+        await storage.close()
+
+
+if __name__ == "__main__":
+    setup_logging()
+    asyncio.run(main())
@@ -0,0 +1,106 @@
+import functools
+import json
+import logging
+import os
+from dataclasses import dataclass, field
+from typing import Dict, Optional
+
+from utils import load_env
+
+
+class ConfigError(Exception):
+    pass
+
+
+@dataclass(frozen=True)
+class DatabaseConfig:
+    host: Optional[str]
+    port: int
+    name: Optional[str]
+    user: Optional[str]
+    password: Optional[str]
+    pool_min_size: int = 1
+    pool_max_size: int = 10
+    # 连接空闲超过该秒数后重建，应小于MySQL的wait_timeout；-1表示不回收
+    pool_recycle: int = -1
+    # mysql 或 sqlite；sqlite为嵌入式数据库文件，适合单机部署与测试
+    backend: str = 'mysql'
+    sqlite_path: str = './insightfocus.db'
+
+
+@dataclass(frozen=True)
+class Settings:
+    database: DatabaseConfig
+    log_level: str
+    page_pool_size: int
+    browser_restart_count: int
+    browser_pool_size: int
+    browser_max_rss_mb: int
+    browser_max_open_pages: int
+    browser_check_interval: int
+    # 所有 *_CONFIG 环境变量解析后的模型配置，键为去掉 _CONFIG 后缀的名称，如 CONTENT_PROCESSOR
+    agent_configs: Dict[str, dict] = field(default_factory=dict)
+
+    def agent_config(self, config_name):
+        config = self.agent_configs.get(config_name)
+        if config is None:
+            raise ConfigError(f"{config_name}_CONFIG 未配置")
+        return dict(config)
+
+
+def _int(name, default):
+    value = os.getenv(name)
+    if value in (None, ''):
+        return default
+    try:
+        return int(value)
+    except ValueError:
+        raise ConfigError(f"{name} 必须是整数，当前值: {value}")
+
+
+def _agent_configs():
+    configs = {}
+    for key, value in os.environ.items():
+        if not key.endswith('_CONFIG') or not value.lstrip().startswith('{'):
+            continue
+        try:
+            config = json.loads(value)
+        except json.JSONDecodeError as e:
+            raise ConfigError(f"Invalid configuration for {key[:-len('_CONFIG')]}: {str(e)}")
+        configs[key[:-len('_CONFIG')]] = config
+    return configs
+
+
+@functools.lru_cache(maxsize=None)
+def get_settings():
+    """读取并校验一次配置，之后的调用直接返回缓存的对象"""
+    load_env()
+    log_level = (os.getenv('LOG_LEVEL') or 'INFO').upper()
+    if not isinstance(getattr(logging, log_level, None), int):
+        raise ConfigError(f'Invalid log level: {log_level}')
+    storage_backend = (os.getenv('STORAGE_BACKEND') or 'mysql').lower()
+    if storage_backend not in ('mysql', 'sqlite'):
+        raise ConfigError(f'Invalid storage backend: {storage_backend}')
+
+    return Settings(
+        database=DatabaseConfig(
+            host=os.getenv('DB_HOST'),
+            port=_int('DB_PORT', 3306),
+            name=os.getenv('DB_NAME'),
+            user=os.getenv('DB_USER'),
+            password=os.getenv('DB_PASSWORD'),
+            pool_min_size=_int('DB_POOL_MIN_SIZE', 1),
+            pool_max_size=_int('DB_POOL_MAX_SIZE', 10),
+            pool_recycle=_int('DB_POOL_RECYCLE', -1),
+            backend=storage_backend,
+            sqlite_path=os.getenv('SQLITE_PATH') or './insightfocus.db',
+        ),
+        log_level=log_level,
+        page_pool_size=_int('PAGE_POOL_SIZE', 10),
+        browser_restart_count=_int('BROWSER_RESTART_COUNT', 0),
+        browser_pool_size=_int('BROWSER_POOL_SIZE', 2),
+        browser_max_rss_mb=_int('BROWSER_MAX_RSS_MB', 1024),
+        browser_max_open_pages=_int('BROWSER_MAX_OPEN_PAGES', 0),
+        browser_check_interval=_int('BROWSER_CHECK_INTERVAL', 15),
+        agent_configs=_agent_configs(),
+    )
@@ -1,121 +1,232 @@
+import asyncio
 import logging
-
-from bs4 import BeautifulSoup
+from datetime import datetime
 
 from agents.summaryAgent import SummaryAgent
+from article_writer import ArticleWriter
 from conf.consts import GENRES, TOPICS
 from general_crawler import GeneralCrawler
-from utils import hash_text, detect_language, estimate_read_time
-from db_operations import with_transaction, process_rss_item_transaction, check_existing_article
-
-async def process_rss_items(db_pool, rss_items):
-    for item in rss_items:
-        logging.info(f"-----------------------------------------------")
-
-        url = item.get('url')
-        title = item['title']
-        
-        logging.info(f"正在处理->{url}")
-        logging.info(f"标题：{title}")
-        
-        url_hash = hash_text(url)
-
-        # 检查URL是否已存在
-        existing_article = await with_transaction(db_pool, check_existing_article, url_hash=url_hash)
-        if existing_article:
-            logging.info(f"文章URL已存在，跳过：{url}")
-            continue
-
-        crawler = GeneralCrawler()
-        resultCrawler =  await crawler.crawl_async(url)
-        original_html = resultCrawler['content']
-        item['original_html'] = original_html
-        plain_content = resultCrawler['plain_content']
-
-        if resultCrawler.get('status_code') != 200:
-            continue
-
-        html_hash = hash_text(resultCrawler.get('content'))
-        
-        # 检查内容是否已存在
-        existing_article = await with_transaction(db_pool, check_existing_article, html_hash=html_hash)
-        if existing_article:
-            logging.info(f"文章内容已存在，跳过：{url}")
-            continue
-        
-        try:
-            ai_result = await SummaryAgent().process_content(title, plain_content)
-            
-            if ai_result is None:
-                logging.warning(f"AI摘要处理失败，项目：{url}。使用标题代替摘要。")
-                summary = title
-                tags = []
+from html_store import get_html_store
+from utils import hash_text, detect_language, estimate_read_time, get_env
+from ingest_scheduler import get_ingest_scheduler
+from metrics import QUEUE_DEPTH
+from deadline import Deadline, DeadlineExceeded, run_stage
+from localQueue import LocalQueue
+
+_retry_queue = None
+
+
+async def process_rss_items(storage, rss_items):
+    # 先取回上一轮超时或因预算留下的条目，与本轮新条目一起处理
+    rss_items = drain_retry_queue(rss_items)
+    # 积压时按新鲜度与源优先级排序，过旧的条目丢弃或排到最后，同时保持站点交错
+    scheduler = get_ingest_scheduler()
+    rss_items = scheduler.plan(rss_items)
+    item_budget = get_env('ITEM_DEADLINE', 180, float)
+    llm_used = 0
+    # 处理完成的文章先进入写回缓冲，按批写入数据库
+    writer = ArticleWriter(storage) if get_env('ARTICLE_WRITE_BEHIND', True, bool) else None
+    try:
+        for index, item in enumerate(rss_items):
+            if scheduler.budget_exhausted(llm_used):
+                # 剩余条目留到下一轮，届时它们已积累了等待时间，会排在更前面
+                logging.info(f"本轮大模型预算（{scheduler.llm_budget} 篇）已用完，{len(rss_items) - index} 个条目留到下一轮")
+                carry_over_items(scheduler.deferred(rss_items[index:]))
+                break
+            QUEUE_DEPTH.set(len(rss_items) - index, queue='rss_items')
+            scheduler.started(item)
+            # 每个条目有独立的总时间预算，超时后取消并放回重试队列，避免单个条目阻塞整轮处理
+            deadline = Deadline(item_budget)
+            with deadline.activate():
+                try:
+                    if await run_stage('item', process_rss_item(storage, item, writer)):
+                        llm_used += 1
+                except DeadlineExceeded as e:
+                    logging.warning(f"处理超时，已取消并放回重试队列 {item.get('url')}: {str(e)}")
+                    requeue_item(item, str(e))
+    finally:
+        if writer:
+            await writer.close()
+
+    QUEUE_DEPTH.set(0, queue='rss_items')
+
+
+def get_retry_queue():
+    global _retry_queue
+    if _retry_queue is None:
+        _retry_queue = LocalQueue(persistence_file=get_env('RETRY_QUEUE_FILE', 'retry_queue.json', str))
+    return _retry_queue
+
+
+def requeue_item(item, reason):
+    attempts = item.get('attempts', 0) + 1
+    if attempts >= get_env('ITEM_MAX_ATTEMPTS', 3, int):
+        logging.error(f"条目已超时 {attempts} 次，放弃处理：{item.get('url')}，原因：{reason}")
+        return
+    retry_item = dict(item)
+    retry_item['attempts'] = attempts
+    retry_item['last_error'] = reason
+    get_retry_queue().enqueue(_queue_item(retry_item))
+
+
+def carry_over_items(items):
+    """预算用完未处理的条目放入重试队列，下一轮与新条目一起排序，不计入重试次数"""
+    retry_queue = get_retry_queue()
+    for item in items:
+        retry_queue.enqueue(_queue_item(dict(item)))
+
+
+def _queue_item(item):
+    # 重试队列会持久化为JSON
+    if isinstance(item.get('published_at'), datetime):
+        item['published_at'] = item['published_at'].strftime('%Y-%m-%d %H:%M:%S')
+    return item
+
+
+def drain_retry_queue(rss_items):
+    retry_queue = get_retry_queue()
+    retried = []
+    while not retry_queue.is_empty():
+        item = retry_queue.dequeue()
+        if item:
+            retried.append(item)
+    if not retried:
+        return rss_items
+    logging.info(f"从重试队列取回 {len(retried)} 个条目")
+    seen = {item['url'] for item in retried}
+    return retried + [item for item in rss_items if item['url'] not in seen]
+
+
+async def process_rss_item(storage, item, writer=None):
+    """处理单个条目，进入大模型阶段时返回True（计入每轮的大模型预算），去重跳过或抓取失败时返回None"""
+    url = item.get('url')
+    title = item.get('title')
+
+    # 逐条目的日志使用%参数，级别或采样过滤掉时不做字符串格式化
+    logging.info("正在处理->%s 标题：%s", url, title, extra={'url': url})
+
+    url_hash = hash_text(url)
+
+    # 检查URL是否已存在
+    existing_article = (writer and writer.is_pending(url_hash=url_hash)) or \
+        await storage.check_existing_article(url_hash=url_hash)
+    if existing_article:
+        logging.info("文章URL已存在，跳过：%s", url)
+        return
+
+    crawler = GeneralCrawler()
+    resultCrawler =  await crawler.crawl_async(url)
+    if resultCrawler.get('status_code') != 200:
+        return
+
+    # 批量导入的URL可能没有标题，使用页面中提取的标题
+    if not title:
+        item = dict(item, title=resultCrawler.get('title') or url)
+
+    # 抓取结果中只保留一份HTML（original_html），不再另存到item中
+    return await process_fetched_item(storage, item, url_hash, resultCrawler['original_html'],
+                                      resultCrawler['plain_content'], writer)
+
+
+async def process_fetched_item(storage, item, url_hash, original_html, plain_content, writer=None):
+    """已取得页面与正文的条目：按内容去重、保存原始HTML、摘要与分类后写入，返回值同process_rss_item；
+    批量导入时来自归档的页面直接从这里开始，不再抓取"""
+    url = item.get('url')
+    title = item['title']
+    html_hash = hash_text(original_html)
+
+    # 检查内容是否已存在
+    existing_article = (writer and writer.is_pending(html_hash=html_hash)) or \
+        await storage.check_existing_article(html_hash=html_hash)
+    if existing_article:
+        logging.info("文章内容已存在，跳过：%s", url)
+        return
+
+    # 原始HTML写入磁盘内容寻址存储，数据库中original_html保持为空，修复提取器后可离线重新处理
+    try:
+        get_html_store().put(original_html, html_hash)
+    except Exception as e:
+        logging.warning(f"原始HTML保存失败 {url}: {str(e)}")
+
+    try:
+        ai_result = await SummaryAgent().process_content(title, plain_content)
+
+        if ai_result is None:
+            logging.warning(f"AI摘要处理失败，项目：{url}。使用标题代替摘要。")
+            summary = title
+            tags = []
+        else:
+            summary = ai_result.get('summary', "")
+            tags = ai_result.get('tags', [])
+            logging.info("AI摘要处理完成，项目：%s", url)
+            logging.debug("Summary: %s Tags: %s", summary, tags)
+
+
+        # 使用新的classify_article函数
+        classifiedInfo = await SummaryAgent().classify_article(title, summary, tags)
+
+        genre_id = 0  # 默认题材ID
+        topic_id = 0  # 默认主题ID
+
+        if classifiedInfo:
+            genre_id = classifiedInfo.get('genre_id', 0)
+            topic_id = classifiedInfo.get('topic_id', 0)
+
+            # 定义一个辅助函数来获取名称
+            def get_name(id, id_list):
+                return next((name for _id, name, _ in id_list if _id == id), None)
+
+            # 获取类型名称
+            genre_name = get_name(genre_id, GENRES)
+            if genre_name:
+                logging.debug("文章题材ID：%s, 题材：%s", genre_id, genre_name)
             else:
-                logging.info(f"AI摘要处理完成，项目：{url}")
-                summary = ai_result.get('summary', "")
-                tags = ai_result.get('tags', [])
-                logging.info(f"Summary:\r\n{summary}")
-                logging.info(f"Tags: {', '.join(tags)}")
-
-
-            # 使用新的classify_article函数
-            classifiedInfo = await SummaryAgent().classify_article(title, summary, tags)
-
-            genre_id = 0  # 默认题材ID
-            topic_id = 0  # 默认主题ID
-
-            if classifiedInfo:
-                genre_id = classifiedInfo.get('genre_id', 0)
-                topic_id = classifiedInfo.get('topic_id', 0)
-
-                # 定义一个辅助函数来获取名称
-                def get_name(id, id_list):
-                    return next((name for _id, name, _ in id_list if _id == id), None)
-
-                # 获取类型名称
-                genre_name = get_name(genre_id, GENRES)
-                if genre_name:
-                    logging.info(f"文章题材ID：{genre_id}, 题材：{genre_name}")
-                else:
-                    logging.warning(f"未找到题材ID：{genre_id}对应的题材名，项目：{url}")
-
-                # 获取分类名称
-                topic_name = get_name(topic_id, TOPICS)
-                if topic_name:
-                    logging.info(f"文章主题ID：{topic_id}, 主题名：{topic_name}")
-                else:
-                    logging.warning(f"未找到主题ID：{topic_id}对应的主题名称，项目：{url}")
+                logging.warning(f"未找到题材ID：{genre_id}对应的题材名，项目：{url}")
+
+            # 获取分类名称
+            topic_name = get_name(topic_id, TOPICS)
+            if topic_name:
+                logging.debug("文章主题ID：%s, 主题名：%s", topic_id, topic_name)
             else:
-                logging.warning(f"文章分类失败，项目：{url}。使用默认分类。")
-
-            language = detect_language(original_html)
-            read_time = estimate_read_time(plain_content)
-
-            # 在一个事务中处理整个RSS项目
-            await with_transaction(
-                db_pool, 
-                process_rss_item_transaction, 
-                item, 
-                url_hash, 
-                html_hash, 
-                plain_content, 
-                summary, 
-                tags, 
-                genre_id,
-                topic_id,
-                language, 
-                read_time
-            )
-
-        except Exception as e:
-            logging.error(f"处理项目时出错 {url}: {str(e)}")
-            continue
+                logging.warning(f"未找到主题ID：{topic_id}对应的主题名称，项目：{url}")
+        else:
+            logging.warning(f"文章分类失败，项目：{url}。使用默认分类。")
+
+        language = detect_language(original_html)
+        read_time = estimate_read_time(plain_content)
+
+        if writer:
+            await writer.submit(item, url_hash, html_hash, plain_content, summary, tags, genre_id, topic_id, language, read_time)
+            return True
+
+        # 在一个事务中处理整个RSS项目；大模型结果已经拿到，屏蔽取消，条目超时也让写入完成
+        await asyncio.shield(storage.save_article(
+            item, 
+            url_hash, 
+            html_hash, 
+            plain_content, 
+            summary, 
+            tags, 
+            genre_id,
+            topic_id,
+            language, 
+            read_time
+        ))
+        return True
+
+    except DeadlineExceeded:
+        raise
+    except Exception as e:
+        logging.error(f"处理项目时出错 {url}: {str(e)}")
+        # 已进入大模型阶段，同样计入预算
+        return True
 
 
 def extract_plain_content(html_content):
     if not html_content:
         return None
-    
+
+    from bs4 import BeautifulSoup
     soup = BeautifulSoup(html_content, 'html.parser')
     
     for script in soup(["script", "style"]):
@@ -39,7 +39,10 @@ CREATE TABLE IF NOT EXISTS rssSources (
     name VARCHAR(255) NOT NULL,
     description TEXT,
     last_fetched_at DATETIME,
-    update_interval INT NOT NULL DEFAULT 3600  -- 新增字段，默认更新间隔为1小时（3600秒）
+    update_interval INT NOT NULL DEFAULT 3600,  -- 新增字段，默认更新间隔为1小时（3600秒）；自适应轮询时为最近一次安排的间隔
+    last_polled_at DATETIME,  -- 最近一次抓取订阅源的时间
+    next_poll_at DATETIME,  -- 下次抓取时间，为空表示尽快抓取
+    poll_errors INT NOT NULL DEFAULT 0  -- 连续抓取失败次数，用于退避
 );
 
 -- 创建文章表
@@ -61,7 +64,10 @@ CREATE TABLE IF NOT EXISTS articles (
     language VARCHAR(50),
     read_time INT,
     last_updated_at DATETIME,
-    UNIQUE KEY (url_hash)
+    UNIQUE KEY (url_hash),
+    KEY idx_html_hash (html_hash),  -- 按内容去重
+    KEY idx_fetched_at (fetched_at),  -- 关注匹配读取最近入库的文章
+    KEY idx_source_published (source_id, published_at)  -- 按源统计发布速率
 );
 
 -- 创建用户-RSS源关联表
@@ -78,13 +84,24 @@ CREATE TABLE IF NOT EXISTS userFocuses (
     content TEXT NOT NULL
 );
 
+-- 创建关注点过滤器表（由userFocuses.content编译而来，内容变化时重新编译）
+CREATE TABLE IF NOT EXISTS focusFilters (
+    focus_id INT PRIMARY KEY,
+    content_hash VARCHAR(64) NOT NULL,
+    filter TEXT NOT NULL,
+    compiled_at DATETIME
+);
+
 -- 创建关注内容表
 CREATE TABLE IF NOT EXISTS focusedContents (
     id BIGINT AUTO_INCREMENT PRIMARY KEY,
     user_id INT NOT NULL,
     article_id BIGINT NOT NULL,
     focus_id INT NOT NULL,
-    created_at DATETIME
+    via_article_id BIGINT,  -- 相关性结论来自同一事件簇的代表文章时记录其ID，直接判断的为NULL
+    created_at DATETIME,
+    UNIQUE KEY uk_user_article_focus (user_id, article_id, focus_id),
+    KEY idx_user_created (user_id, created_at, id)  -- 读取侧API按 (created_at, id) 键集分页
 );
 
 -- 创建用户文章状态表
@@ -93,7 +110,8 @@ CREATE TABLE IF NOT EXISTS userArticleStatus (
     user_id INT NOT NULL,
     article_id BIGINT NOT NULL,
     status ENUM('unread', 'read', 'read_later') NOT NULL,
-    updated_at DATETIME
+    updated_at DATETIME,
+    UNIQUE KEY uk_user_article (user_id, article_id)
 );
 
 -- 创建标签表
@@ -107,7 +125,8 @@ CREATE TABLE IF NOT EXISTS tags (
 CREATE TABLE IF NOT EXISTS article_tags (
     id BIGINT AUTO_INCREMENT PRIMARY KEY,
     article_id BIGINT NOT NULL,
-    tag_id INT NOT NULL
+    tag_id INT NOT NULL,
+    UNIQUE KEY uk_article_tag (article_id, tag_id)
 );
 
 -- 以下是插入数据的部分，保持不变
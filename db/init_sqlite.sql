@@ -0,0 +1,114 @@
+-- InsightFocus 嵌入式SQLite存储的表结构
+-- 描述: 与 init.sql 中的MySQL表结构一致，由 sqlite_storage.py 在打开数据库时执行，可重复执行。
+--       主题与体裁的初始数据由程序从 conf/consts.py 写入。
+
+CREATE TABLE IF NOT EXISTS topics (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    description TEXT
+);
+
+CREATE TABLE IF NOT EXISTS genres (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    description TEXT
+);
+
+CREATE TABLE IF NOT EXISTS rssUsers (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    username TEXT NOT NULL,
+    email TEXT NOT NULL UNIQUE,
+    created_at DATETIME,
+    last_login_at DATETIME
+);
+
+CREATE TABLE IF NOT EXISTS rssSources (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    url TEXT NOT NULL,
+    name TEXT NOT NULL,
+    description TEXT,
+    last_fetched_at DATETIME,
+    update_interval INTEGER NOT NULL DEFAULT 3600,
+    last_polled_at DATETIME,
+    next_poll_at DATETIME,
+    poll_errors INTEGER NOT NULL DEFAULT 0
+);
+
+CREATE TABLE IF NOT EXISTS articles (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    guid TEXT,
+    source_id INTEGER NOT NULL,
+    genre_id INTEGER,
+    topic_id INTEGER,
+    url TEXT NOT NULL,
+    url_hash TEXT NOT NULL UNIQUE,
+    title TEXT NOT NULL,
+    original_html TEXT,
+    plain_content TEXT,
+    html_hash TEXT,
+    published_at DATETIME,
+    fetched_at DATETIME,
+    summary TEXT,
+    language TEXT,
+    read_time INTEGER,
+    last_updated_at DATETIME
+);
+-- 按内容去重与按入库时间读取最近文章
+CREATE INDEX IF NOT EXISTS idx_articles_html_hash ON articles (html_hash);
+CREATE INDEX IF NOT EXISTS idx_articles_fetched_at ON articles (fetched_at);
+-- 按源统计发布速率
+CREATE INDEX IF NOT EXISTS idx_articles_source_published ON articles (source_id, published_at);
+
+CREATE TABLE IF NOT EXISTS userRssSources (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INTEGER NOT NULL,
+    source_id INTEGER NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS userFocuses (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INTEGER NOT NULL,
+    content TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_user_focuses_user ON userFocuses (user_id);
+
+CREATE TABLE IF NOT EXISTS focusFilters (
+    focus_id INTEGER PRIMARY KEY,
+    content_hash TEXT NOT NULL,
+    filter TEXT NOT NULL,
+    compiled_at DATETIME
+);
+
+CREATE TABLE IF NOT EXISTS focusedContents (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INTEGER NOT NULL,
+    article_id INTEGER NOT NULL,
+    focus_id INTEGER NOT NULL,
+    via_article_id INTEGER,
+    created_at DATETIME,
+    UNIQUE (user_id, article_id, focus_id)
+);
+-- 读取侧API按 (created_at, id) 键集分页
+CREATE INDEX IF NOT EXISTS idx_focused_user_created ON focusedContents (user_id, created_at, id);
+
+CREATE TABLE IF NOT EXISTS userArticleStatus (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INTEGER NOT NULL,
+    article_id INTEGER NOT NULL,
+    status TEXT NOT NULL CHECK (status IN ('unread', 'read', 'read_later')),
+    updated_at DATETIME,
+    UNIQUE (user_id, article_id)
+);
+
+-- 标签名与MySQL默认排序规则一样不区分大小写
+CREATE TABLE IF NOT EXISTS tags (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name TEXT NOT NULL COLLATE NOCASE UNIQUE
+);
+
+CREATE TABLE IF NOT EXISTS article_tags (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    article_id INTEGER NOT NULL,
+    tag_id INTEGER NOT NULL,
+    UNIQUE (article_id, tag_id)
+);
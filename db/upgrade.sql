@@ -0,0 +1,45 @@
+-- InsightFocus 数据库升级脚本
+-- 描述: 对已按旧版 init.sql 建好的数据库执行，使其与当前 init.sql 一致。
+--       新部署直接执行 init.sql 即可，无需执行本脚本。
+
+USE InsightFocus;
+
+-- 读取侧API：关注清单键集分页索引，以及去重/状态批量写入所需的唯一索引
+-- 执行前如有重复行需先清理
+ALTER TABLE focusedContents
+    ADD UNIQUE KEY uk_user_article_focus (user_id, article_id, focus_id),
+    ADD KEY idx_user_created (user_id, created_at, id);
+
+ALTER TABLE userArticleStatus
+    ADD UNIQUE KEY uk_user_article (user_id, article_id);
+
+-- 事件聚类：记录关注结论来源的代表文章
+ALTER TABLE focusedContents
+    ADD COLUMN via_article_id BIGINT AFTER focus_id;
+
+-- 关注点编译：结构化过滤器
+CREATE TABLE IF NOT EXISTS focusFilters (
+    focus_id INT PRIMARY KEY,
+    content_hash VARCHAR(64) NOT NULL,
+    filter TEXT NOT NULL,
+    compiled_at DATETIME
+);
+
+-- 批量写入文章：标签关联去重，使 INSERT IGNORE 生效
+-- 执行前如有重复行需先清理
+ALTER TABLE article_tags
+    ADD UNIQUE KEY uk_article_tag (article_id, tag_id);
+
+-- 存储接口：按内容去重与读取最近文章的索引（SQLite后端见 init_sqlite.sql）
+ALTER TABLE articles
+    ADD KEY idx_html_hash (html_hash),
+    ADD KEY idx_fetched_at (fetched_at);
+
+-- 自适应订阅源轮询：抓取计划与失败退避
+ALTER TABLE rssSources
+    ADD COLUMN last_polled_at DATETIME,
+    ADD COLUMN next_poll_at DATETIME,
+    ADD COLUMN poll_errors INT NOT NULL DEFAULT 0;
+
+ALTER TABLE articles
+    ADD KEY idx_source_published (source_id, published_at);
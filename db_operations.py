@@ -1,43 +1,108 @@
 import logging
-import os
+import time
 import aiomysql
-from dotenv import load_dotenv
+from contextlib import asynccontextmanager
 from datetime import datetime, timedelta
 
 from conf.consts import GENRES, TOPICS
+from config import get_settings
+from metrics import histogram, counter, gauge
 from utils import parse_datetime
 
-load_dotenv()
+DB_TRANSACTION_SECONDS = histogram('insightfocus_db_transaction_seconds', '数据库事务耗时（秒）', ('operation',))
+DB_TRANSACTION_ERRORS = counter('insightfocus_db_transaction_errors_total', '回滚的数据库事务数', ('operation',))
+DB_READ_SECONDS = histogram('insightfocus_db_read_seconds', '只读查询耗时（秒）', ('operation',))
+DB_POOL_WAIT_SECONDS = histogram('insightfocus_db_pool_wait_seconds', '从连接池获取连接的等待时间（秒）',
+                                 buckets=(0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5))
+DB_POOL_CONNECTIONS = gauge('insightfocus_db_pool_connections', '连接池中的连接数', ('state',))
+
+# 用户关注清单或阅读状态变化时的回调，参数为user_id，供读取侧API失效缓存
+_focus_listeners = []
+
+def register_focus_listener(callback):
+    _focus_listeners.append(callback)
+
+def unregister_focus_listener(callback):
+    if callback in _focus_listeners:
+        _focus_listeners.remove(callback)
+
+def notify_focus_changed(user_id):
+    for callback in list(_focus_listeners):
+        try:
+            callback(user_id)
+        except Exception as e:
+            logging.error(f"关注清单变更回调出错: {str(e)}")
 
 async def get_db_pool():
     try:
         logging.info("Attempting to create database pool...")
+        database = get_settings().database
         pool = await aiomysql.create_pool(
-            host=os.getenv('DB_HOST'),
-            port=int(os.getenv('DB_PORT')),
-            user=os.getenv('DB_USER'),
-            password=os.getenv('DB_PASSWORD'),
-            db=os.getenv('DB_NAME'),
+            host=database.host,
+            port=database.port,
+            user=database.user,
+            password=database.password,
+            db=database.name,
+            minsize=database.pool_min_size,
+            maxsize=database.pool_max_size,
+            pool_recycle=database.pool_recycle,
             autocommit=True
         )
-        logging.info("Database pool created successfully")
+        logging.info(f"Database pool created successfully (min={database.pool_min_size}, max={database.pool_max_size})")
         return pool
     except Exception as e:
         logging.error(f"Error creating database pool: {e}")
         raise
 
-async def with_transaction(pool, func, *args, **kwargs):
+@asynccontextmanager
+async def acquire(pool):
+    """从连接池取连接并记录等待时间，等待时间持续偏高说明DB_POOL_MAX_SIZE偏小"""
+    started = time.perf_counter()
     async with pool.acquire() as conn:
-        async with conn.cursor() as cur:
-            try:
-                await conn.begin()
-                result = await func(cur, *args, **kwargs)
-                await conn.commit()
-                return result
-            except Exception as e:
-                await conn.rollback()
-                logging.error(f"Transaction failed: {str(e)}")
-                raise
+        DB_POOL_WAIT_SECONDS.observe(time.perf_counter() - started)
+        DB_POOL_CONNECTIONS.set(pool.size, state='total')
+        DB_POOL_CONNECTIONS.set(pool.freesize, state='free')
+        yield conn
+
+async def with_transaction(pool, func, *args, **kwargs):
+    operation = getattr(func, '__name__', 'unknown')
+    with DB_TRANSACTION_SECONDS.time(operation=operation):
+        async with acquire(pool) as conn:
+            async with conn.cursor() as cur:
+                try:
+                    await conn.begin()
+                    result = await func(cur, *args, **kwargs)
+                    await conn.commit()
+                    return result
+                except BaseException as e:
+                    # 被取消时同样回滚；连接可能停在半个查询中，回滚失败时关闭连接，不放回连接池
+                    try:
+                        await conn.rollback()
+                    except Exception:
+                        conn.close()
+                    DB_TRANSACTION_ERRORS.inc(operation=operation)
+                    logging.error(f"Transaction failed: {e!r}")
+                    raise
+
+async def with_read(pool, func, *args, **kwargs):
+    """执行只读查询：连接池为autocommit，不需要BEGIN/COMMIT，省去两次往返"""
+    operation = getattr(func, '__name__', 'unknown')
+    with DB_READ_SECONDS.time(operation=operation):
+        async with acquire(pool) as conn:
+            async with conn.cursor() as cur:
+                return await func(cur, *args, **kwargs)
+
+async def stream_rows(pool, query, params=(), batch_size=1000):
+    """用服务端游标（SSCursor）逐批读取结果，客户端不缓存整个结果集；调用方应尽快消费完，以免长时间占用连接"""
+    async with acquire(pool) as conn:
+        async with conn.cursor(aiomysql.SSCursor) as cur:
+            await cur.execute(query, params)
+            while True:
+                rows = await cur.fetchmany(batch_size)
+                if not rows:
+                    return
+                for row in rows:
+                    yield row
 
 async def check_existing_article(cur, url_hash=None, html_hash=None):
     if url_hash:
@@ -48,6 +113,14 @@ async def check_existing_article(cur, url_hash=None, html_hash=None):
         return None
     return await cur.fetchone()
 
+async def get_existing_url_hashes(cur, url_hashes):
+    """批量去重：返回url_hashes中已入库的部分"""
+    if not url_hashes:
+        return set()
+    placeholders = ', '.join(['%s'] * len(url_hashes))
+    await cur.execute(f"SELECT url_hash FROM articles WHERE url_hash IN ({placeholders})", tuple(url_hashes))
+    return {row[0] for row in await cur.fetchall()}
+
 async def insert_article(cur, article_data):
     query = """
     INSERT INTO articles (guid, source_id, genre_id, topic_id, url, url_hash, title, original_html, plain_content, 
@@ -97,13 +170,14 @@ async def update_rss_source_last_fetched(cur, source_id):
         WHERE id = %s
     """, (source_id,))
 
-async def process_rss_item_transaction(cur, item, url_hash, html_hash, plain_content, summary, tags, genre_id, topic_id, language, read_time):
+def build_article_data(item, url_hash, html_hash, plain_content, summary, genre_id, topic_id, language, read_time):
+    """组装写入articles表的数据，published_at无法解析时返回None"""
     published_at = parse_datetime(item['published_at'])
     if not published_at:
         logging.error(f"解析published_at日期失败，项目：{item['url']}")
-        return
+        return None
 
-    article_data = {
+    return {
         'guid': item['guid'],
         'source_id': item['source_id'],
         'genre_id': genre_id,
@@ -121,6 +195,11 @@ async def process_rss_item_transaction(cur, item, url_hash, html_hash, plain_con
         'language': language,
         'read_time': read_time
     }
+
+async def process_rss_item_transaction(cur, item, url_hash, html_hash, plain_content, summary, tags, genre_id, topic_id, language, read_time):
+    article_data = build_article_data(item, url_hash, html_hash, plain_content, summary, genre_id, topic_id, language, read_time)
+    if not article_data:
+        return
     
     article_id = await insert_article(cur, article_data)
     
@@ -132,16 +211,230 @@ async def process_rss_item_transaction(cur, item, url_hash, html_hash, plain_con
     else:
         logging.warning(f"插入文章失败：{item['url']}")
 
-async def fetch_rss_sources(pool):
-    async with pool.acquire() as conn:
-        async with conn.cursor() as cur:
-            await cur.execute("SELECT id, url FROM rssSources")
-            return await cur.fetchall()
+ARTICLE_COLUMNS = [
+    'guid', 'source_id', 'genre_id', 'topic_id', 'url', 'url_hash', 'title', 'original_html', 'plain_content',
+    'html_hash', 'published_at', 'fetched_at', 'summary', 'language', 'read_time'
+]
+
+async def insert_articles_batch(cur, rows):
+    """一次写入一批文章：多行INSERT ... ON DUPLICATE KEY、批量建立标签关联、每个源只更新一次last_fetched_at。
+    rows为 (article_data, tags) 列表，返回写入的文章数"""
+    rows = [(data, tags) for data, tags in rows if data]
+    if not rows:
+        return 0
+
+    now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    placeholders = ', '.join(['(' + ', '.join(['%s'] * (len(ARTICLE_COLUMNS) + 1)) + ')'] * len(rows))
+    params = []
+    for data, _ in rows:
+        params.extend(data.get(key) for key in ARTICLE_COLUMNS)
+        params.append(now)  # last_updated_at
+    await cur.execute(f"""
+    INSERT INTO articles ({', '.join(ARTICLE_COLUMNS)}, last_updated_at)
+    VALUES {placeholders}
+    ON DUPLICATE KEY UPDATE
+    title = VALUES(title),
+    original_html = VALUES(original_html),
+    plain_content = VALUES(plain_content),
+    html_hash = VALUES(html_hash),
+    fetched_at = VALUES(fetched_at),
+    summary = VALUES(summary),
+    language = VALUES(language),
+    read_time = VALUES(read_time),
+    last_updated_at = VALUES(last_updated_at),
+    topic_id = VALUES(topic_id),
+    genre_id = VALUES(genre_id)
+    """, tuple(params))
+
+    # 多行upsert的lastrowid不可靠，按url_hash取回文章ID
+    url_hashes = list({data['url_hash'] for data, _ in rows})
+    await cur.execute(
+        f"SELECT id, url_hash FROM articles WHERE url_hash IN ({', '.join(['%s'] * len(url_hashes))})",
+        tuple(url_hashes)
+    )
+    article_ids = {url_hash: article_id for article_id, url_hash in await cur.fetchall()}
+
+    tag_names = list({tag for _, tags in rows for tag in tags if tag})
+    if tag_names:
+        await cur.execute(
+            f"INSERT IGNORE INTO tags (name) VALUES {', '.join(['(%s)'] * len(tag_names))}",
+            tuple(tag_names)
+        )
+        await cur.execute(
+            f"SELECT id, name FROM tags WHERE name IN ({', '.join(['%s'] * len(tag_names))})",
+            tuple(tag_names)
+        )
+        # 标签名比较按数据库排序规则（大小写不敏感），映射时统一小写
+        tag_ids = {name.lower(): tag_id for tag_id, name in await cur.fetchall()}
+        links = {
+            (article_ids[data['url_hash']], tag_ids[tag.lower()])
+            for data, tags in rows for tag in tags
+            if tag and data['url_hash'] in article_ids and tag.lower() in tag_ids
+        }
+        if links:
+            await cur.execute(
+                f"INSERT IGNORE INTO article_tags (article_id, tag_id) VALUES {', '.join(['(%s, %s)'] * len(links))}",
+                tuple(value for link in links for value in link)
+            )
+
+    source_ids = list({data['source_id'] for data, _ in rows})
+    await cur.execute(
+        f"UPDATE rssSources SET last_fetched_at = NOW() WHERE id IN ({', '.join(['%s'] * len(source_ids))})",
+        tuple(source_ids)
+    )
+    return len(rows)
+
+async def get_articles_for_reprocess(cur, since=None, source_id=None, after_id=0, limit=500):
+    """按ID分页获取需要从已存储HTML重新提取正文的文章"""
+    query = "SELECT id, url, html_hash FROM articles WHERE id > %s AND html_hash IS NOT NULL"
+    params = [after_id]
+    if since:
+        query += " AND fetched_at >= %s"
+        params.append(since)
+    if source_id:
+        query += " AND source_id = %s"
+        params.append(source_id)
+    query += " ORDER BY id LIMIT %s"
+    params.append(limit)
+    await cur.execute(query, tuple(params))
+    return await cur.fetchall()
+
+async def update_articles_content(cur, rows):
+    """批量更新重新提取后的正文，rows为 (plain_content, read_time, article_id) 列表"""
+    if not rows:
+        return
+    await cur.executemany("""
+        UPDATE articles
+        SET plain_content = %s, read_time = %s, last_updated_at = NOW()
+        WHERE id = %s
+    """, rows)
+
+async def stream_articles_for_classification(pool, after_id=0, since=None, chunk_size=5000):
+    """使用服务端游标（SSCursor）流式读取待重新分类的文章及其标签，按ID分段查询以免单个游标长时间占用连接"""
+    while True:
+        query = """
+        SELECT a.id, a.title, a.summary, GROUP_CONCAT(t.name SEPARATOR '\\t')
+        FROM articles a
+        LEFT JOIN article_tags at ON at.article_id = a.id
+        LEFT JOIN tags t ON t.id = at.tag_id
+        WHERE a.id > %s
+        """
+        params = [after_id]
+        if since:
+            query += " AND a.fetched_at >= %s"
+            params.append(since)
+        query += " GROUP BY a.id ORDER BY a.id LIMIT %s"
+        params.append(chunk_size)
+
+        rows = 0
+        async for row in stream_rows(pool, query, tuple(params)):
+            rows += 1
+            after_id = row[0]
+            yield {
+                'id': row[0],
+                'title': row[1],
+                'summary': row[2] or '',
+                'tags': row[3].split('\t') if row[3] else []
+            }
+        if rows < chunk_size:
+            return
+
+async def update_articles_classification(cur, rows):
+    """用一条CASE语句批量更新文章分类，rows为 (article_id, topic_id, genre_id) 列表"""
+    if not rows:
+        return
+    topic_cases = ' '.join(['WHEN %s THEN %s'] * len(rows))
+    genre_cases = ' '.join(['WHEN %s THEN %s'] * len(rows))
+    placeholders = ', '.join(['%s'] * len(rows))
+    params = []
+    for article_id, topic_id, _ in rows:
+        params.extend((article_id, topic_id))
+    for article_id, _, genre_id in rows:
+        params.extend((article_id, genre_id))
+    params.extend(article_id for article_id, _, _ in rows)
+    await cur.execute(f"""
+        UPDATE articles
+        SET topic_id = CASE id {topic_cases} ELSE topic_id END,
+            genre_id = CASE id {genre_cases} ELSE genre_id END,
+            last_updated_at = NOW()
+        WHERE id IN ({placeholders})
+    """, tuple(params))
+
+async def fetch_rss_sources(cur):
+    await cur.execute("SELECT id, url FROM rssSources")
+    return await cur.fetchall()
+
+async def add_rss_sources(cur, sources):
+    """sources为 (url, name, description) 列表，只插入URL尚不存在的源，返回 {url: source_id}"""
+    if not sources:
+        return {}
+    urls = list({url for url, _, _ in sources})
+    placeholders = ', '.join(['%s'] * len(urls))
+    query = f"SELECT url, id FROM rssSources WHERE url IN ({placeholders})"
+    await cur.execute(query, tuple(urls))
+    existing = {row[0] for row in await cur.fetchall()}
+    new_sources = list({url: (url, name, description) for url, name, description in sources
+                        if url not in existing}.values())
+    if new_sources:
+        await cur.executemany("INSERT INTO rssSources (url, name, description) VALUES (%s, %s, %s)", new_sources)
+    await cur.execute(query, tuple(urls))
+    return {row[0]: row[1] for row in await cur.fetchall()}
+
+FEED_SCHEDULE_COLUMNS = "id, url, update_interval, last_polled_at, next_poll_at, poll_errors"
+
+def _feed_schedule(row):
+    return {
+        'id': row[0],
+        'url': row[1],
+        'update_interval': row[2],
+        'last_polled_at': row[3],
+        'next_poll_at': row[4],
+        'poll_errors': row[5]
+    }
+
+async def get_feed_schedules(cur):
+    """获取所有订阅源及其抓取计划"""
+    await cur.execute(f"SELECT {FEED_SCHEDULE_COLUMNS} FROM rssSources")
+    return [_feed_schedule(row) for row in await cur.fetchall()]
+
+async def get_source_publish_stats(cur, since):
+    """按源统计since之后发布的文章数与最早发布时间，返回 {source_id: (count, first_published_at)}"""
+    await cur.execute("""
+        SELECT source_id, COUNT(*), MIN(published_at)
+        FROM articles
+        WHERE published_at >= %s
+        GROUP BY source_id
+    """, (since,))
+    return {row[0]: (row[1], row[2]) for row in await cur.fetchall()}
+
+async def update_feed_schedules(cur, rows):
+    """rows为 (update_interval, last_polled_at, next_poll_at, poll_errors, source_id) 列表"""
+    if not rows:
+        return
+    await cur.executemany("""
+        UPDATE rssSources
+        SET update_interval = %s, last_polled_at = %s, next_poll_at = %s, poll_errors = %s
+        WHERE id = %s
+    """, rows)
         
+RECENT_ARTICLE_COLUMNS = "id, genre_id, topic_id, title, summary, url"
+
+def _recent_article(row, genre_mapping, topic_mapping):
+    return {
+        'id': row[0],
+        'genre_id': row[1],
+        'topic_id': row[2],
+        'title': row[3],
+        'summary': row[4],
+        'genre': genre_mapping.get(row[1], '未知类型'),
+        'topic': topic_mapping.get(row[2], '未知分类'),
+        'url': row[5]
+    }
+
 async def get_recent_articles(cur, hours=24):
-    """获取最近24小时内入库的文章"""
-    query = """
-    SELECT id, genre_id, topic_id, title, plain_content, summary, url
+    """获取最近24小时内入库的文章，只取关注匹配用到的列，不读取plain_content"""
+    query = f"""
+    SELECT {RECENT_ARTICLE_COLUMNS}
     FROM articles
     WHERE fetched_at >= %s
     """
@@ -153,22 +446,7 @@ async def get_recent_articles(cur, hours=24):
     topic_mapping = {c[0]: c[1] for c in TOPICS}
 
     # 处理查询结果，并添加类型和分类信息
-    articles = [
-        {
-            'id': row[0],
-            'genre_id': row[1],
-            'topic_id': row[2],
-            'title': row[3],
-            'plain_content': row[4],
-            'summary': row[5],
-            'genre': genre_mapping.get(row[1], '未知类型'),
-            'topic': topic_mapping.get(row[2], '未知分类'),
-            'url': row[6]
-        }
-        for row in results
-    ]
-    
-    return articles
+    return [_recent_article(row, genre_mapping, topic_mapping) for row in results]
 
 async def get_user_focuses(cur, user_id):
     """获取用户的关注内容描述"""
@@ -187,11 +465,177 @@ async def get_user_focuses(cur, user_id):
         for row in results
     ]
 
-async def add_to_focused_contents(cur, user_id, article_id, focus_id):
-    """将符合用户关注的文章添加到关注清单中"""
+async def add_to_focused_contents(cur, user_id, article_id, focus_id, via_article_id=None):
+    """将符合用户关注的文章添加到关注清单中，via_article_id为判断结果来源的事件簇代表文章；
+    调用方在事务提交后调用notify_focus_changed"""
+    query = """
+    INSERT INTO focusedContents (user_id, article_id, focus_id, via_article_id, created_at)
+    VALUES (%s, %s, %s, %s, %s)
+    ON DUPLICATE KEY UPDATE via_article_id = VALUES(via_article_id)
+    """
+    await cur.execute(query, (user_id, article_id, focus_id, via_article_id, datetime.now()))
+
+async def get_focused_articles_page(cur, user_id, limit, before=None):
+    """按 (created_at, id) 倒序做键集分页读取用户关注清单，before为上一页最后一行的 (created_at, id)，
+    依赖 focusedContents(user_id, created_at, id) 索引，翻到多深都只扫描limit行"""
     query = """
-    INSERT INTO focusedContents (user_id, article_id, focus_id, created_at)
-    VALUES (%s, %s, %s, %s)
-    ON DUPLICATE KEY UPDATE created_at = VALUES(created_at)
+    SELECT fc.id, fc.created_at, fc.focus_id, a.id, a.title, a.summary, a.url, a.published_at,
+           a.genre_id, a.topic_id, a.read_time, s.status
+    FROM focusedContents fc
+    JOIN articles a ON a.id = fc.article_id
+    LEFT JOIN userArticleStatus s ON s.user_id = fc.user_id AND s.article_id = fc.article_id
+    WHERE fc.user_id = %s
     """
-    await cur.execute(query, (user_id, article_id, focus_id, datetime.now()))
\ No newline at end of file
+    params = [user_id]
+    if before:
+        created_at, row_id = before
+        query += " AND (fc.created_at < %s OR (fc.created_at = %s AND fc.id < %s))"
+        params.extend((created_at, created_at, row_id))
+    query += " ORDER BY fc.created_at DESC, fc.id DESC LIMIT %s"
+    params.append(limit)
+    await cur.execute(query, tuple(params))
+    results = await cur.fetchall()
+
+    genre_mapping = {t[0]: t[1] for t in GENRES}
+    topic_mapping = {c[0]: c[1] for c in TOPICS}
+    return [
+        {
+            'focused_id': row[0],
+            'created_at': row[1],
+            'focus_id': row[2],
+            'article_id': row[3],
+            'title': row[4],
+            'summary': row[5],
+            'url': row[6],
+            'published_at': row[7],
+            'genre': genre_mapping.get(row[8], '未知类型'),
+            'topic': topic_mapping.get(row[9], '未知分类'),
+            'read_time': row[10],
+            'status': row[11] or 'unread'
+        }
+        for row in results
+    ]
+
+async def get_article_detail(cur, article_id):
+    """获取单篇文章详情及其标签"""
+    await cur.execute("""
+        SELECT a.id, a.source_id, a.genre_id, a.topic_id, a.url, a.title, a.plain_content, a.summary,
+               a.published_at, a.fetched_at, a.language, a.read_time, GROUP_CONCAT(t.name SEPARATOR '\\t')
+        FROM articles a
+        LEFT JOIN article_tags at ON at.article_id = a.id
+        LEFT JOIN tags t ON t.id = at.tag_id
+        WHERE a.id = %s
+        GROUP BY a.id
+    """, (article_id,))
+    row = await cur.fetchone()
+    if not row:
+        return None
+    genre_mapping = {t[0]: t[1] for t in GENRES}
+    topic_mapping = {c[0]: c[1] for c in TOPICS}
+    return {
+        'id': row[0],
+        'source_id': row[1],
+        'genre': genre_mapping.get(row[2], '未知类型'),
+        'topic': topic_mapping.get(row[3], '未知分类'),
+        'url': row[4],
+        'title': row[5],
+        'plain_content': row[6],
+        'summary': row[7],
+        'published_at': row[8],
+        'fetched_at': row[9],
+        'language': row[10],
+        'read_time': row[11],
+        'tags': row[12].split('\t') if row[12] else []
+    }
+
+async def update_user_article_statuses(cur, user_id, updates):
+    """批量写入用户的文章阅读状态，updates为 (article_id, status) 列表，
+    依赖 userArticleStatus(user_id, article_id) 唯一索引"""
+    if not updates:
+        return 0
+    now = datetime.now()
+    await cur.executemany("""
+        INSERT INTO userArticleStatus (user_id, article_id, status, updated_at)
+        VALUES (%s, %s, %s, %s)
+        ON DUPLICATE KEY UPDATE status = VALUES(status), updated_at = VALUES(updated_at)
+    """, [(user_id, article_id, status, now) for article_id, status in updates])
+    return len(updates)
+
+async def get_focused_digest_signatures(cur):
+    """按用户汇总关注清单的条数、最新时间与最大ID，作为订阅源是否需要重新生成的签名"""
+    await cur.execute("""
+        SELECT user_id, COUNT(*), MAX(created_at), MAX(id)
+        FROM focusedContents
+        GROUP BY user_id
+    """)
+    results = await cur.fetchall()
+    return {
+        row[0]: [row[1], row[2].isoformat() if row[2] else None, row[3]]
+        for row in results
+    }
+
+async def get_all_focuses(cur):
+    """获取所有用户的关注内容"""
+    await cur.execute("SELECT id, user_id, content FROM userFocuses")
+    results = await cur.fetchall()
+    return [
+        {
+            'id': row[0],
+            'user_id': row[1],
+            'content': row[2]
+        }
+        for row in results
+    ]
+
+async def get_user_ids(cur):
+    await cur.execute("SELECT id FROM rssUsers")
+    return [row[0] for row in await cur.fetchall()]
+
+async def get_focus_filters(cur, focus_ids):
+    """读取已编译的关注点过滤器，返回 {focus_id: (content_hash, filter_json)}"""
+    if not focus_ids:
+        return {}
+    placeholders = ', '.join(['%s'] * len(focus_ids))
+    await cur.execute(f"""
+        SELECT focus_id, content_hash, filter
+        FROM focusFilters
+        WHERE focus_id IN ({placeholders})
+    """, tuple(focus_ids))
+    results = await cur.fetchall()
+    return {row[0]: (row[1], row[2]) for row in results}
+
+async def save_focus_filter(cur, focus_id, content_hash, filter_json):
+    await cur.execute("""
+        INSERT INTO focusFilters (focus_id, content_hash, filter, compiled_at)
+        VALUES (%s, %s, %s, %s)
+        ON DUPLICATE KEY UPDATE content_hash = VALUES(content_hash), filter = VALUES(filter), compiled_at = VALUES(compiled_at)
+    """, (focus_id, content_hash, filter_json, datetime.now()))
+
+async def get_articles_tags(cur, article_ids):
+    """批量获取文章标签，返回 {article_id: [tag, ...]}"""
+    if not article_ids:
+        return {}
+    placeholders = ', '.join(['%s'] * len(article_ids))
+    await cur.execute(f"""
+        SELECT at.article_id, t.name
+        FROM article_tags at
+        JOIN tags t ON t.id = at.tag_id
+        WHERE at.article_id IN ({placeholders})
+    """, tuple(article_ids))
+    results = await cur.fetchall()
+    tags = {}
+    for article_id, name in results:
+        tags.setdefault(article_id, []).append(name)
+    return tags
+
+async def add_focused_contents_batch(cur, rows):
+    """批量写入关注清单，rows为 (user_id, article_id, focus_id, via_article_id) 列表；
+    已存在的匹配保留首次匹配的created_at，每轮重新判断不会改变清单顺序、分页游标与摘要签名"""
+    if not rows:
+        return
+    now = datetime.now()
+    await cur.executemany("""
+        INSERT INTO focusedContents (user_id, article_id, focus_id, via_article_id, created_at)
+        VALUES (%s, %s, %s, %s, %s)
+        ON DUPLICATE KEY UPDATE via_article_id = VALUES(via_article_id)
+    """, [row + (now,) for row in rows])
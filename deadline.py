@@ -0,0 +1,84 @@
+import asyncio
+import contextvars
+import time
+from contextlib import contextmanager
+
+from metrics import counter
+from utils import get_env
+
+DEADLINE_EXCEEDED = counter('insightfocus_deadline_exceeded_total', '超出时间预算而被取消的阶段数', ('stage',))
+
+# 各阶段默认时间预算（秒），可用 STAGE_<NAME>_TIMEOUT 环境变量覆盖
+STAGE_TIMEOUTS = {
+    'fetch': 60,
+    'extract': 30,
+    'llm': 90,
+}
+
+_current = contextvars.ContextVar('deadline', default=None)
+
+
+class DeadlineExceeded(Exception):
+    def __init__(self, stage, budget=None):
+        self.stage = stage
+        self.budget = budget
+        detail = f"（预算 {budget:.1f} 秒）" if budget is not None else ''
+        super().__init__(f"阶段 {stage} 超出时间预算{detail}")
+
+
+class Deadline:
+    """单个条目的总时间预算，通过contextvars在抓取、提取、大模型调用之间传递"""
+
+    def __init__(self, budget):
+        self.budget = budget
+        self.expires_at = time.monotonic() + budget
+
+    def remaining(self):
+        return self.expires_at - time.monotonic()
+
+    def expired(self):
+        return self.remaining() <= 0
+
+    @contextmanager
+    def activate(self):
+        token = _current.set(self)
+        try:
+            yield self
+        finally:
+            _current.reset(token)
+
+
+def current_deadline():
+    return _current.get()
+
+
+def stage_budget(stage):
+    default = STAGE_TIMEOUTS.get(stage)
+    return get_env(f'STAGE_{stage.upper()}_TIMEOUT', default, float)
+
+
+def time_left(stage=None):
+    """返回当前阶段可用的秒数：取阶段预算与条目剩余预算中的较小值，两者都没有时返回None"""
+    limits = []
+    if stage:
+        budget = stage_budget(stage)
+        if budget:
+            limits.append(budget)
+    deadline = current_deadline()
+    if deadline is not None:
+        limits.append(deadline.remaining())
+    return min(limits) if limits else None
+
+
+async def run_stage(stage, coro):
+    """在时间预算内执行一个阶段，超时取消该协程（其finally会释放页面、连接等资源）并抛出DeadlineExceeded"""
+    timeout = time_left(stage)
+    if timeout is not None and timeout <= 0:
+        coro.close()
+        DEADLINE_EXCEEDED.inc(stage=stage)
+        raise DeadlineExceeded(stage, 0)
+    try:
+        return await asyncio.wait_for(coro, timeout)
+    except asyncio.TimeoutError:
+        DEADLINE_EXCEEDED.inc(stage=stage)
+        raise DeadlineExceeded(stage, timeout)
@@ -0,0 +1,209 @@
+import asyncio
+import gzip
+import json
+import logging
+import os
+import tempfile
+from datetime import datetime
+from xml.etree import ElementTree
+
+from metrics import histogram, counter
+from utils import get_env
+
+DIGEST_SECONDS = histogram('insightfocus_digest_seconds', '用户订阅源生成耗时（秒）', ('operation',))
+DIGESTS_BUILT = counter('insightfocus_digests_built_total', '重新生成的用户订阅源数')
+
+ATOM_NS = 'http://www.w3.org/2005/Atom'
+
+
+class DigestStore:
+    """预生成的用户订阅源文件：每个用户一个目录，存放gzip压缩的Atom与JSON Feed，
+    manifest.json记录生成时各用户关注清单的签名，用于判断哪些用户需要重新生成"""
+
+    FORMATS = {
+        'atom': ('feed.atom.gz', 'application/atom+xml'),
+        'json': ('feed.json.gz', 'application/feed+json'),
+    }
+    MANIFEST = 'manifest.json'
+
+    def __init__(self, root=None):
+        self.root = root or get_env('DIGEST_DIR', './digests', str)
+        os.makedirs(self.root, exist_ok=True)
+
+    def path_for(self, user_id, fmt):
+        return os.path.join(self.root, str(user_id), self.FORMATS[fmt][0])
+
+    def content_type(self, fmt):
+        return self.FORMATS[fmt][1]
+
+    def _write_atomic(self, path, data):
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def write(self, user_id, fmt, data):
+        """写入订阅源，返回是否有变化；内容不变时不重写，保持ETag稳定"""
+        # mtime固定为0，内容不变时压缩结果也不变
+        compressed = gzip.compress(data, compresslevel=9, mtime=0)
+        if self.read(user_id, fmt) == compressed:
+            return False
+        self._write_atomic(self.path_for(user_id, fmt), compressed)
+        return True
+
+    def etag(self, user_id, fmt):
+        """由文件大小与修改时间生成ETag，只需一次stat，不读取文件内容"""
+        try:
+            stat = os.stat(self.path_for(user_id, fmt))
+        except FileNotFoundError:
+            return None
+        return f'"{stat.st_size:x}-{stat.st_mtime_ns:x}"'
+
+    def read(self, user_id, fmt):
+        """返回gzip压缩后的字节，不存在时返回None"""
+        try:
+            with open(self.path_for(user_id, fmt), 'rb') as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def load_manifest(self):
+        path = os.path.join(self.root, self.MANIFEST)
+        if not os.path.exists(path):
+            return {}
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            logging.warning(f"订阅源manifest读取失败，将全部重新生成: {str(e)}")
+            return {}
+
+    def save_manifest(self, manifest):
+        data = json.dumps(manifest, ensure_ascii=False, sort_keys=True).encode('utf-8')
+        self._write_atomic(os.path.join(self.root, self.MANIFEST), data)
+
+
+_store = None
+
+
+def get_digest_store():
+    global _store
+    if _store is None:
+        _store = DigestStore()
+    return _store
+
+
+def _timestamp(value):
+    # 数据库中的时间为本地时间，输出时带上时区偏移
+    return (value or datetime.now()).astimezone().isoformat(timespec='seconds')
+
+
+def _dedupe(items):
+    """同一文章命中多个关注点时只保留最新的一条"""
+    seen = set()
+    result = []
+    for item in items:
+        if item['article_id'] in seen:
+            continue
+        seen.add(item['article_id'])
+        result.append(item)
+    return result
+
+
+def render_atom(user_id, items, base_url=None):
+    ElementTree.register_namespace('', ATOM_NS)
+    feed = ElementTree.Element(f'{{{ATOM_NS}}}feed')
+
+    def sub(parent, tag, text=None, **attrs):
+        element = ElementTree.SubElement(parent, f'{{{ATOM_NS}}}{tag}', attrs)
+        if text is not None:
+            element.text = str(text)
+        return element
+
+    sub(feed, 'id', f'urn:insightfocus:user:{user_id}')
+    sub(feed, 'title', 'InsightFocus 关注清单')
+    sub(feed, 'updated', _timestamp(items[0]['created_at'] if items else None))
+    if base_url:
+        sub(feed, 'link', rel='self', href=f'{base_url.rstrip("/")}/users/{user_id}/feed.atom')
+    for item in items:
+        entry = sub(feed, 'entry')
+        sub(entry, 'id', f'urn:insightfocus:article:{item["article_id"]}')
+        sub(entry, 'title', item['title'])
+        sub(entry, 'link', href=item['url'])
+        sub(entry, 'updated', _timestamp(item['created_at']))
+        if item['published_at']:
+            sub(entry, 'published', _timestamp(item['published_at']))
+        sub(entry, 'category', term=item['topic'])
+        sub(entry, 'category', term=item['genre'])
+        if item['summary']:
+            sub(entry, 'summary', item['summary'])
+    return ElementTree.tostring(feed, encoding='utf-8', xml_declaration=True)
+
+
+def render_json_feed(user_id, items, base_url=None):
+    feed = {
+        'version': 'https://jsonfeed.org/version/1.1',
+        'title': 'InsightFocus 关注清单',
+        'items': [
+            {
+                'id': str(item['article_id']),
+                'url': item['url'],
+                'title': item['title'],
+                'summary': item['summary'] or '',
+                'content_text': item['summary'] or '',
+                'date_published': _timestamp(item['published_at'] or item['created_at']),
+                'date_modified': _timestamp(item['created_at']),
+                'tags': [item['topic'], item['genre']],
+                '_insightfocus': {'focus_id': item['focus_id'], 'read_time': item['read_time']},
+            }
+            for item in items
+        ],
+    }
+    if base_url:
+        feed['feed_url'] = f'{base_url.rstrip("/")}/users/{user_id}/feed.json'
+    return json.dumps(feed, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+async def build_user_digest(storage, store, user_id, max_items=None, base_url=None):
+    max_items = max_items or get_env('DIGEST_MAX_ITEMS', 100, int)
+    # 多取一些以抵消同一文章命中多个关注点造成的重复
+    rows = await storage.get_focused_articles_page(user_id, max_items * 2)
+    items = _dedupe(rows)[:max_items]
+    with DIGEST_SECONDS.time(operation='render'):
+        atom = render_atom(user_id, items, base_url)
+        json_feed = render_json_feed(user_id, items, base_url)
+    with DIGEST_SECONDS.time(operation='write'):
+        changed = await asyncio.to_thread(store.write, user_id, 'atom', atom)
+        changed = await asyncio.to_thread(store.write, user_id, 'json', json_feed) or changed
+    if changed:
+        DIGESTS_BUILT.inc()
+
+
+async def refresh_digests(storage, store=None, force=False):
+    """只为关注清单签名（条数、最新时间、最大ID）与上次生成时不同的用户重新生成订阅源"""
+    store = store or get_digest_store()
+    base_url = get_env('DIGEST_BASE_URL')
+    with DIGEST_SECONDS.time(operation='refresh'):
+        signatures = await storage.get_focused_digest_signatures()
+        manifest = store.load_manifest()
+        changed = [
+            user_id for user_id, signature in signatures.items()
+            if force or manifest.get(str(user_id)) != signature
+        ]
+        for user_id in changed:
+            try:
+                await build_user_digest(storage, store, user_id, base_url=base_url)
+                manifest[str(user_id)] = signatures[user_id]
+            except Exception as e:
+                logging.error(f"生成用户 {user_id} 的订阅源失败: {str(e)}")
+        if changed:
+            await asyncio.to_thread(store.save_manifest, manifest)
+    logging.info(f"订阅源已更新：{len(changed)}/{len(signatures)} 个用户")
+    return changed
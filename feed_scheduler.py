@@ -0,0 +1,132 @@
+import calendar
+import logging
+import random
+import time
+from datetime import datetime, timedelta
+
+from metrics import counter, histogram
+from utils import get_env
+
+FEED_POLLS = counter('insightfocus_feed_polls_total', '订阅源抓取结果', ('result',))
+FEED_POLL_INTERVAL = histogram('insightfocus_feed_poll_interval_seconds', '为订阅源安排的下次抓取间隔（秒）',
+                               buckets=(300, 900, 1800, 3600, 3 * 3600, 6 * 3600, 12 * 3600, 86400, 3 * 86400))
+
+
+def _timestamp(value):
+    if value is None:
+        return None
+    if isinstance(value, datetime):
+        return value.timestamp()
+    return datetime.fromisoformat(str(value)).timestamp()
+
+
+def count_new_entries(feed, since):
+    """统计发布时间晚于上次抓取的条目数；feedparser的 *_parsed 字段为UTC时间"""
+    if since is None:
+        return None
+    count = 0
+    for entry in feed.entries:
+        parsed = entry.get('published_parsed') or entry.get('updated_parsed')
+        if parsed and calendar.timegm(parsed) > since:
+            count += 1
+    return count
+
+
+class FeedPollModel:
+    """按发布速率安排抓取：速率取 近期抓取观察到的新条目速率 与 近history_days天已入库文章的发布速率 的加权，
+    下次抓取间隔为预计出现target_entries个新条目所需的时间，限制在[min_interval, max_interval]内。
+    抓取失败时按 min_interval × 2^连续失败次数 退避，同样不超过max_interval"""
+
+    def __init__(self, min_interval=None, max_interval=None, target_entries=None, history_days=None,
+                 recent_weight=None, jitter=None):
+        self.min_interval = min_interval or get_env('FEED_POLL_MIN_INTERVAL', 300, int)
+        self.max_interval = max_interval or get_env('FEED_POLL_MAX_INTERVAL', 86400, int)
+        self.target_entries = target_entries or get_env('FEED_POLL_TARGET_ENTRIES', 2, float)
+        self.history_days = history_days or get_env('FEED_POLL_HISTORY_DAYS', 14, int)
+        self.recent_weight = recent_weight if recent_weight is not None else get_env('FEED_POLL_RECENT_WEIGHT', 0.5, float)
+        # 随机抖动比例，避免同时加入的源总是在同一轮被抓取
+        self.jitter = jitter if jitter is not None else get_env('FEED_POLL_JITTER', 0.1, float)
+
+    def history_rate(self, history, now):
+        """history为 (文章数, 最早发布时间)；入库历史短于统计窗口的新源按实际跨度计算"""
+        if not history or not history[0]:
+            return 0.0
+        count, first_published = history
+        window = self.history_days * 86400
+        first = _timestamp(first_published)
+        if first is not None:
+            window = min(window, max(now - first, 3600))
+        return count / window
+
+    def estimate_rate(self, history, new_entries, elapsed, now):
+        """返回每秒的新条目数"""
+        history_rate = self.history_rate(history, now)
+        if new_entries is None or not elapsed or elapsed <= 0:
+            return history_rate
+        recent_rate = new_entries / elapsed
+        return self.recent_weight * recent_rate + (1 - self.recent_weight) * history_rate
+
+    def next_interval(self, rate, errors=0):
+        if errors:
+            interval = self.min_interval * 2 ** min(errors, 20)
+        elif rate > 0:
+            interval = self.target_entries / rate
+        else:
+            interval = self.max_interval
+        if self.jitter:
+            interval *= 1 + random.uniform(-self.jitter, self.jitter)
+        return int(min(max(interval, self.min_interval), self.max_interval))
+
+
+class FeedPoller:
+    """每轮只抓取到期的源，抓取后根据结果重新计算下次抓取时间并写回rssSources"""
+
+    def __init__(self, model=None):
+        self.model = model or FeedPollModel()
+
+    def is_due(self, source, now):
+        next_poll = _timestamp(source['next_poll_at'])
+        return next_poll is None or next_poll <= now
+
+    async def due_sources(self, storage, now=None):
+        now = now or time.time()
+        sources = await storage.get_feed_schedules()
+        due = [source for source in sources if self.is_due(source, now)]
+        logging.info(f"本轮到期的订阅源 {len(due)}/{len(sources)} 个")
+        return due
+
+    async def record(self, storage, results, now=None):
+        """results为 (source, feed, failed) 列表，批量写回下次抓取时间"""
+        now = now or time.time()
+        since = datetime.fromtimestamp(now) - timedelta(days=self.model.history_days)
+        history = await storage.get_source_publish_stats(since)
+        polled_at = datetime.fromtimestamp(now)
+        rows = []
+        for source, feed, failed in results:
+            if failed:
+                errors = (source['poll_errors'] or 0) + 1
+                interval = self.model.next_interval(0, errors)
+                FEED_POLLS.inc(result='error')
+                logging.warning(f"订阅源 {source['id']} 连续 {errors} 次抓取失败，{interval} 秒后重试")
+            else:
+                errors = 0
+                last_polled = _timestamp(source['last_polled_at'])
+                new_entries = count_new_entries(feed, last_polled)
+                rate = self.model.estimate_rate(history.get(source['id']), new_entries,
+                                                now - last_polled if last_polled else None, now)
+                interval = self.model.next_interval(rate)
+                FEED_POLLS.inc(result='new' if new_entries else 'unchanged')
+            FEED_POLL_INTERVAL.observe(interval)
+            rows.append((interval, polled_at, polled_at + timedelta(seconds=interval), errors, source['id']))
+        if rows:
+            await storage.update_feed_schedules(rows)
+
+
+_poller = None
+
+
+def get_feed_poller():
+    global _poller
+    if _poller is None:
+        _poller = FeedPoller()
+    return _poller
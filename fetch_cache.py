@@ -0,0 +1,194 @@
+import gzip
+import json
+import logging
+import os
+import re
+import tempfile
+import time
+from email.utils import parsedate_to_datetime
+
+from metrics import counter, gauge
+from utils import get_env, hash_text
+
+FETCH_CACHE_REQUESTS = counter('insightfocus_fetch_cache_requests_total', '抓取缓存查询结果', ('result',))
+FETCH_CACHE_BYTES = gauge('insightfocus_fetch_cache_bytes', '抓取缓存当前占用的字节数')
+
+_MAX_AGE_RE = re.compile(r'(?:s-maxage|max-age)\s*=\s*"?(\d+)"?', re.IGNORECASE)
+
+
+class FetchCache:
+    """以URL为键的磁盘抓取缓存，遵循Cache-Control/Expires，保存ETag与Last-Modified以便条件请求；
+    超出容量时按最近访问时间淘汰。httpx与无头浏览器两条抓取路径共用"""
+
+    def __init__(self, root=None, default_ttl=None, min_ttl=None, max_bytes=None):
+        self.root = root or get_env('FETCH_CACHE_DIR', './fetch_cache', str)
+        self.default_ttl = default_ttl if default_ttl is not None else get_env('FETCH_CACHE_TTL', 86400, int)
+        # 文章发布后基本不变，响应头没有给出有效期时至少缓存这么久，保证失败重试与重跑不再重新下载；
+        # 服务器明确给出的 no-cache、max-age、Expires 照常遵守
+        self.min_ttl = min_ttl if min_ttl is not None else get_env('FETCH_CACHE_MIN_TTL', 21600, int)
+        self.max_bytes = max_bytes or get_env('FETCH_CACHE_MAX_BYTES', 1024 * 1024 * 1024, int)
+        self._total_bytes = None
+        os.makedirs(self.root, exist_ok=True)
+
+    def _paths(self, url):
+        key = hash_text(url)
+        directory = os.path.join(self.root, key[:2])
+        return directory, os.path.join(directory, f'{key}.json'), os.path.join(directory, f'{key}.body.gz')
+
+    def _expires_at(self, headers, now):
+        cache_control = (headers.get('cache-control') or '').lower()
+        if 'no-store' in cache_control:
+            return None
+        ttl = None
+        if 'no-cache' in cache_control:
+            # 可以缓存，但每次使用前必须用条件请求重新验证
+            ttl = 0
+        else:
+            match = _MAX_AGE_RE.search(cache_control)
+            if match:
+                ttl = int(match.group(1))
+            elif headers.get('expires'):
+                try:
+                    ttl = parsedate_to_datetime(headers['expires']).timestamp() - time.time()
+                except (TypeError, ValueError):
+                    ttl = 0
+        if ttl is None:
+            ttl = max(self.default_ttl, self.min_ttl)
+        return now + max(ttl, 0)
+
+    def get(self, url):
+        """返回缓存条目（含body与fresh标记），不存在时返回None"""
+        _, meta_path, body_path = self._paths(url)
+        try:
+            with open(meta_path, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+            with gzip.open(body_path, 'rt', encoding='utf-8') as f:
+                meta['body'] = f.read()
+        except (OSError, ValueError):
+            FETCH_CACHE_REQUESTS.inc(result='miss')
+            return None
+        now = time.time()
+        meta['fresh'] = now < meta.get('expires_at', 0)
+        # 更新访问时间，用于按LRU淘汰
+        os.utime(meta_path, (now, now))
+        FETCH_CACHE_REQUESTS.inc(result='fresh' if meta['fresh'] else 'stale')
+        return meta
+
+    def conditional_headers(self, entry):
+        headers = {}
+        if entry and entry.get('etag'):
+            headers['If-None-Match'] = entry['etag']
+        if entry and entry.get('last_modified'):
+            headers['If-Modified-Since'] = entry['last_modified']
+        return headers
+
+    def put(self, url, body, headers=None, source='httpx'):
+        headers = {k.lower(): v for k, v in (headers or {}).items()}
+        now = time.time()
+        expires_at = self._expires_at(headers, now)
+        if expires_at is None or not body:
+            return False
+
+        directory, meta_path, body_path = self._paths(url)
+        os.makedirs(directory, exist_ok=True)
+        old_size = self._entry_size(meta_path, body_path)
+        meta = {
+            'url': url,
+            'source': source,
+            'stored_at': now,
+            'expires_at': expires_at,
+            'etag': headers.get('etag'),
+            # 只保存服务器给出的验证器，条件请求不发送源站没有签发过的值
+            'last_modified': headers.get('last-modified'),
+            'content_type': headers.get('content-type'),
+        }
+        self._atomic_write(body_path, gzip.compress(body.encode('utf-8'), compresslevel=6))
+        self._atomic_write(meta_path, json.dumps(meta, ensure_ascii=False).encode('utf-8'))
+        self._account(self._entry_size(meta_path, body_path) - old_size)
+        return True
+
+    def refresh(self, url, entry, headers=None):
+        """收到304后刷新条目的有效期，沿用已缓存的正文"""
+        return self.put(url, entry['body'], {
+            'etag': entry.get('etag'),
+            'last-modified': entry.get('last_modified'),
+            **(headers or {})
+        }, source=entry.get('source', 'httpx'))
+
+    @staticmethod
+    def _atomic_write(path, data):
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    @staticmethod
+    def _entry_size(*paths):
+        size = 0
+        for path in paths:
+            try:
+                size += os.path.getsize(path)
+            except OSError:
+                pass
+        return size
+
+    def _scan(self):
+        entries = []
+        total = 0
+        for dirpath, _, filenames in os.walk(self.root):
+            for filename in filenames:
+                if not filename.endswith('.json'):
+                    continue
+                meta_path = os.path.join(dirpath, filename)
+                body_path = meta_path[:-len('.json')] + '.body.gz'
+                size = self._entry_size(meta_path, body_path)
+                try:
+                    accessed = os.path.getmtime(meta_path)
+                except OSError:
+                    continue
+                entries.append((accessed, size, meta_path, body_path))
+                total += size
+        return entries, total
+
+    def _account(self, delta):
+        if self._total_bytes is None:
+            _, self._total_bytes = self._scan()
+        else:
+            self._total_bytes += delta
+        if self._total_bytes > self.max_bytes:
+            self.evict()
+        FETCH_CACHE_BYTES.set(self._total_bytes)
+
+    def evict(self):
+        """按最近访问时间从旧到新淘汰，直到占用降到容量上限的90%"""
+        entries, total = self._scan()
+        target = self.max_bytes * 0.9
+        removed = 0
+        for _, size, meta_path, body_path in sorted(entries):
+            if total <= target:
+                break
+            for path in (meta_path, body_path):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+            total -= size
+            removed += 1
+        self._total_bytes = total
+        logging.info(f"抓取缓存淘汰了 {removed} 个条目，当前占用 {total} 字节")
+
+
+_cache = None
+
+
+def get_fetch_cache():
+    """返回全局抓取缓存，FETCH_CACHE_ENABLED为false时返回None"""
+    global _cache
+    if _cache is None and get_env('FETCH_CACHE_ENABLED', True, bool):
+        _cache = FetchCache()
+    return _cache
@@ -0,0 +1,242 @@
+import json
+import logging
+import re
+import unicodedata
+from collections import defaultdict, deque
+
+from metrics import counter
+from utils import hash_text
+
+FOCUS_FILTER_VERDICTS = counter('insightfocus_focus_filter_verdicts_total', '结构化过滤器对 (关注点, 文章) 的判定结果', ('verdict',))
+FOCUS_COMPILATIONS = counter('insightfocus_focus_compilations_total', '关注点编译次数', ('result',))
+
+# 编译结果格式变化时递增，使旧的过滤器全部重新编译
+FILTER_VERSION = 1
+
+_WORD_CHAR_RE = re.compile(r'[a-z0-9]')
+
+
+def normalize(text):
+    return unicodedata.normalize('NFKC', text or '').lower().strip()
+
+
+class AhoCorasick:
+    """多模式串匹配自动机，一次扫描找出文本中出现的所有关键词。
+    纯拉丁字母/数字的关键词要求词边界（避免 "ai" 命中 "said"），中日韩关键词不要求"""
+
+    def __init__(self):
+        self._goto = [{}]
+        self._fail = [0]
+        self._outputs = [[]]
+        self._built = False
+
+    def add(self, keyword, value):
+        keyword = normalize(keyword)
+        if not keyword:
+            return
+        node = 0
+        for char in keyword:
+            next_node = self._goto[node].get(char)
+            if next_node is None:
+                next_node = len(self._goto)
+                self._goto[node][char] = next_node
+                self._goto.append({})
+                self._fail.append(0)
+                self._outputs.append([])
+            node = next_node
+        self._outputs[node].append((len(keyword), keyword.isascii(), value))
+        self._built = False
+
+    def build(self):
+        queue = deque(self._goto[0].values())
+        for node in queue:
+            self._fail[node] = 0
+        while queue:
+            node = queue.popleft()
+            for char, child in self._goto[node].items():
+                queue.append(child)
+                fail = self._fail[node]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[child] = self._goto[fail].get(char, 0)
+                self._outputs[child] = self._outputs[child] + self._outputs[self._fail[child]]
+        self._built = True
+
+    def search(self, text):
+        """返回文本中命中的关键词所对应value的集合，text需已经normalize"""
+        if not self._built:
+            self.build()
+        found = set()
+        node = 0
+        for end, char in enumerate(text):
+            while node and char not in self._goto[node]:
+                node = self._fail[node]
+            node = self._goto[node].get(char, 0)
+            for length, ascii_only, value in self._outputs[node]:
+                if ascii_only:
+                    start = end - length + 1
+                    if start > 0 and _WORD_CHAR_RE.match(text[start - 1]):
+                        continue
+                    if end + 1 < len(text) and _WORD_CHAR_RE.match(text[end + 1]):
+                        continue
+                found.add(value)
+        return found
+
+
+class FocusFilter:
+    """编译后的关注点：满足任一clause即相关；命中排除条件的文章不相关；
+    ambiguous为True表示关注内容有无法结构化的部分，未命中的文章仍交给大模型判断"""
+
+    def __init__(self, clauses=None, excluded_tags=None, excluded_keywords=None, ambiguous=True):
+        self.clauses = [
+            {
+                'topic_ids': set(clause.get('topic_ids') or []),
+                'genre_ids': set(clause.get('genre_ids') or []),
+                'keywords': [normalize(k) for k in clause.get('keywords') or [] if normalize(k)],
+                'tags': [normalize(t) for t in clause.get('tags') or [] if normalize(t)],
+            }
+            for clause in clauses or []
+        ]
+        self.excluded_tags = [normalize(t) for t in excluded_tags or [] if normalize(t)]
+        self.excluded_keywords = [normalize(k) for k in excluded_keywords or [] if normalize(k)]
+        self.ambiguous = ambiguous or not self.clauses
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data.get('clauses'), data.get('excluded_tags'), data.get('excluded_keywords'), data.get('ambiguous', True))
+
+    def to_dict(self):
+        return {
+            'version': FILTER_VERSION,
+            'clauses': [
+                {
+                    'topic_ids': sorted(clause['topic_ids']),
+                    'genre_ids': sorted(clause['genre_ids']),
+                    'keywords': clause['keywords'],
+                    'tags': clause['tags'],
+                }
+                for clause in self.clauses
+            ],
+            'excluded_tags': self.excluded_tags,
+            'excluded_keywords': self.excluded_keywords,
+            'ambiguous': self.ambiguous,
+        }
+
+
+class FocusMatcher:
+    """对一批文章建立 标签/主题/体裁 -> 文章 的倒排索引，并把所有关注点的关键词编进同一个自动机，
+    每篇文章只扫描一次，之后每个关注点的判定都是集合运算"""
+
+    def __init__(self, articles, tags_by_article, filters):
+        self.article_ids = {article['id'] for article in articles}
+        self.filters = filters
+        self.tag_index = defaultdict(set)
+        self.topic_index = defaultdict(set)
+        self.genre_index = defaultdict(set)
+        for article in articles:
+            self.topic_index[article.get('topic_id')].add(article['id'])
+            self.genre_index[article.get('genre_id')].add(article['id'])
+            for tag in tags_by_article.get(article['id'], []):
+                self.tag_index[normalize(tag)].add(article['id'])
+
+        automaton = AhoCorasick()
+        for focus_id, focus_filter in filters.items():
+            for index, clause in enumerate(focus_filter.clauses):
+                for keyword in clause['keywords']:
+                    automaton.add(keyword, (focus_id, index))
+            for keyword in focus_filter.excluded_keywords:
+                automaton.add(keyword, (focus_id, 'exclude'))
+
+        self.keyword_hits = defaultdict(set)
+        for article in articles:
+            text = normalize(f"{article['title']}\n{article.get('summary') or ''}")
+            for hit in automaton.search(text):
+                self.keyword_hits[hit].add(article['id'])
+
+    def _tagged(self, tags):
+        result = set()
+        for tag in tags:
+            result |= self.tag_index.get(tag, set())
+        return result
+
+    def _scope(self, clause):
+        scope = self.article_ids
+        if clause['topic_ids']:
+            scope = scope & set().union(*(self.topic_index.get(t, set()) for t in clause['topic_ids']))
+        if clause['genre_ids']:
+            scope = scope & set().union(*(self.genre_index.get(g, set()) for g in clause['genre_ids']))
+        return scope
+
+    def evaluate(self, focus_id):
+        """返回 (相关的文章ID, 需要大模型判断的文章ID)，其余文章视为不相关。没有过滤器的关注点全部交给大模型"""
+        focus_filter = self.filters.get(focus_id)
+        if focus_filter is None:
+            FOCUS_FILTER_VERDICTS.inc(len(self.article_ids), verdict='ambiguous')
+            return set(), set(self.article_ids)
+
+        matched, ambiguous = set(), set()
+        for index, clause in enumerate(focus_filter.clauses):
+            scope = self._scope(clause)
+            if not clause['keywords'] and not clause['tags']:
+                if clause['topic_ids'] or clause['genre_ids']:
+                    matched |= scope
+                continue
+            evidence = self.keyword_hits.get((focus_id, index), set()) | self._tagged(clause['tags'])
+            matched |= evidence & scope
+            # 关键词命中但主题/体裁不符，可能是同名异义，交给大模型
+            ambiguous |= evidence - scope
+
+        excluded = self._tagged(focus_filter.excluded_tags) | self.keyword_hits.get((focus_id, 'exclude'), set())
+        matched -= excluded
+        if focus_filter.ambiguous:
+            ambiguous |= self.article_ids
+        ambiguous -= matched | excluded
+
+        FOCUS_FILTER_VERDICTS.inc(len(matched), verdict='match')
+        FOCUS_FILTER_VERDICTS.inc(len(ambiguous), verdict='ambiguous')
+        FOCUS_FILTER_VERDICTS.inc(len(self.article_ids) - len(matched) - len(ambiguous), verdict='no_match')
+        return matched, ambiguous
+
+
+def focus_content_hash(content):
+    return hash_text(f"{FILTER_VERSION}:{content}")
+
+
+async def ensure_focus_filters(storage, focuses, agent=None):
+    """读取已编译的过滤器，关注内容新建或修改过（内容哈希不同）时重新编译并保存。
+    编译失败的关注点不返回过滤器，由大模型逐篇判断"""
+    if not focuses:
+        return {}
+    stored = await storage.get_focus_filters([focus['id'] for focus in focuses])
+    filters = {}
+    for focus in focuses:
+        content_hash = focus_content_hash(focus['content'])
+        row = stored.get(focus['id'])
+        if row and row[0] == content_hash:
+            filters[focus['id']] = FocusFilter.from_dict(json.loads(row[1]))
+            continue
+
+        if agent is None:
+            from agents.userFocusAgent import UserFocusAgent
+            agent = UserFocusAgent()
+        result = await agent.compile_focus(focus['content'])
+        try:
+            focus_filter = FocusFilter.from_dict(result) if result is not None else None
+        except Exception as e:
+            logging.error(f"关注点 {focus['id']} 的编译结果无效：{str(e)}")
+            focus_filter = None
+        if focus_filter is None:
+            FOCUS_COMPILATIONS.inc(result='failed')
+            continue
+        await storage.save_focus_filter(focus['id'], content_hash, json.dumps(focus_filter.to_dict(), ensure_ascii=False))
+        FOCUS_COMPILATIONS.inc(result='compiled')
+        logging.info(f"关注点 {focus['id']} 已编译为 {len(focus_filter.clauses)} 条过滤条件"
+                     f"{'（含需大模型判断的部分）' if focus_filter.ambiguous else ''}")
+        filters[focus['id']] = focus_filter
+    return filters
+
+
+async def build_focus_matcher(storage, articles, focuses):
+    filters = await ensure_focus_filters(storage, focuses)
+    tags_by_article = await storage.get_articles_tags([article['id'] for article in articles])
+    return FocusMatcher(articles, tags_by_article, filters)
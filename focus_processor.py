@@ -1,56 +1,86 @@
+import json
 import logging
 
 from agents.userFocusAgent import UserFocusAgent
-from db_operations import with_transaction, get_recent_articles, get_user_focuses, add_to_focused_contents
+from digest import refresh_digests
+from focus_filter import build_focus_matcher
+from focus_scheduler import FocusScheduler
+from story_cluster import cluster_stories, StoryCluster
+from utils import get_env
 
-async def process_user_focuses(db_pool):
+async def process_user_focuses(storage):
     try:
-        recent_articles = await with_transaction(db_pool, lambda cur: get_recent_articles(cur, hours=24))
+        # 聚类需要全部最近文章，数据量不大，用普通缓冲查询，不占用服务端游标
+        recent_articles = await storage.get_recent_articles(hours=24)
         logging.info(f"获取到 {len(recent_articles)} 篇最近的文章")
 
+        # 同一事件的多篇报道只由代表文章参与相关性判断
+        if get_env('STORY_CLUSTER_ENABLED', True, bool):
+            clusters = cluster_stories(recent_articles)
+        else:
+            clusters = [StoryCluster(article, [article]) for article in recent_articles]
+
+        focuses = await storage.get_all_focuses()
+        focuses_by_user = {}
+        for focus in focuses:
+            focuses_by_user.setdefault(focus['user_id'], []).append(focus)
+
+        # 关注点编译为结构化过滤器后，能直接判定的 (关注点, 文章) 不再调用大模型
+        matcher = None
+        if get_env('FOCUS_FILTER_ENABLED', True, bool):
+            matcher = await build_focus_matcher(storage, [cluster.representative for cluster in clusters], focuses)
+
         # 获取到所有的用户名单
-        user_ids = await get_all_users(db_pool)
-        
+        user_ids = await storage.get_user_ids()
+        tiers = load_priority_tiers()
+
+        scheduler = FocusScheduler(
+            storage,
+            UserFocusAgent(),
+            concurrency=get_env('FOCUS_CONCURRENCY', 8, int),
+            batch_size=get_env('FOCUS_INSERT_BATCH', 200, int)
+        )
         for user_id in user_ids:
-            await process_user_focus(db_pool, user_id, recent_articles)
+            user_focuses = focuses_by_user.get(user_id)
+            if user_focuses:
+                scheduler.add_user(user_id, user_focus_tasks(user_focuses, clusters, matcher), tiers.get(user_id, 0))
+        await scheduler.run()
 
     except Exception as e:
         logging.error(f"处理用户关注内容时出错: {str(e)}")
 
-async def process_user_focus(db_pool, user_id, recent_articles):
-    logging.info(f"处理用户 {user_id} 的关注内容")
-
-    user_focuses = await with_transaction(db_pool, get_user_focuses, user_id)
-    
-    for article in recent_articles:
+def user_focus_tasks(user_focuses, clusters, matcher=None):
+    """惰性生成一个用户的 (focus, cluster, decided) 任务，过滤器判定不相关的组合直接跳过"""
+    verdicts = {focus['id']: matcher.evaluate(focus['id']) for focus in user_focuses} if matcher else {}
+    for cluster in clusters:
+        article_id = cluster.representative['id']
         for focus in user_focuses:
-            logging.info(f"-----------------------------------------------------------------------")
-            logging.info(f"开始处理URL：{article['url']}")
-            logging.info(f"文章标题：{article['title']}")
-            is_relevant = await UserFocusAgent().judge_article_relevance(article, focus['content'])
-            
-            if is_relevant:
-                await with_transaction(
-                    db_pool,
-                    add_to_focused_contents,
-                    user_id,
-                    article['id'],
-                    focus['id']
-                )
-                logging.info(f"文章 {article['id']} 与用户 {user_id} 的关注 {focus['id']} 相关，已添加到关注清单")
-
-async def get_all_users(db_pool):
-    async def fetch_users(cur):
-        await cur.execute("SELECT id FROM rssUsers")
-        return await cur.fetchall()
-
-    users = await with_transaction(db_pool, fetch_users)
-    return [user[0] for user in users]
-
-async def run_focus_processing(db_pool):
+            if focus['id'] not in verdicts:
+                yield focus, cluster, False
+                continue
+            matched, ambiguous = verdicts[focus['id']]
+            if article_id in matched:
+                yield focus, cluster, True
+            elif article_id in ambiguous:
+                yield focus, cluster, False
+
+def load_priority_tiers():
+    """FOCUS_PRIORITY_TIERS 形如 {"1": -1, "42": 1}，数字越小越先处理，未列出的用户为0"""
+    raw = get_env('FOCUS_PRIORITY_TIERS')
+    if not raw:
+        return {}
+    try:
+        return {int(user_id): int(tier) for user_id, tier in json.loads(raw).items()}
+    except (ValueError, AttributeError) as e:
+        logging.error(f"FOCUS_PRIORITY_TIERS 配置无效，忽略优先级: {str(e)}")
+        return {}
+
+async def run_focus_processing(storage):
     logging.info("开始运行关注内容批处理")
     try:
-        await process_user_focuses(db_pool)
+        await process_user_focuses(storage)
         logging.info("关注内容批处理完成")
+        if get_env('DIGEST_ENABLED', True, bool):
+            await refresh_digests(storage)
     except Exception as e:
         logging.error(f"关注内容批处理过程中出错: {str(e)}")
\ No newline at end of file
@@ -0,0 +1,119 @@
+import asyncio
+import logging
+from collections import deque
+
+from metrics import QUEUE_DEPTH, counter
+
+FOCUS_JUDGEMENTS = counter('insightfocus_focus_judgements_total', '关注匹配任务数', ('source', 'result'))
+
+
+class FairQueue:
+    """按优先级分层、层内按用户轮转的任务队列。每个用户的任务是一个惰性迭代器，
+    队列只持有每用户一个迭代器，不会把 用户×关注点×文章 全部展开到内存里"""
+
+    def __init__(self):
+        self._tiers = {}
+
+    def add(self, key, tasks, tier=0):
+        self._tiers.setdefault(tier, deque()).append((key, iter(tasks)))
+
+    def get(self):
+        """取下一个任务：数字小的层级优先，同层内每个用户轮流取一个；全部取完时返回None"""
+        for tier in sorted(self._tiers):
+            users = self._tiers[tier]
+            while users:
+                key, tasks = users.popleft()
+                task = next(tasks, None)
+                if task is None:
+                    continue
+                users.append((key, tasks))
+                return task
+        return None
+
+    def active(self):
+        return sum(len(users) for users in self._tiers.values())
+
+
+class MatchWriter:
+    """累积匹配结果，攒够一批后用一次executemany写入，而不是每条匹配一个事务。
+    整批失败时逐条重试，匹配结果花费了大模型调用，不因单条坏数据整批丢弃"""
+
+    def __init__(self, storage, batch_size=200):
+        self.storage = storage
+        self.batch_size = batch_size
+        self.written = 0
+        self._rows = []
+        self._lock = asyncio.Lock()
+
+    async def add(self, user_id, cluster, focus_id):
+        """把代表文章的判断结果传播给事件簇内所有文章，其他成员记录结论来源"""
+        representative_id = cluster.representative['id']
+        for member in cluster.members:
+            via_article_id = None if member['id'] == representative_id else representative_id
+            self._rows.append((user_id, member['id'], focus_id, via_article_id))
+        if len(self._rows) >= self.batch_size:
+            await self.flush()
+
+    async def flush(self):
+        async with self._lock:
+            rows, self._rows = self._rows, []
+            if not rows:
+                return
+            try:
+                await self.storage.add_focused_contents_batch(rows)
+                self.written += len(rows)
+            except Exception as e:
+                logging.warning(f"批量写入关注清单失败（{len(rows)} 条），改为逐条写入: {str(e)}")
+                for row in rows:
+                    try:
+                        await self.storage.add_focused_contents_batch([row])
+                        self.written += 1
+                    except Exception as row_error:
+                        logging.error(f"写入关注清单失败 {row}: {str(row_error)}")
+
+
+class FocusScheduler:
+    """有界并发的关注匹配：固定数量的worker从FairQueue取 (用户, 关注点, 事件簇) 任务，
+    一个关注点很多的用户不会阻塞其他用户，总耗时约为 总任务量 / 并发数"""
+
+    def __init__(self, storage, agent, concurrency=8, batch_size=200):
+        self.agent = agent
+        self.concurrency = concurrency
+        self.queue = FairQueue()
+        self.writer = MatchWriter(storage, batch_size)
+
+    def add_user(self, user_id, tasks, tier=0):
+        """tasks为 (focus, cluster, decided) 的可迭代对象，decided为True表示过滤器已判定相关，无需调用大模型"""
+        self.queue.add(user_id, ((user_id,) + task for task in tasks), tier)
+
+    async def _judge(self, user_id, focus, cluster, decided):
+        article = cluster.representative
+        if decided:
+            FOCUS_JUDGEMENTS.inc(source='filter', result='relevant')
+            is_relevant = True
+        else:
+            is_relevant = await self.agent.judge_article_relevance(article, focus['content'])
+            FOCUS_JUDGEMENTS.inc(source='llm', result='relevant' if is_relevant else 'irrelevant')
+        if is_relevant:
+            await self.writer.add(user_id, cluster, focus['id'])
+            logging.info("文章 %s 与用户 %s 的关注 %s 相关，已将事件簇内 %s 篇文章加入关注清单",
+                         article['id'], user_id, focus['id'], len(cluster))
+
+    async def _worker(self):
+        while True:
+            task = self.queue.get()
+            if task is None:
+                return
+            QUEUE_DEPTH.set(self.queue.active(), queue='focus_users')
+            try:
+                await self._judge(*task)
+            except Exception as e:
+                logging.error(f"关注匹配任务失败（用户 {task[0]}，关注 {task[1]['id']}）: {str(e)}")
+
+    async def run(self):
+        try:
+            await asyncio.gather(*(self._worker() for _ in range(self.concurrency)))
+        finally:
+            await self.writer.flush()
+            QUEUE_DEPTH.set(0, queue='focus_users')
+        logging.info(f"关注匹配完成，写入 {self.writer.written} 条关注清单记录")
@@ -1,92 +1,60 @@
 import asyncio
-import atexit
-from pyppeteer import launch
 import httpx
 import logging
 from urllib.parse import urlparse
-import trafilatura
 from typing import Dict, Union
-from trafilatura import extract
-from gne import GeneralNewsExtractor
 import json
-class BrowserManager:
-    _instance = None
-    _browser = None
-    _lock = asyncio.Lock()
-    _page_count = 0
-    _restart_threshold = 1000
-
-    @classmethod
-    async def get_instance(cls):
-        if cls._instance is None:
-            async with cls._lock:
-                if cls._instance is None:
-                    cls._instance = cls()
-                    await cls._instance.init_browser()
-        return cls._instance
-
-    async def init_browser(self):
-        logging.debug("Entering init_browser method")
-        if self._browser is None or self._page_count >= self._restart_threshold:
-            logging.debug("Creating new browser instance")
-            if self._browser:
-                logging.debug("Closing existing browser")
-                await self.close_browser()
-            try:
-                logging.debug("Launching new browser")
-                self._browser = await launch(
-                    headless=True,
-                    args=['--no-sandbox', '--disable-setuid-sandbox', '--disable-dev-shm-usage'],
-                    ignoreHTTPSErrors=True
-                )
-                self._page_count = 0
-                logging.info("New browser instance created successfully")
-            except Exception as e:
-                logging.error(f"Failed to create browser instance: {e}")
-                self._browser = None
-                raise
-
-    async def get_page(self):
-        logging.debug("Entering get_page method")
-        await self.init_browser()
-        if self._browser is None:
-            logging.error("Browser instance is None")
-            raise Exception("Browser instance not properly initialized")
-        try:
-            logging.debug("Creating new page")
-            page = await self._browser.newPage()
-            self._page_count += 1
-            logging.debug(f"New tab created (count: {self._page_count})")
-            return page
-        except Exception as e:
-            logging.error(f"Error creating new page: {e}")
-            raise
-
-    async def close_page(self, page):
-        if page:
-            logging.debug("Closing page")
-            await page.close()
 
-    async def close_browser(self):
-        if self._browser:
-            logging.debug("Closing browser")
-            await self._browser.close()
-            self._browser = None
-            self._page_count = 0
-            logging.debug("Browser instance closed")
+from browser_pool import get_browser_pool
+from deadline import DeadlineExceeded, run_stage, time_left
+from fetch_cache import get_fetch_cache
+from html_fetcher import BodyTooLarge, UnsupportedContent, is_html_content_type, max_body_bytes, read_html
+from metrics import timed
+from politeness import get_domain_scheduler
+
+def extract_article(html_content: str, url: str) -> Dict[str, str]:
+    """使用GNE提取正文，失败时回退到Trafilatura；为同步函数，可在进程池中执行"""
+    # 提取库导入较慢，首次提取时才导入
+    import trafilatura
+    from gne import GeneralNewsExtractor
+
+    result = {
+        "title": "",
+        "author": "",
+        "publish_date": "",
+        "plain_content": ""
+    }
+    try:
+        extractor = GeneralNewsExtractor()
+        gne_result = extractor.extract(html_content, noise_node_list=['//div[@class="comment-list"]'])
+        if gne_result:
+            result['title'] = gne_result.get('title', '')
+            result['author'] = gne_result.get('author', '')
+            result['publish_date'] = gne_result.get('publish_time', '')
+            result['plain_content'] = gne_result.get('content', '')
+            logging.debug("NewsExtractor：内容提取成功")
+        else:
+            logging.warning("NewsExtractor：内容提取失败，即将使用Trafilatura重试")
+
+        if not result['plain_content']:
+            downloaded = trafilatura.extract(html_content, url=url, output_format="json", with_metadata=True, include_comments=False, include_images=True)
+            if downloaded:
+                trafilatura_result = json.loads(downloaded)
+                result['title'] = result['title'] or trafilatura_result.get('title', '')
+                result['author'] = result['author'] or trafilatura_result.get('author', '')
+                result['publish_date'] = result['publish_date'] or trafilatura_result.get('date', '')
+                result['plain_content'] = result['plain_content'] or trafilatura_result.get('text', '')
+                logging.debug("Trafilatura：内容提取成功")
+            else:
+                logging.warning("Trafilatura：内容提取失败")
 
-    @classmethod
-    def register_shutdown(cls):
-        atexit.register(cls.shutdown)
+    except Exception as exc:
+        logging.error(f"Content extraction error: {exc}")
 
-    @classmethod
-    def shutdown(cls):
-        if cls._instance:
-            asyncio.get_event_loop().run_until_complete(cls._instance.close_browser())
+    return result
 
 class GeneralCrawler:
     def __init__(self):
-        self.browser_manager = None
         self.scraper_map = {
             "mp.weixin.qq.com": self.wechat_handler
             # TODO: 定义更多特定域爬虫处理器
@@ -96,92 +64,95 @@ class GeneralCrawler:
             # TODO: 定义更多JS动态页面域
         ]
 
-    async def init_browser_manager(self):
-        logging.debug("Initializing BrowserManager")
-        self.browser_manager = await BrowserManager.get_instance()
-        logging.debug("BrowserManager initialized")
+    async def render_page(self, page, url: str) -> Union[str, None]:
+        logging.debug("Navigating to URL: %s", url)
+        # 导航超时不超过fetch阶段剩余的时间预算（毫秒）
+        response = await page.goto(url, waitUntil='networkidle0', timeout=int((time_left('fetch') or 30) * 1000))
+        get_domain_scheduler().record(url, response.status if response else None)
+        logging.debug("Getting page content")
+        content_type = response.headers.get('content-type', '') if response else ''
+        if not is_html_content_type(content_type):
+            logging.warning(f"Pyppeteer：{url}不是HTML内容（{content_type}），放弃")
+            return None
+        content = await page.content()
+        if len(content) > max_body_bytes():
+            logging.warning(f"Pyppeteer：{url}页面内容超出大小上限，放弃")
+            return None
+        logging.info("Successfully fetched content for %s", url)
+        cache = get_fetch_cache()
+        if cache and response and response.status == 200:
+            cache.put(url, content, response.headers, source='browser')
+        return content
 
     async def fetch_with_pyppeteer(self, url: str) -> Union[str, None]:
-        logging.debug(f"Fetching URL with Pyppeteer: {url}")
-        if not self.browser_manager:
-            logging.debug("BrowserManager not initialized, initializing now")
-            await self.init_browser_manager()
-        
-        page = None
+        logging.debug("Fetching URL with Pyppeteer: %s", url)
         try:
-            logging.debug("Getting new page")
-            page = await self.browser_manager.get_page()
-            logging.debug(f"Navigating to URL: {url}")
-            await page.goto(url, waitUntil='networkidle0')
-            logging.debug("Getting page content")
-            content = await page.content()
-            logging.info(f"Successfully fetched content for {url}")
-            return content
+            # 浏览器池负责分配实例、关闭页面，实例崩溃时换一个实例重试
+            return await get_browser_pool().run(self.render_page, url)
         except Exception as exc:
+            get_domain_scheduler().record(url, error=True)
             logging.error(f"Error fetching HTML with Pyppeteer: {exc}", exc_info=True)
             return None
-        finally:
-            if page:
-                logging.debug("Closing page")
-                await self.browser_manager.close_page(page)
 
+    async def fetch_with_httpx(self, url: str, cached=None) -> Union[str, None]:
+        scheduler = get_domain_scheduler()
+        cache = get_fetch_cache()
+        async with httpx.AsyncClient() as client:
+            try:
+                headers = {'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_14_6) AppleWebKit/605.1.15 (KHTML, like Gecko) Chrome/112.0.0.0 Safari/604.1 Edg/112.0.100.0'}
+                if cache and cached:
+                    headers.update(cache.conditional_headers(cached))
+                # 流式下载：先检查类型和长度，非HTML或超出大小上限时提前中止
+                async with client.stream('GET', url, headers=headers, timeout=30) as response:
+                    scheduler.record(url, response.status_code, response.headers.get('Retry-After'))
+                    if response.status_code == 304 and cached:
+                        cache.refresh(url, cached, response.headers)
+                        logging.info("Httpx：%s未修改，使用缓存内容", url)
+                        return cached['body']
+                    response.raise_for_status()
+                    html = await read_html(response)
+                logging.info("Httpx：成功获取%s的HTML内容", url)
+                if cache:
+                    cache.put(url, html, response.headers)
+                return html
+            except (UnsupportedContent, BodyTooLarge) as exc:
+                logging.warning(f"Httpx：放弃下载{url}，{exc}")
+                return None
+            except httpx.RequestError as exc:
+                scheduler.record(url, error=True)
+                logging.error(f"Httpx：Http请求失败，详情是 {exc}")
+                return None
+            except httpx.HTTPStatusError as exc:
+                logging.error(f"Httpx：Http状态异常，详情是 {exc}")
+                return None
+
+    @timed('fetch_html')
     async def fetch_html_async(self, url: str) -> Union[str, None]:
         parsed_url = urlparse(url)
         domain = parsed_url.netloc
 
-        if domain in self.ajax_domains:
-            return await self.fetch_with_pyppeteer(url)
-        else:
-            async with httpx.AsyncClient() as client:
-                try:
-                    headers = {'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_14_6) AppleWebKit/605.1.15 (KHTML, like Gecko) Chrome/112.0.0.0 Safari/604.1 Edg/112.0.100.0'}
-                    response = await client.get(url, headers=headers, timeout=30)
-                    response.raise_for_status()
-                    logging.info(f"Httpx：成功获取{url}的HTML内容")
-                    return response.text
-                except httpx.RequestError as exc:
-                    logging.error(f"Httpx：Http请求失败，详情是 {exc}")
-                    return None
-                except httpx.HTTPStatusError as exc:
-                    logging.error(f"Httpx：Http状态异常，详情是 {exc}")
-                    return None
+        # 缓存仍在有效期内时直接返回，失败重试和重跑不会重新下载或重新渲染
+        cache = get_fetch_cache()
+        cached = cache.get(url) if cache else None
+        if cached and cached['fresh']:
+            logging.info("命中抓取缓存：%s", url)
+            return cached['body']
+
+        # 按站点限速并遵守robots.txt，避免集中请求同一站点被限流或封禁
+        scheduler = get_domain_scheduler()
+        if not await scheduler.allowed(url):
+            logging.info("robots.txt禁止抓取，跳过：%s", url)
+            return None
 
-    async def extract_content(self, html_content: str, url: str) -> Dict[str, str]:
-        result = {
-            "title": "",
-            "author": "",
-            "publish_date": "",
-            "content": html_content,
-            "plain_content": ""
-        }
-        try:
-            extractor = GeneralNewsExtractor()
-            gne_result = extractor.extract(html_content, noise_node_list=['//div[@class="comment-list"]'])
-            if gne_result:
-                result['title'] = gne_result.get('title', '')
-                result['author'] = gne_result.get('author', '')
-                result['publish_date'] = gne_result.get('publish_time', '')
-                result['plain_content'] = gne_result.get('content', '')
-                logging.info("NewsExtractor：内容提取成功")
-            else:
-                logging.warning("NewsExtractor：内容提取失败，即将使用Trafilatura重试")
-
-            if not result['plain_content']:
-                downloaded = trafilatura.extract(html_content, url=url, output_format="json", with_metadata=True, include_comments=False, include_images=True)
-                if downloaded:
-                    trafilatura_result = json.loads(downloaded)
-                    result['title'] = result['title'] or trafilatura_result.get('title', '')
-                    result['author'] = result['author'] or trafilatura_result.get('author', '')
-                    result['publish_date'] = result['publish_date'] or trafilatura_result.get('date', '')
-                    result['plain_content'] = result['plain_content'] or trafilatura_result.get('text', '')
-                    logging.info("Trafilatura：内容提取成功")
-                else:
-                    logging.warning("Trafilatura：内容提取失败")
+        async with scheduler.slot(url):
+            if domain in self.ajax_domains:
+                return await self.fetch_with_pyppeteer(url)
+            return await self.fetch_with_httpx(url, cached)
 
-        except Exception as exc:
-            logging.error(f"Content extraction error: {exc}")
-        
-        return result
+    @timed('extract_content')
+    async def extract_content(self, html_content: str, url: str) -> Dict[str, str]:
+        # 在线程中执行CPU密集的提取，超出时间预算时事件循环可以放弃等待继续处理其它条目
+        return await asyncio.to_thread(extract_article, html_content, url)
 
     def wechat_handler(self, html_content: str) -> Dict[str, str]:
         logging.info("使用专用爬虫处理域：mp.weixin.qq.com")
@@ -196,6 +167,7 @@ class GeneralCrawler:
             "plain_content": "Fallback Content"
         }
 
+    @timed('crawl')
     async def crawl_async(self, url: str) -> Dict[str, Union[int, str, dict]]:
         result = {
             "status_code": 200,
@@ -207,7 +179,7 @@ class GeneralCrawler:
             "publish_date": ""
         }
 
-        html_content = await self.fetch_html_async(url)
+        html_content = await run_stage('fetch', self.fetch_html_async(url))
         if not html_content:
             result["status_code"] = -1
             result["error_message"] = "最终获取HTML页面失败"
@@ -222,17 +194,17 @@ class GeneralCrawler:
             if domain in self.scraper_map:
                 extracted_data = self.scraper_map[domain](html_content)
             else:
-                extracted_data = await self.extract_content(html_content, url)
+                extracted_data = await run_stage('extract', self.extract_content(html_content, url))
 
             if not extracted_data['plain_content']:
                 result["error_message"] += "正文提取失败，尝试使用大模型作为兜底方案提取正文"
                 extracted_data = self.llm_fallback(html_content, url)
 
             result.update(extracted_data)
+        except DeadlineExceeded:
+            raise
         except Exception as e:
             result["status_code"] = -1
             result["error_message"] = f"内容提取失败：{str(e)}"
 
-        return result
-# 在应用启动时注册关闭函数
-BrowserManager.register_shutdown()
\ No newline at end of file
+        return result
\ No newline at end of file
@@ -0,0 +1,99 @@
+import codecs
+import re
+
+from metrics import counter
+from utils import get_env
+
+FETCH_REJECTED = counter('insightfocus_fetch_rejected_total', '因类型或大小不符而中止的下载数', ('reason',))
+
+HTML_CONTENT_TYPES = ('text/html', 'application/xhtml+xml', 'application/xml', 'text/xml', 'text/plain')
+# 在这么多字节内查找<meta charset>，与浏览器的预扫描范围一致
+SNIFF_BYTES = 4096
+
+_META_CHARSET_RE = re.compile(rb'<meta[^>]+charset\s*=\s*["\']?\s*([A-Za-z0-9_\-:.]+)', re.IGNORECASE)
+_HEADER_CHARSET_RE = re.compile(r'charset\s*=\s*["\']?([A-Za-z0-9_\-:.]+)', re.IGNORECASE)
+
+
+class UnsupportedContent(Exception):
+    pass
+
+
+class BodyTooLarge(Exception):
+    pass
+
+
+def max_body_bytes():
+    return get_env('FETCH_MAX_BYTES', 5 * 1024 * 1024, int)
+
+
+def is_html_content_type(content_type):
+    """没有Content-Type时交给后续嗅探，只拒绝明确的非HTML类型（PDF、视频、图片等）"""
+    if not content_type:
+        return True
+    return content_type.split(';', 1)[0].strip().lower() in HTML_CONTENT_TYPES
+
+
+def _lookup_codec(name):
+    if not name:
+        return None
+    try:
+        codec = codecs.lookup(name.strip().lower()).name
+    except LookupError:
+        return None
+    # 很多中文站点声明gb2312但实际使用了gbk/gb18030中的字符，响应头与<meta>声明都按超集解码
+    if codec in ('gb2312', 'gbk'):
+        return 'gb18030'
+    return codec
+
+
+def sniff_charset(content_type, head):
+    """依次从Content-Type、BOM、<meta charset>判断编码，都没有时按UTF-8处理"""
+    match = _HEADER_CHARSET_RE.search(content_type or '')
+    charset = _lookup_codec(match.group(1)) if match else None
+    if charset:
+        return charset
+    if head.startswith(codecs.BOM_UTF8):
+        return 'utf-8-sig'
+    if head.startswith((codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE)):
+        return 'utf-16'
+    match = _META_CHARSET_RE.search(head)
+    charset = _lookup_codec(match.group(1).decode('ascii', 'ignore')) if match else None
+    return charset or 'utf-8'
+
+
+async def read_html(response, max_bytes=None):
+    """流式读取httpx响应：先检查Content-Type与Content-Length，读取过程中限制总大小并增量解码，
+    内存中只保留解码后的文本"""
+    max_bytes = max_bytes or max_body_bytes()
+    content_type = response.headers.get('content-type', '')
+    if not is_html_content_type(content_type):
+        FETCH_REJECTED.inc(reason='content_type')
+        raise UnsupportedContent(f"非HTML内容：{content_type}")
+
+    content_length = response.headers.get('content-length')
+    if content_length and content_length.isdigit() and int(content_length) > max_bytes:
+        FETCH_REJECTED.inc(reason='content_length')
+        raise BodyTooLarge(f"Content-Length {content_length} 超出上限 {max_bytes}")
+
+    head = b''
+    decoder = None
+    parts = []
+    received = 0
+    async for chunk in response.aiter_bytes():
+        received += len(chunk)
+        if received > max_bytes:
+            FETCH_REJECTED.inc(reason='body_size')
+            raise BodyTooLarge(f"响应体超出上限 {max_bytes} 字节")
+        if decoder is None:
+            head += chunk
+            if len(head) < SNIFF_BYTES:
+                continue
+            decoder = codecs.getincrementaldecoder(sniff_charset(content_type, head))(errors='replace')
+            chunk, head = head, b''
+        parts.append(decoder.decode(chunk))
+
+    if decoder is None:
+        decoder = codecs.getincrementaldecoder(sniff_charset(content_type, head))(errors='replace')
+        parts.append(decoder.decode(head))
+    parts.append(decoder.decode(b'', final=True))
+    return ''.join(parts)
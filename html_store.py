@@ -0,0 +1,143 @@
+import logging
+import mmap
+import os
+import random
+import tempfile
+
+import zstandard
+
+from metrics import histogram, counter
+from utils import get_env, hash_text
+
+HTML_STORE_SECONDS = histogram('insightfocus_html_store_seconds', '原始HTML存取耗时（秒）', ('operation',))
+HTML_STORE_BYTES = counter('insightfocus_html_store_bytes_total', '原始HTML存储字节数', ('kind',))
+
+
+class HtmlStore:
+    """以html_hash为键的原始HTML存储：两级分片目录、zstd压缩（可选训练字典）、mmap读取"""
+
+    DICT_DIR = 'dictionaries'
+    OBJECT_DIR = 'objects'
+    CURRENT_DICT = 'current'
+
+    def __init__(self, root=None, level=None):
+        self.root = root or get_env('HTML_STORE_DIR', './html_store', str)
+        self.level = level if level is not None else get_env('HTML_STORE_LEVEL', 9, int)
+        os.makedirs(os.path.join(self.root, self.OBJECT_DIR), exist_ok=True)
+        os.makedirs(os.path.join(self.root, self.DICT_DIR), exist_ok=True)
+        self._dicts = {}
+        self._compressor = None
+        self._load_current_dictionary()
+
+    def _load_current_dictionary(self):
+        pointer = os.path.join(self.root, self.DICT_DIR, self.CURRENT_DICT)
+        dictionary = None
+        if os.path.exists(pointer):
+            with open(pointer, 'r') as f:
+                dictionary = self._get_dictionary(int(f.read().strip()))
+        if dictionary is not None:
+            self._compressor = zstandard.ZstdCompressor(level=self.level, dict_data=dictionary)
+        else:
+            self._compressor = zstandard.ZstdCompressor(level=self.level)
+
+    def _get_dictionary(self, dict_id):
+        """按zstd帧头中的dict_id加载字典，旧字典一直保留以便读取旧对象"""
+        if dict_id == 0:
+            return None
+        if dict_id not in self._dicts:
+            path = os.path.join(self.root, self.DICT_DIR, f'{dict_id}.zdict')
+            if not os.path.exists(path):
+                raise FileNotFoundError(f"缺少zstd字典: {path}")
+            with open(path, 'rb') as f:
+                self._dicts[dict_id] = zstandard.ZstdCompressionDict(f.read())
+        return self._dicts[dict_id]
+
+    def path_for(self, html_hash):
+        return os.path.join(self.root, self.OBJECT_DIR, html_hash[:2], html_hash[2:4], f'{html_hash}.zst')
+
+    def has(self, html_hash):
+        return bool(html_hash) and os.path.exists(self.path_for(html_hash))
+
+    def put(self, html, html_hash=None):
+        """写入HTML并返回其html_hash，已存在的对象不会重复写入"""
+        if not html:
+            return None
+        html_hash = html_hash or hash_text(html)
+        path = self.path_for(html_hash)
+        if os.path.exists(path):
+            return html_hash
+
+        with HTML_STORE_SECONDS.time(operation='put'):
+            raw = html.encode('utf-8')
+            data = self._compressor.compress(raw)
+            directory = os.path.dirname(path)
+            os.makedirs(directory, exist_ok=True)
+            # 先写临时文件再原子替换，避免并发写入或中断时留下残缺对象
+            fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+            try:
+                with os.fdopen(fd, 'wb') as f:
+                    f.write(data)
+                os.replace(tmp_path, path)
+            except BaseException:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                raise
+        HTML_STORE_BYTES.inc(len(raw), kind='raw')
+        HTML_STORE_BYTES.inc(len(data), kind='compressed')
+        return html_hash
+
+    def get(self, html_hash):
+        path = self.path_for(html_hash)
+        if not os.path.exists(path):
+            return None
+        with HTML_STORE_SECONDS.time(operation='get'):
+            with open(path, 'rb') as f:
+                if os.fstat(f.fileno()).st_size == 0:
+                    return None
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                    params = zstandard.get_frame_parameters(data)
+                    dictionary = self._get_dictionary(params.dict_id)
+                    if dictionary is not None:
+                        decompressor = zstandard.ZstdDecompressor(dict_data=dictionary)
+                    else:
+                        decompressor = zstandard.ZstdDecompressor()
+                    return decompressor.decompress(data).decode('utf-8')
+
+    def iter_hashes(self):
+        objects = os.path.join(self.root, self.OBJECT_DIR)
+        for dirpath, _, filenames in os.walk(objects):
+            for filename in filenames:
+                if filename.endswith('.zst'):
+                    yield filename[:-4]
+
+    def train_dictionary(self, dict_size=112640, sample_count=2000):
+        """从已存储的页面中抽样训练zstd字典，之后的写入使用新字典，返回字典ID"""
+        hashes = list(self.iter_hashes())
+        if len(hashes) < 10:
+            raise ValueError("样本不足，至少需要10个已存储的页面才能训练字典")
+        samples = []
+        for html_hash in random.sample(hashes, min(sample_count, len(hashes))):
+            html = self.get(html_hash)
+            if html:
+                samples.append(html.encode('utf-8'))
+
+        dictionary = zstandard.train_dictionary(dict_size, samples)
+        dict_id = dictionary.dict_id()
+        with open(os.path.join(self.root, self.DICT_DIR, f'{dict_id}.zdict'), 'wb') as f:
+            f.write(dictionary.as_bytes())
+        with open(os.path.join(self.root, self.DICT_DIR, self.CURRENT_DICT), 'w') as f:
+            f.write(str(dict_id))
+        self._dicts[dict_id] = dictionary
+        self._compressor = zstandard.ZstdCompressor(level=self.level, dict_data=dictionary)
+        logging.info(f"zstd字典训练完成，ID：{dict_id}，样本数：{len(samples)}")
+        return dict_id
+
+
+_store = None
+
+
+def get_html_store():
+    global _store
+    if _store is None:
+        _store = HtmlStore()
+    return _store
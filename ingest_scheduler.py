@@ -0,0 +1,119 @@
+import json
+import logging
+import time
+from datetime import datetime
+
+from dateutil import parser as date_parser
+
+from metrics import counter, histogram
+from politeness import interleave_by_domain
+from utils import get_env
+
+INGEST_ITEMS = counter('insightfocus_ingest_items_total', '每轮待处理条目的调度结果', ('result',))
+INGEST_ITEM_AGE = histogram('insightfocus_ingest_item_age_seconds', '条目开始处理时距发布时间的秒数',
+                            buckets=(60, 300, 900, 3600, 3 * 3600, 12 * 3600, 86400, 3 * 86400, 7 * 86400, 30 * 86400))
+
+
+def published_timestamp(item):
+    """解析条目的published_at为时间戳，无法解析时返回None"""
+    value = item.get('published_at')
+    if not value:
+        return None
+    try:
+        published = value if isinstance(value, datetime) else date_parser.parse(str(value))
+    except (ValueError, OverflowError):
+        return None
+    return published.timestamp()
+
+
+def load_source_priorities():
+    """INGEST_SOURCE_PRIORITY 形如 {"3": 6, "7": -12}，值为该源条目被视为更新（或更旧）的小时数"""
+    raw = get_env('INGEST_SOURCE_PRIORITY')
+    if not raw:
+        return {}
+    try:
+        return {int(source_id): float(hours) for source_id, hours in json.loads(raw).items()}
+    except (ValueError, AttributeError) as e:
+        logging.error(f"INGEST_SOURCE_PRIORITY 配置无效，忽略源优先级: {str(e)}")
+        return {}
+
+
+class IngestScheduler:
+    """按新鲜度安排每轮的处理顺序：有效年龄 = 发布至今的小时数 - 源优先级 - 老化提前量，有效年龄小的先处理。
+    老化提前量 = aging_rate × 因预算用完被留到下一轮（deferred_at）后已等待的小时数，上限aging_max_hours，
+    积压条目因此逐渐前移而不会被新条目一直挤在后面；aging_rate小于1，新鲜度仍是主要排序依据。
+    超过max_age_hours的条目按stale_action丢弃或排到本轮最后；每轮进入大模型阶段的条目数受llm_budget限制"""
+
+    def __init__(self, max_age_hours=None, stale_action=None, aging_rate=None, aging_max_hours=None, llm_budget=None,
+                 source_priorities=None):
+        self.max_age = (max_age_hours if max_age_hours is not None else get_env('INGEST_MAX_AGE_HOURS', 72, float)) * 3600
+        self.stale_action = stale_action or get_env('INGEST_STALE_ACTION', 'defer')
+        self.aging_rate = aging_rate if aging_rate is not None else get_env('INGEST_AGING_RATE', 0.5, float)
+        self.aging_max = (aging_max_hours if aging_max_hours is not None else get_env('INGEST_AGING_MAX_HOURS', 6, float)) * 3600
+        self.llm_budget = llm_budget if llm_budget is not None else get_env('INGEST_LLM_BUDGET', 0, int)
+        self.source_priorities = source_priorities if source_priorities is not None else load_source_priorities()
+
+    def effective_age(self, item, now):
+        published = published_timestamp(item)
+        # 没有发布时间的条目按刚发布处理
+        age = max(now - published, 0) if published is not None else 0
+        deferred_at = item.get('deferred_at')
+        waited = now - deferred_at if deferred_at else 0
+        boost = self.source_priorities.get(item.get('source_id'), 0) * 3600
+        return age - boost - min(self.aging_rate * waited, self.aging_max)
+
+    def is_stale(self, item, now):
+        if not self.max_age:
+            return False
+        published = published_timestamp(item)
+        return published is not None and now - published > self.max_age
+
+    def plan(self, items, now=None):
+        """返回本轮的处理顺序。先按站点交错，再按有效年龄稳定排序，有效年龄相同的条目仍保持站点交错"""
+        now = now or time.time()
+
+        fresh, stale = [], []
+        for item in interleave_by_domain(items):
+            (stale if self.is_stale(item, now) else fresh).append(item)
+        fresh.sort(key=lambda item: self.effective_age(item, now))
+
+        INGEST_ITEMS.inc(len(fresh), result='scheduled')
+        if self.stale_action == 'drop':
+            INGEST_ITEMS.inc(len(stale), result='dropped')
+            stale = []
+        else:
+            stale.sort(key=lambda item: self.effective_age(item, now))
+            INGEST_ITEMS.inc(len(stale), result='stale_deferred')
+        if stale or len(fresh) < len(items):
+            logging.info(f"本轮待处理 {len(fresh)} 个新鲜条目，{len(items) - len(fresh)} 个条目超过 "
+                         f"{self.max_age / 3600:g} 小时（{'已丢弃' if self.stale_action == 'drop' else '排在最后'}）")
+        return fresh + stale
+
+    def started(self, item):
+        published = published_timestamp(item)
+        if published is not None:
+            INGEST_ITEM_AGE.observe(max(time.time() - published, 0))
+
+    def budget_exhausted(self, used):
+        return bool(self.llm_budget) and used >= self.llm_budget
+
+    def deferred(self, items, now=None):
+        """本轮预算用完未处理的条目：返回需要带到下一轮的条目，记录首次被留下的时间用于老化。
+        订阅源已按抓取计划标记为抓取过，这些条目不会很快再出现在抓取结果中，因此必须由调用方持久保存；
+        超过最大年龄的条目不再保留"""
+        now = now or time.time()
+        carried = [dict(item, deferred_at=item.get('deferred_at') or now)
+                   for item in items if not self.is_stale(item, now)]
+        INGEST_ITEMS.inc(len(carried), result='carried_over')
+        INGEST_ITEMS.inc(len(items) - len(carried), result='dropped')
+        return carried
+
+
+_scheduler = None
+
+
+def get_ingest_scheduler():
+    global _scheduler
+    if _scheduler is None:
+        _scheduler = IngestScheduler()
+    return _scheduler
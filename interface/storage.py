@@ -0,0 +1,105 @@
+from abc import ABC, abstractmethod
+
+class StorageInterface(ABC):
+    """处理流程、读取侧API与离线脚本使用的存储操作，MySQL与SQLite各有一个实现。
+    stream_* 方法返回异步迭代器，其余方法均为协程"""
+
+    @abstractmethod
+    async def close(self):
+        pass
+
+    @abstractmethod
+    async def check_existing_article(self, url_hash=None, html_hash=None):
+        pass
+
+    @abstractmethod
+    async def get_existing_url_hashes(self, url_hashes):
+        pass
+
+    @abstractmethod
+    async def save_article(self, item, url_hash, html_hash, plain_content, summary, tags, genre_id, topic_id, language, read_time):
+        pass
+
+    @abstractmethod
+    async def insert_articles_batch(self, rows):
+        pass
+
+    @abstractmethod
+    async def fetch_rss_sources(self):
+        pass
+
+    @abstractmethod
+    async def add_rss_sources(self, sources):
+        pass
+
+    @abstractmethod
+    async def get_feed_schedules(self):
+        pass
+
+    @abstractmethod
+    async def get_source_publish_stats(self, since):
+        pass
+
+    @abstractmethod
+    async def update_feed_schedules(self, rows):
+        pass
+
+    @abstractmethod
+    async def get_recent_articles(self, hours=24):
+        pass
+
+    @abstractmethod
+    async def get_all_focuses(self):
+        pass
+
+    @abstractmethod
+    async def get_user_ids(self):
+        pass
+
+    @abstractmethod
+    async def get_focus_filters(self, focus_ids):
+        pass
+
+    @abstractmethod
+    async def save_focus_filter(self, focus_id, content_hash, filter_json):
+        pass
+
+    @abstractmethod
+    async def get_articles_tags(self, article_ids):
+        pass
+
+    @abstractmethod
+    async def add_focused_contents_batch(self, rows):
+        pass
+
+    @abstractmethod
+    async def get_focused_articles_page(self, user_id, limit, before=None):
+        pass
+
+    @abstractmethod
+    async def get_article_detail(self, article_id):
+        pass
+
+    @abstractmethod
+    async def update_user_article_statuses(self, user_id, updates):
+        pass
+
+    @abstractmethod
+    async def get_focused_digest_signatures(self):
+        pass
+
+    @abstractmethod
+    async def get_articles_for_reprocess(self, since=None, source_id=None, after_id=0, limit=500):
+        pass
+
+    @abstractmethod
+    async def update_articles_content(self, rows):
+        pass
+
+    @abstractmethod
+    def stream_articles_for_classification(self, after_id=0, since=None, chunk_size=5000):
+        pass
+
+    @abstractmethod
+    async def update_articles_classification(self, rows):
+        pass
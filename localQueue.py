@@ -5,23 +5,29 @@ import threading
 import atexit
 
 from interface.queque import QueueInterface
+from metrics import QUEUE_DEPTH
 
 class LocalQueue(QueueInterface):
     def __init__(self, max_size=0, persistence_file='local_queue.json'):
         self.queue = queue.Queue(maxsize=max_size)
         self.lock = threading.Lock()
         self.persistence_file = persistence_file
+        self.name = os.path.splitext(os.path.basename(persistence_file))[0]
         self._load_from_file()
+        QUEUE_DEPTH.set(self.queue.qsize(), queue=self.name)
         atexit.register(self._save_to_file)  # 注册退出时保存函数
 
     def enqueue(self, item):
         with self.lock:
             self.queue.put(item)
+            QUEUE_DEPTH.set(self.queue.qsize(), queue=self.name)
 
     def dequeue(self):
         with self.lock:
             if not self.queue.empty():
-                return self.queue.get()
+                item = self.queue.get()
+                QUEUE_DEPTH.set(self.queue.qsize(), queue=self.name)
+                return item
             return None
 
     def size(self):
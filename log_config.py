@@ -0,0 +1,191 @@
+import atexit
+import json
+import logging
+import os
+import queue
+import sys
+import threading
+from logging.handlers import QueueHandler, QueueListener
+
+from config import get_settings
+from metrics import counter
+from utils import get_env
+
+LOG_RECORDS_DROPPED = counter('insightfocus_log_records_dropped_total', '未输出的日志条数', ('reason',))
+
+TEXT_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
+
+# LogRecord自带的属性，其余属性（logging调用时通过extra传入的）作为结构化字段输出
+_RECORD_ATTRS = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime', 'taskName'}
+
+_listener = None
+
+
+class NonBlockingQueueHandler(QueueHandler):
+    """只把日志记录放入队列，格式化（含消息参数合并与异常堆栈）全部由监听线程完成。
+    队列满时丢弃并计数，事件循环线程不会因日志输出阻塞"""
+
+    def prepare(self, record):
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            LOG_RECORDS_DROPPED.inc(reason='queue_full')
+
+
+class ModuleLevelFilter(logging.Filter):
+    """按模块设置日志级别。项目代码直接使用根logger，按record.module（文件名）匹配；
+    第三方库的具名logger按logger名称（含上级包名）匹配"""
+
+    def __init__(self, default_level, levels):
+        super().__init__()
+        self.default_level = default_level
+        self.levels = levels
+
+    def threshold(self, record):
+        if record.name != 'root':
+            name = record.name
+            while name:
+                if name in self.levels:
+                    return self.levels[name]
+                name = name.rpartition('.')[0]
+        return self.levels.get(record.module, self.default_level)
+
+    def filter(self, record):
+        return record.levelno >= self.threshold(record)
+
+
+class SamplingFilter(logging.Filter):
+    """对同一调用位置（文件+行号）的WARNING以下日志限流：每个时间窗口内只输出前burst条，
+    其余丢弃计数，窗口结束后的第一条带上被省略的条数（sampled_out）"""
+
+    def __init__(self, burst, interval):
+        super().__init__()
+        self.burst = burst
+        self.interval = interval
+        self._windows = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING:
+            return True
+        key = (record.pathname, record.lineno)
+        with self._lock:
+            window = self._windows.get(key)
+            if window is None or record.created - window[0] >= self.interval:
+                if window and window[2]:
+                    record.sampled_out = window[2]
+                self._windows[key] = [record.created, 1, 0]
+                return True
+            if window[1] < self.burst:
+                window[1] += 1
+                return True
+            window[2] += 1
+        LOG_RECORDS_DROPPED.inc(reason='sampled')
+        return False
+
+
+class TextFormatter(logging.Formatter):
+    def format(self, record):
+        message = super().format(record)
+        sampled_out = getattr(record, 'sampled_out', 0)
+        if sampled_out:
+            message += f' （此前 {sampled_out} 条同类日志已省略）'
+        return message
+
+
+class JsonFormatter(logging.Formatter):
+    """每条日志输出为一行JSON，extra传入的字段原样保留，便于日志系统按字段检索"""
+
+    def format(self, record):
+        data = {
+            'time': f"{self.formatTime(record, '%Y-%m-%dT%H:%M:%S')}.{int(record.msecs):03d}",
+            'level': record.levelname,
+            'logger': record.name,
+            'module': record.module,
+            'line': record.lineno,
+            'message': record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS and not key.startswith('_'):
+                data[key] = value
+        if record.exc_info:
+            data['exc'] = self.formatException(record.exc_info)
+        return json.dumps(data, ensure_ascii=False, default=str)
+
+
+def parse_module_levels(raw):
+    """LOG_MODULE_LEVELS 形如 "general_crawler=WARNING,httpx=WARNING,focus_scheduler=DEBUG" """
+    levels = {}
+    for entry in (raw or '').split(','):
+        if not entry.strip():
+            continue
+        name, _, level = entry.partition('=')
+        value = getattr(logging, level.strip().upper(), None)
+        if not isinstance(value, int):
+            logging.warning(f"LOG_MODULE_LEVELS 中的级别无效，已忽略: {entry}")
+            continue
+        levels[name.strip()] = value
+    return levels
+
+
+def setup_logging():
+    """配置根logger：调用方只把记录放入有界队列，由后台线程的QueueListener格式化并写出。
+    可重复调用，只有第一次生效"""
+    global _listener
+    if _listener is not None:
+        return
+
+    level = getattr(logging, get_settings().log_level)
+    module_levels = parse_module_levels(get_env('LOG_MODULE_LEVELS'))
+    json_format = get_env('LOG_FORMAT', 'text').lower() == 'json'
+
+    output = logging.StreamHandler(sys.stderr)
+    output.setFormatter(JsonFormatter() if json_format else TextFormatter(TEXT_FORMAT))
+
+    handler = NonBlockingQueueHandler(queue.Queue(get_env('LOG_QUEUE_SIZE', 10000, int)))
+    handler.addFilter(ModuleLevelFilter(level, module_levels))
+    burst = get_env('LOG_SAMPLE_BURST', 20, int)
+    if burst:
+        handler.addFilter(SamplingFilter(burst, get_env('LOG_SAMPLE_INTERVAL', 60, float)))
+
+    root = logging.getLogger()
+    for existing in list(root.handlers):
+        root.removeHandler(existing)
+    root.addHandler(handler)
+    # 根logger取所有配置中最低的级别，具体模块的取舍由ModuleLevelFilter决定
+    root.setLevel(min([level] + list(module_levels.values())))
+    for name, module_level in module_levels.items():
+        # 第三方库的具名logger直接设置级别，低于该级别的记录不会被创建
+        logging.getLogger(name).setLevel(module_level)
+
+    _listener = QueueListener(handler.queue, output, respect_handler_level=True)
+    _listener.start()
+    atexit.register(stop_logging)
+    if hasattr(os, 'register_at_fork'):
+        os.register_at_fork(after_in_child=_log_directly_in_child)
+
+
+def _log_directly_in_child():
+    """fork出的子进程（如reprocess的进程池）中没有监听线程，改为由原输出handler直接写出"""
+    global _listener
+    if _listener is None:
+        return
+    outputs, _listener = _listener.handlers, None
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        if isinstance(handler, NonBlockingQueueHandler):
+            root.removeHandler(handler)
+            for output in outputs:
+                output.filters = list(handler.filters)
+                root.addHandler(output)
+
+
+def stop_logging():
+    """停止监听线程并写出队列中剩余的日志"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
@@ -1,66 +1,80 @@
 import asyncio
 import logging
-import os
-from dotenv import load_dotenv
 from rss_parser import fetch_all_rss_sources
 from content_processor import process_rss_items
-from db_operations import get_db_pool
 from focus_processor import run_focus_processing
-from utils import get_env  # 导入新的用户关注处理函数
+from metrics import start_metrics_server, profile_cycle
+from api_server import start_api_server
+from browser_pool import close_browser_pool
+from config import get_settings
+from log_config import setup_logging
+from storage import open_storage
+from utils import get_env
 
-log_level = get_env('LOG_LEVEL', 'INFO', str)
+# 配置在启动时读取并校验一次，LOG_LEVEL无效时会抛出ConfigError
+setup_logging()
 
-# 将字符串转换为日志级别常量
-numeric_level = getattr(logging, log_level.upper(), None)
-if not isinstance(numeric_level, int):
-    raise ValueError(f'Invalid log level: {log_level}')
-
-logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
-
-async def fetch_and_process_rss(db_pool):
-    rss_items = await fetch_all_rss_sources(db_pool)
+async def fetch_and_process_rss(storage):
+    rss_items = await fetch_all_rss_sources(storage)
     logging.info(f"Fetched {len(rss_items)} RSS items")
-    await process_rss_items(db_pool, rss_items)
+    await process_rss_items(storage, rss_items)
+
+async def run_cycle(coro, name, profile):
+    if profile:
+        return await profile_cycle(coro, name=name)
+    return await coro
 
 async def main():
-    db_pool = None
+    storage = None
+    metrics_runner = None
+    api_runner = None
+    # 为True时对下一轮处理进行采样分析并输出报告
+    profile_next = get_env('PROFILE_NEXT_CYCLE', False, bool)
     try:
-        db_pool = await get_db_pool()
-        if db_pool is None:
-            raise Exception("Failed to create database pool")
-        
-        logging.info("Database pool created")
+        metrics_runner = await start_metrics_server()
+
+        storage = await open_storage()
+        logging.info(f"Storage opened ({get_settings().database.backend})")
+
+        api_runner = await start_api_server(storage)
 
         while True:
             print("\n请选择操作：")
             print("1. 抓取并处理RSS内容")
             print("2. 处理用户关注")
             print("3. 退出")
+            print(f"4. 对下一轮处理进行采样分析（当前：{'开启' if profile_next else '关闭'}）")
             
-            choice = input("请输入选项（1/2/3）: ")
+            # input()放到线程里等待，指标导出与API服务与菜单共用事件循环，不能被阻塞
+            choice = await asyncio.to_thread(input, "请输入选项（1/2/3/4）: ")
 
             if choice == '1':
-                await fetch_and_process_rss(db_pool)
+                await run_cycle(fetch_and_process_rss(storage), 'rss', profile_next)
+                profile_next = False
             elif choice == '2':
-                await run_focus_processing(db_pool)
+                await run_cycle(run_focus_processing(storage), 'focus', profile_next)
+                profile_next = False
             elif choice == '3':
                 print("程序退出")
                 break
+            elif choice == '4':
+                profile_next = not profile_next
             else:
                 print("无效选项，请重新选择")
 
     except Exception as e:
         logging.error(f"An error occurred: {e}")
     finally:
-        if db_pool:
+        await close_browser_pool()
+        if api_runner:
+            await api_runner.cleanup()
+        if metrics_runner:
+            await metrics_runner.cleanup()
+        if storage:
             try:
-                if asyncio.iscoroutinefunction(db_pool.close):
-                    await db_pool.close()
-                else:
-                    db_pool.close()
-                logging.info("Database pool closed")
+                await storage.close()
             except Exception as e:
-                logging.error(f"Error closing database pool: {e}")
+                logging.error(f"Error closing storage: {e}")
 
 if __name__ == "__main__":
     asyncio.run(main())
\ No newline at end of file
@@ -0,0 +1,150 @@
+import asyncio
+import itertools
+import logging
+import time
+from collections import OrderedDict, defaultdict
+from contextlib import asynccontextmanager
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlparse
+from urllib.robotparser import RobotFileParser
+
+import httpx
+
+from metrics import counter, gauge
+from utils import get_env
+
+HOST_BACKOFF = gauge('insightfocus_host_backoff_factor', '各站点当前的退避倍数', ('host',))
+ROBOTS_BLOCKED = counter('insightfocus_robots_blocked_total', '因robots.txt禁止而跳过的请求数', ('host',))
+
+# 这些状态码说明站点正在限流或过载，需要放慢对该站点的请求
+THROTTLE_STATUS = (429, 503)
+
+
+def host_of(url):
+    return urlparse(url).netloc.lower()
+
+
+def interleave_by_domain(items, key='url'):
+    """按站点轮转重排条目，使同一站点的请求在时间上分散开，各站点内部保持原有顺序"""
+    groups = OrderedDict()
+    for item in items:
+        groups.setdefault(host_of(item.get(key) or ''), []).append(item)
+    interleaved = itertools.zip_longest(*groups.values())
+    return [item for group in interleaved for item in group if item is not None]
+
+
+class _HostState:
+    def __init__(self, concurrency):
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.lock = asyncio.Lock()
+        self.next_allowed = 0.0
+        self.backoff = 1.0
+        self.robots = None
+        self.robots_expires = 0.0
+        self.crawl_delay = None
+
+
+class DomainScheduler:
+    """按站点限制并发与请求速率：缓存robots.txt及其Crawl-delay，并根据429/503等错误自适应退避"""
+
+    def __init__(self, per_host_concurrency=None, min_interval=None, robots_ttl=None, respect_robots=None,
+                 user_agent=None, max_backoff=None):
+        self.per_host_concurrency = per_host_concurrency or get_env('CRAWL_HOST_CONCURRENCY', 2, int)
+        self.min_interval = min_interval if min_interval is not None else get_env('CRAWL_HOST_INTERVAL', 1.0, float)
+        self.robots_ttl = robots_ttl or get_env('ROBOTS_CACHE_TTL', 86400, int)
+        self.respect_robots = respect_robots if respect_robots is not None else get_env('CRAWL_RESPECT_ROBOTS', True, bool)
+        self.user_agent = user_agent or get_env('ROBOTS_USER_AGENT', 'InsightFocus', str)
+        self.max_backoff = max_backoff or get_env('CRAWL_MAX_BACKOFF', 64.0, float)
+        self._hosts = defaultdict(lambda: _HostState(self.per_host_concurrency))
+
+    async def _load_robots(self, url, state):
+        parsed = urlparse(url)
+        robots_url = f"{parsed.scheme}://{parsed.netloc}/robots.txt"
+        parser = RobotFileParser(robots_url)
+        try:
+            async with httpx.AsyncClient(follow_redirects=True) as client:
+                response = await client.get(robots_url, timeout=10)
+            if response.status_code in (401, 403):
+                parser.disallow_all = True
+            elif response.status_code >= 400:
+                parser.allow_all = True
+            else:
+                parser.parse(response.text.splitlines())
+        except httpx.HTTPError as e:
+            # robots.txt获取失败时不阻塞抓取，按允许处理，缩短缓存时间以便稍后重试
+            logging.debug(f"获取robots.txt失败 {robots_url}: {e}")
+            parser.allow_all = True
+            state.robots_expires = time.monotonic() + min(self.robots_ttl, 600)
+        else:
+            state.robots_expires = time.monotonic() + self.robots_ttl
+        state.robots = parser
+        delay = parser.crawl_delay(self.user_agent)
+        state.crawl_delay = float(delay) if delay is not None else None
+
+    async def allowed(self, url):
+        """检查robots.txt是否允许抓取该URL，robots.txt按站点缓存"""
+        if not self.respect_robots:
+            return True
+        host = host_of(url)
+        state = self._hosts[host]
+        if state.robots is None or time.monotonic() >= state.robots_expires:
+            async with state.lock:
+                if state.robots is None or time.monotonic() >= state.robots_expires:
+                    await self._load_robots(url, state)
+        if state.robots.can_fetch(self.user_agent, url):
+            return True
+        ROBOTS_BLOCKED.inc(host=host)
+        return False
+
+    def _interval(self, state):
+        interval = max(self.min_interval, state.crawl_delay or 0)
+        return interval * state.backoff
+
+    @asynccontextmanager
+    async def slot(self, url):
+        """获取该站点的请求配额：限制并发数，并保证相邻两次请求之间满足间隔"""
+        state = self._hosts[host_of(url)]
+        async with state.semaphore:
+            async with state.lock:
+                wait = state.next_allowed - time.monotonic()
+                if wait > 0:
+                    await asyncio.sleep(wait)
+                state.next_allowed = time.monotonic() + self._interval(state)
+            yield
+
+    def record(self, url, status_code=None, retry_after=None, error=False):
+        """根据响应调整该站点的退避倍数：限流/过载或网络错误时加倍，成功时逐步恢复"""
+        host = host_of(url)
+        state = self._hosts[host]
+        if error or status_code in THROTTLE_STATUS:
+            state.backoff = min(state.backoff * 2, self.max_backoff)
+            delay = self._parse_retry_after(retry_after)
+            if delay is not None:
+                state.next_allowed = max(state.next_allowed, time.monotonic() + delay)
+            logging.warning(f"站点 {host} 返回 {status_code or '网络错误'}，退避倍数调整为 {state.backoff}")
+        elif status_code is not None and status_code < 400:
+            state.backoff = max(1.0, state.backoff * 0.75)
+        HOST_BACKOFF.set(state.backoff, host=host)
+
+    @staticmethod
+    def _parse_retry_after(value):
+        if not value:
+            return None
+        try:
+            return float(value)
+        except ValueError:
+            pass
+        try:
+            return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+        except (TypeError, ValueError):
+            return None
+
+
+_scheduler = None
+
+
+def get_domain_scheduler():
+    global _scheduler
+    if _scheduler is None:
+        _scheduler = DomainScheduler()
+    return _scheduler
@@ -0,0 +1,71 @@
+import argparse
+import asyncio
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from general_crawler import extract_article
+from html_store import get_html_store
+from log_config import setup_logging
+from storage import open_storage
+from utils import estimate_read_time
+
+
+def _extract_from_store(task):
+    """进程池中执行：从本地HTML存储读取页面并重新提取正文，不访问网络"""
+    article_id, url, html_hash = task
+    html = get_html_store().get(html_hash)
+    if not html:
+        return article_id, None
+    result = extract_article(html, url)
+    return article_id, result.get('plain_content') or None
+
+
+async def reprocess(storage, since=None, source_id=None, workers=None, batch_size=500, dry_run=False):
+    loop = asyncio.get_running_loop()
+    after_id = 0
+    updated = missing = 0
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        while True:
+            rows = await storage.get_articles_for_reprocess(since=since, source_id=source_id,
+                                                      after_id=after_id, limit=batch_size)
+            if not rows:
+                break
+            after_id = rows[-1][0]
+
+            results = await asyncio.gather(*[loop.run_in_executor(executor, _extract_from_store, row) for row in rows])
+            updates = [(content, estimate_read_time(content), article_id) for article_id, content in results if content]
+            missing += len(results) - len(updates)
+            if updates and not dry_run:
+                await storage.update_articles_content(updates)
+            updated += len(updates)
+            logging.info(f"已重新提取 {updated} 篇文章（缺少HTML或提取失败 {missing} 篇），当前ID：{after_id}")
+    return updated, missing
+
+
+async def main():
+    arg_parser = argparse.ArgumentParser(description='从本地存储的原始HTML重新提取文章正文')
+    arg_parser.add_argument('--since', help='只处理该时间之后抓取的文章，例如 2024-08-01')
+    arg_parser.add_argument('--source-id', type=int, help='只处理指定RSS源的文章')
+    arg_parser.add_argument('--workers', type=int, default=os.cpu_count(), help='并行提取的进程数')
+    arg_parser.add_argument('--batch-size', type=int, default=500)
+    arg_parser.add_argument('--dry-run', action='store_true', help='只提取不写回数据库')
+    arg_parser.add_argument('--train-dictionary', action='store_true', help='用已存储的页面训练新的zstd字典后退出')
+    args = arg_parser.parse_args()
+
+    if args.train_dictionary:
+        get_html_store().train_dictionary()
+        return
+
+    storage = await open_storage()
+    try:
+        updated, missing = await reprocess(storage, since=args.since, source_id=args.source_id, workers=args.workers,
+                                           batch_size=args.batch_size, dry_run=args.dry_run)
+        logging.info(f"重新提取完成：更新 {updated} 篇，跳过 {missing} 篇")
+    finally:
+        await storage.close()
+
+
+if __name__ == "__main__":
+    setup_logging()
+    asyncio.run(main())
@@ -1,38 +1,54 @@
 from datetime import datetime
 import logging
-import feedparser
 import asyncio
 import uuid
 import httpx
-from db_operations import fetch_rss_sources
-from lxml import etree
+from feed_scheduler import get_feed_poller
+from metrics import timed
+from utils import get_env
 
+@timed('fetch_feed')
 async def fetch_rss_feed(url):
-    async with httpx.AsyncClient() as client:
+    # feedparser与lxml在首次抓取订阅源时才导入
+    import feedparser
+    from lxml import etree
+    async with httpx.AsyncClient(follow_redirects=True) as client:
         try:
             response = await client.get(url)
+            response.raise_for_status()
             parser = etree.XMLParser(recover=True)
             tree = etree.fromstring(response.content, parser=parser)
             rss_data = etree.tostring(tree)
             return feedparser.parse(rss_data)
         except Exception as e:
             logging.error(f"Error fetching or parsing {url}: {e}")
-            return feedparser.FeedParserDict(entries=[])
+            # error标记抓取失败，供轮询调度退避
+            return feedparser.FeedParserDict(entries=[], error=str(e))
 
-async def fetch_all_rss_sources(db_pool):
-    sources = await fetch_rss_sources(db_pool)
-    tasks = [fetch_rss_feed(source[1]) for source in sources]
-    feeds = await asyncio.gather(*tasks)
-    
-    rss_items = []
-    for source_id, feed in zip([s[0] for s in sources], feeds):
-        for entry in feed.entries:
-            rss_items.append({
-                'source_id': source_id,
-                'guid': str(uuid.uuid4()),  # 生成一个新的UUID
-                'url': entry.link,
-                'title': entry.title,
-                'published_at': entry.get('published',entry.get('updated', datetime.now())),
-            })
-    
-    return rss_items
+def feed_items(source_id, feed):
+    return [
+        {
+            'source_id': source_id,
+            'guid': str(uuid.uuid4()),  # 生成一个新的UUID
+            'url': entry.link,
+            'title': entry.title,
+            'published_at': entry.get('published',entry.get('updated', datetime.now())),
+        }
+        for entry in feed.entries
+    ]
+
+async def fetch_all_rss_sources(storage):
+    if not get_env('FEED_ADAPTIVE_POLLING', True, bool):
+        sources = await storage.fetch_rss_sources()
+        feeds = await asyncio.gather(*[fetch_rss_feed(source[1]) for source in sources])
+        return [item for source, feed in zip(sources, feeds) for item in feed_items(source[0], feed)]
+
+    # 只抓取到期的源，抓取结果用于更新各源的发布速率估计与下次抓取时间
+    poller = get_feed_poller()
+    sources = await poller.due_sources(storage)
+    feeds = await asyncio.gather(*[fetch_rss_feed(source['url']) for source in sources])
+    try:
+        await poller.record(storage, [(source, feed, 'error' in feed) for source, feed in zip(sources, feeds)])
+    except Exception as e:
+        logging.error(f"更新订阅源抓取计划失败: {str(e)}")
+    return [item for source, feed in zip(sources, feeds) for item in feed_items(source['id'], feed)]
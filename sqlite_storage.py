@@ -0,0 +1,569 @@
+import asyncio
+import functools
+import logging
+import os
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from conf.consts import GENRES, TOPICS
+from db_operations import (
+    DB_READ_SECONDS, DB_TRANSACTION_SECONDS, DB_TRANSACTION_ERRORS, ARTICLE_COLUMNS, RECENT_ARTICLE_COLUMNS,
+    FEED_SCHEDULE_COLUMNS, build_article_data, notify_focus_changed, _recent_article, _feed_schedule
+)
+from interface.storage import StorageInterface
+
+SCHEMA_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'db', 'init_sqlite.sql')
+
+# SQLite旧版本每条语句最多999个参数，IN查询按此分段
+MAX_VARIABLES = 900
+
+# 表结构文件只会创建缺失的表，已有数据库文件中后来新增的列在打开时补上
+ADDED_COLUMNS = {
+    'rssSources': [
+        ('last_polled_at', 'DATETIME'),
+        ('next_poll_at', 'DATETIME'),
+        ('poll_errors', 'INTEGER NOT NULL DEFAULT 0'),
+    ],
+}
+
+
+def _adapt_datetime(value):
+    # 与MySQL DATETIME一致，精确到秒；固定格式保证按字符串比较即按时间比较
+    return value.strftime('%Y-%m-%d %H:%M:%S')
+
+
+def _convert_datetime(value):
+    value = value.decode()
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        return value
+
+
+sqlite3.register_adapter(datetime, _adapt_datetime)
+sqlite3.register_converter('DATETIME', _convert_datetime)
+
+
+def _now():
+    return datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+
+
+def _placeholders(count):
+    return ', '.join(['?'] * count)
+
+
+def _chunks(values, size=MAX_VARIABLES):
+    values = list(values)
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+
+def _mappings():
+    return {t[0]: t[1] for t in GENRES}, {c[0]: c[1] for c in TOPICS}
+
+
+# 以下函数在执行器线程中运行，第一个参数为sqlite3游标，SQL与db_operations中的同名函数对应
+
+def check_existing_article(cur, url_hash=None, html_hash=None):
+    if url_hash:
+        cur.execute("SELECT id FROM articles WHERE url_hash = ?", (url_hash,))
+    elif html_hash:
+        cur.execute("SELECT id FROM articles WHERE html_hash = ?", (html_hash,))
+    else:
+        return None
+    return cur.fetchone()
+
+
+def get_existing_url_hashes(cur, url_hashes):
+    existing = set()
+    for chunk in _chunks(url_hashes):
+        cur.execute(f"SELECT url_hash FROM articles WHERE url_hash IN ({_placeholders(len(chunk))})", chunk)
+        existing.update(row[0] for row in cur.fetchall())
+    return existing
+
+
+UPSERT_ARTICLE = f"""
+INSERT INTO articles ({', '.join(ARTICLE_COLUMNS)}, last_updated_at)
+VALUES ({_placeholders(len(ARTICLE_COLUMNS) + 1)})
+ON CONFLICT (url_hash) DO UPDATE SET
+title = excluded.title,
+original_html = excluded.original_html,
+plain_content = excluded.plain_content,
+html_hash = excluded.html_hash,
+fetched_at = excluded.fetched_at,
+summary = excluded.summary,
+language = excluded.language,
+read_time = excluded.read_time,
+last_updated_at = excluded.last_updated_at,
+topic_id = excluded.topic_id,
+genre_id = excluded.genre_id
+"""
+
+
+def insert_articles_batch(cur, rows):
+    """rows为 (article_data, tags) 列表，返回写入的文章数。SQLite在同一事务内逐行执行的开销很小，不需要拼接多行VALUES"""
+    rows = [(data, tags) for data, tags in rows if data]
+    if not rows:
+        return 0
+
+    now = _now()
+    cur.executemany(UPSERT_ARTICLE, [[data.get(key) for key in ARTICLE_COLUMNS] + [now] for data, _ in rows])
+
+    # upsert走更新分支时lastrowid不可靠，按url_hash取回文章ID
+    article_ids = {}
+    for chunk in _chunks({data['url_hash'] for data, _ in rows}):
+        cur.execute(f"SELECT id, url_hash FROM articles WHERE url_hash IN ({_placeholders(len(chunk))})", chunk)
+        article_ids.update({url_hash: article_id for article_id, url_hash in cur.fetchall()})
+
+    tag_names = list({tag for _, tags in rows for tag in tags if tag})
+    if tag_names:
+        cur.executemany("INSERT OR IGNORE INTO tags (name) VALUES (?)", [(name,) for name in tag_names])
+        tag_ids = {}
+        for chunk in _chunks(tag_names):
+            cur.execute(f"SELECT id, name FROM tags WHERE name IN ({_placeholders(len(chunk))})", chunk)
+            tag_ids.update({name.lower(): tag_id for tag_id, name in cur.fetchall()})
+        links = {
+            (article_ids[data['url_hash']], tag_ids[tag.lower()])
+            for data, tags in rows for tag in tags
+            if tag and data['url_hash'] in article_ids and tag.lower() in tag_ids
+        }
+        cur.executemany("INSERT OR IGNORE INTO article_tags (article_id, tag_id) VALUES (?, ?)", list(links))
+
+    cur.executemany("UPDATE rssSources SET last_fetched_at = ? WHERE id = ?",
+                    [(now, source_id) for source_id in {data['source_id'] for data, _ in rows}])
+    return len(rows)
+
+
+def fetch_rss_sources(cur):
+    cur.execute("SELECT id, url FROM rssSources")
+    return cur.fetchall()
+
+
+def _source_ids(cur, urls):
+    ids = {}
+    for chunk in _chunks(urls):
+        cur.execute(f"SELECT url, id FROM rssSources WHERE url IN ({_placeholders(len(chunk))})", chunk)
+        ids.update({row[0]: row[1] for row in cur.fetchall()})
+    return ids
+
+
+def add_rss_sources(cur, sources):
+    urls = list({url for url, _, _ in sources})
+    existing = _source_ids(cur, urls)
+    new_sources = list({url: (url, name, description) for url, name, description in sources
+                        if url not in existing}.values())
+    cur.executemany("INSERT INTO rssSources (url, name, description) VALUES (?, ?, ?)", new_sources)
+    return _source_ids(cur, urls)
+
+
+def get_feed_schedules(cur):
+    cur.execute(f"SELECT {FEED_SCHEDULE_COLUMNS} FROM rssSources")
+    return [_feed_schedule(row) for row in cur.fetchall()]
+
+
+def get_source_publish_stats(cur, since):
+    cur.execute("""
+        SELECT source_id, COUNT(*), MIN(published_at)
+        FROM articles
+        WHERE published_at >= ?
+        GROUP BY source_id
+    """, (since,))
+    # 聚合列没有声明类型，转换回datetime与MySQL实现一致
+    return {row[0]: (row[1], datetime.fromisoformat(row[2]) if row[2] else None) for row in cur.fetchall()}
+
+
+def update_feed_schedules(cur, rows):
+    cur.executemany("""
+        UPDATE rssSources
+        SET update_interval = ?, last_polled_at = ?, next_poll_at = ?, poll_errors = ?
+        WHERE id = ?
+    """, rows)
+
+
+def get_recent_articles(cur, hours):
+    genre_mapping, topic_mapping = _mappings()
+    cur.execute(f"SELECT {RECENT_ARTICLE_COLUMNS} FROM articles WHERE fetched_at >= ?",
+                (datetime.now() - timedelta(hours=hours),))
+    return [_recent_article(row, genre_mapping, topic_mapping) for row in cur.fetchall()]
+
+
+def get_all_focuses(cur):
+    cur.execute("SELECT id, user_id, content FROM userFocuses")
+    return [{'id': row[0], 'user_id': row[1], 'content': row[2]} for row in cur.fetchall()]
+
+
+def get_user_ids(cur):
+    cur.execute("SELECT id FROM rssUsers")
+    return [row[0] for row in cur.fetchall()]
+
+
+def get_focus_filters(cur, focus_ids):
+    filters = {}
+    for chunk in _chunks(focus_ids):
+        cur.execute(f"SELECT focus_id, content_hash, filter FROM focusFilters WHERE focus_id IN ({_placeholders(len(chunk))})", chunk)
+        filters.update({row[0]: (row[1], row[2]) for row in cur.fetchall()})
+    return filters
+
+
+def save_focus_filter(cur, focus_id, content_hash, filter_json):
+    cur.execute("""
+        INSERT INTO focusFilters (focus_id, content_hash, filter, compiled_at)
+        VALUES (?, ?, ?, ?)
+        ON CONFLICT (focus_id) DO UPDATE SET
+        content_hash = excluded.content_hash, filter = excluded.filter, compiled_at = excluded.compiled_at
+    """, (focus_id, content_hash, filter_json, _now()))
+
+
+def get_articles_tags(cur, article_ids):
+    tags = {}
+    for chunk in _chunks(article_ids):
+        cur.execute(f"""
+            SELECT at.article_id, t.name
+            FROM article_tags at
+            JOIN tags t ON t.id = at.tag_id
+            WHERE at.article_id IN ({_placeholders(len(chunk))})
+        """, chunk)
+        for article_id, name in cur.fetchall():
+            tags.setdefault(article_id, []).append(name)
+    return tags
+
+
+def add_focused_contents_batch(cur, rows):
+    now = _now()
+    cur.executemany("""
+        INSERT INTO focusedContents (user_id, article_id, focus_id, via_article_id, created_at)
+        VALUES (?, ?, ?, ?, ?)
+        ON CONFLICT (user_id, article_id, focus_id) DO UPDATE SET via_article_id = excluded.via_article_id
+    """, [tuple(row) + (now,) for row in rows])
+
+
+def get_focused_articles_page(cur, user_id, limit, before=None):
+    query = """
+    SELECT fc.id, fc.created_at, fc.focus_id, a.id, a.title, a.summary, a.url, a.published_at,
+           a.genre_id, a.topic_id, a.read_time, s.status
+    FROM focusedContents fc
+    JOIN articles a ON a.id = fc.article_id
+    LEFT JOIN userArticleStatus s ON s.user_id = fc.user_id AND s.article_id = fc.article_id
+    WHERE fc.user_id = ?
+    """
+    params = [user_id]
+    if before:
+        created_at, row_id = before
+        query += " AND (fc.created_at < ? OR (fc.created_at = ? AND fc.id < ?))"
+        params.extend((created_at, created_at, row_id))
+    query += " ORDER BY fc.created_at DESC, fc.id DESC LIMIT ?"
+    params.append(limit)
+    cur.execute(query, params)
+
+    genre_mapping, topic_mapping = _mappings()
+    return [
+        {
+            'focused_id': row[0],
+            'created_at': row[1],
+            'focus_id': row[2],
+            'article_id': row[3],
+            'title': row[4],
+            'summary': row[5],
+            'url': row[6],
+            'published_at': row[7],
+            'genre': genre_mapping.get(row[8], '未知类型'),
+            'topic': topic_mapping.get(row[9], '未知分类'),
+            'read_time': row[10],
+            'status': row[11] or 'unread'
+        }
+        for row in cur.fetchall()
+    ]
+
+
+def get_article_detail(cur, article_id):
+    cur.execute("""
+        SELECT a.id, a.source_id, a.genre_id, a.topic_id, a.url, a.title, a.plain_content, a.summary,
+               a.published_at, a.fetched_at, a.language, a.read_time,
+               (SELECT group_concat(t.name, char(9)) FROM article_tags at JOIN tags t ON t.id = at.tag_id
+                WHERE at.article_id = a.id)
+        FROM articles a
+        WHERE a.id = ?
+    """, (article_id,))
+    row = cur.fetchone()
+    if not row:
+        return None
+    genre_mapping, topic_mapping = _mappings()
+    return {
+        'id': row[0],
+        'source_id': row[1],
+        'genre': genre_mapping.get(row[2], '未知类型'),
+        'topic': topic_mapping.get(row[3], '未知分类'),
+        'url': row[4],
+        'title': row[5],
+        'plain_content': row[6],
+        'summary': row[7],
+        'published_at': row[8],
+        'fetched_at': row[9],
+        'language': row[10],
+        'read_time': row[11],
+        'tags': row[12].split('\t') if row[12] else []
+    }
+
+
+def update_user_article_statuses(cur, user_id, updates):
+    now = _now()
+    cur.executemany("""
+        INSERT INTO userArticleStatus (user_id, article_id, status, updated_at)
+        VALUES (?, ?, ?, ?)
+        ON CONFLICT (user_id, article_id) DO UPDATE SET status = excluded.status, updated_at = excluded.updated_at
+    """, [(user_id, article_id, status, now) for article_id, status in updates])
+    return len(updates)
+
+
+def get_focused_digest_signatures(cur):
+    cur.execute("SELECT user_id, COUNT(*), MAX(created_at), MAX(id) FROM focusedContents GROUP BY user_id")
+    # 聚合列没有声明类型，不会被转换为datetime，这里与MySQL实现保持相同的isoformat格式
+    return {
+        row[0]: [row[1], datetime.fromisoformat(row[2]).isoformat() if row[2] else None, row[3]]
+        for row in cur.fetchall()
+    }
+
+
+def get_articles_for_reprocess(cur, since=None, source_id=None, after_id=0, limit=500):
+    query = "SELECT id, url, html_hash FROM articles WHERE id > ? AND html_hash IS NOT NULL"
+    params = [after_id]
+    if since:
+        query += " AND fetched_at >= ?"
+        params.append(since)
+    if source_id:
+        query += " AND source_id = ?"
+        params.append(source_id)
+    query += " ORDER BY id LIMIT ?"
+    params.append(limit)
+    cur.execute(query, params)
+    return cur.fetchall()
+
+
+def update_articles_content(cur, rows):
+    now = _now()
+    cur.executemany("UPDATE articles SET plain_content = ?, read_time = ?, last_updated_at = ? WHERE id = ?",
+                    [(plain_content, read_time, now, article_id) for plain_content, read_time, article_id in rows])
+
+
+def get_articles_for_classification(cur, after_id, since, limit):
+    query = """
+    SELECT a.id, a.title, a.summary,
+           (SELECT group_concat(t.name, char(9)) FROM article_tags at JOIN tags t ON t.id = at.tag_id
+            WHERE at.article_id = a.id)
+    FROM articles a
+    WHERE a.id > ?
+    """
+    params = [after_id]
+    if since:
+        query += " AND a.fetched_at >= ?"
+        params.append(since)
+    query += " ORDER BY a.id LIMIT ?"
+    params.append(limit)
+    cur.execute(query, params)
+    return cur.fetchall()
+
+
+def update_articles_classification(cur, rows):
+    now = _now()
+    cur.executemany("UPDATE articles SET topic_id = ?, genre_id = ?, last_updated_at = ? WHERE id = ?",
+                    [(topic_id, genre_id, now, article_id) for article_id, topic_id, genre_id in rows])
+
+
+def save_article(cur, item, url_hash, html_hash, plain_content, summary, tags, genre_id, topic_id, language, read_time):
+    article_data = build_article_data(item, url_hash, html_hash, plain_content, summary, genre_id, topic_id, language, read_time)
+    if not article_data:
+        return
+    insert_articles_batch(cur, [(article_data, tags)])
+    logging.info(f"文章及标签已写入：{item['url']}")
+
+
+class SQLiteStorage(StorageInterface):
+    """嵌入式SQLite存储（WAL模式）：一个写连接、一个读连接，各自在单线程执行器中运行，
+    读取不会被写事务阻塞，去重与详情查询在进程内完成，不经过网络。
+    path为 ':memory:' 时使用单个内存连接，适合测试"""
+
+    def __init__(self, path):
+        self.path = path
+        memory = path == ':memory:'
+        self._writer = self._connect()
+        self._reader = self._writer if memory else self._connect()
+        self._write_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='sqlite-write')
+        self._read_executor = self._write_executor if memory else ThreadPoolExecutor(max_workers=1, thread_name_prefix='sqlite-read')
+
+    @classmethod
+    async def open(cls, path):
+        if path != ':memory:' and os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        storage = cls(path)
+        await storage._run(storage._write_executor, storage._init_schema)
+        logging.info(f"SQLite存储已打开：{path}")
+        return storage
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, isolation_level=None, check_same_thread=False,
+                               detect_types=sqlite3.PARSE_DECLTYPES)
+        conn.execute("PRAGMA journal_mode = WAL")
+        # WAL模式下NORMAL只在检查点时fsync，断电最多丢失最近提交的事务，不会损坏数据库
+        conn.execute("PRAGMA synchronous = NORMAL")
+        conn.execute("PRAGMA busy_timeout = 5000")
+        conn.execute("PRAGMA temp_store = MEMORY")
+        conn.execute("PRAGMA cache_size = -65536")
+        return conn
+
+    def _init_schema(self):
+        with open(SCHEMA_FILE, 'r', encoding='utf-8') as f:
+            self._writer.executescript(f.read())
+        for table, columns in ADDED_COLUMNS.items():
+            existing = {row[1] for row in self._writer.execute(f"PRAGMA table_info({table})")}
+            for name, definition in columns:
+                if name not in existing:
+                    self._writer.execute(f"ALTER TABLE {table} ADD COLUMN {name} {definition}")
+        self._writer.executemany("INSERT OR IGNORE INTO topics (id, name, description) VALUES (?, ?, ?)", TOPICS)
+        self._writer.executemany("INSERT OR IGNORE INTO genres (id, name, description) VALUES (?, ?, ?)", GENRES)
+
+    async def _run(self, executor, func, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(executor, functools.partial(func, *args, **kwargs))
+
+    def _execute_read(self, func, args, kwargs):
+        cur = self._reader.cursor()
+        try:
+            return func(cur, *args, **kwargs)
+        finally:
+            cur.close()
+
+    def _execute_write(self, func, args, kwargs):
+        cur = self._writer.cursor()
+        try:
+            # IMMEDIATE在事务开始时就取得写锁，避免事务中途升级写锁失败
+            cur.execute("BEGIN IMMEDIATE")
+            try:
+                result = func(cur, *args, **kwargs)
+                cur.execute("COMMIT")
+                return result
+            except Exception:
+                cur.execute("ROLLBACK")
+                raise
+        finally:
+            cur.close()
+
+    async def _read(self, func, *args, **kwargs):
+        with DB_READ_SECONDS.time(operation=func.__name__):
+            return await self._run(self._read_executor, self._execute_read, func, args, kwargs)
+
+    async def _write(self, func, *args, **kwargs):
+        operation = func.__name__
+        with DB_TRANSACTION_SECONDS.time(operation=operation):
+            try:
+                return await self._run(self._write_executor, self._execute_write, func, args, kwargs)
+            except Exception as e:
+                DB_TRANSACTION_ERRORS.inc(operation=operation)
+                logging.error(f"Transaction failed: {str(e)}")
+                raise
+
+    async def close(self):
+        await self._run(self._write_executor, self._writer.execute, "PRAGMA optimize")
+        for conn in {self._reader, self._writer}:
+            conn.close()
+        for executor in {self._read_executor, self._write_executor}:
+            executor.shutdown(wait=True)
+        logging.info("SQLite存储已关闭")
+
+    async def check_existing_article(self, url_hash=None, html_hash=None):
+        return await self._read(check_existing_article, url_hash=url_hash, html_hash=html_hash)
+
+    async def get_existing_url_hashes(self, url_hashes):
+        return await self._read(get_existing_url_hashes, url_hashes)
+
+    async def save_article(self, item, url_hash, html_hash, plain_content, summary, tags, genre_id, topic_id, language, read_time):
+        return await self._write(save_article, item, url_hash, html_hash, plain_content, summary, tags,
+                                 genre_id, topic_id, language, read_time)
+
+    async def insert_articles_batch(self, rows):
+        return await self._write(insert_articles_batch, rows)
+
+    async def fetch_rss_sources(self):
+        return await self._read(fetch_rss_sources)
+
+    async def add_rss_sources(self, sources):
+        if not sources:
+            return {}
+        return await self._write(add_rss_sources, sources)
+
+    async def get_feed_schedules(self):
+        return await self._read(get_feed_schedules)
+
+    async def get_source_publish_stats(self, since):
+        return await self._read(get_source_publish_stats, since)
+
+    async def update_feed_schedules(self, rows):
+        if rows:
+            await self._write(update_feed_schedules, rows)
+
+    async def get_recent_articles(self, hours=24):
+        return await self._read(get_recent_articles, hours)
+
+    async def get_all_focuses(self):
+        return await self._read(get_all_focuses)
+
+    async def get_user_ids(self):
+        return await self._read(get_user_ids)
+
+    async def get_focus_filters(self, focus_ids):
+        return await self._read(get_focus_filters, focus_ids)
+
+    async def save_focus_filter(self, focus_id, content_hash, filter_json):
+        return await self._write(save_focus_filter, focus_id, content_hash, filter_json)
+
+    async def get_articles_tags(self, article_ids):
+        return await self._read(get_articles_tags, article_ids)
+
+    async def add_focused_contents_batch(self, rows):
+        if not rows:
+            return
+        await self._write(add_focused_contents_batch, rows)
+        # 回调可能操作事件循环中的对象，在写入完成后回到事件循环线程调用
+        for user_id in {row[0] for row in rows}:
+            notify_focus_changed(user_id)
+
+    async def get_focused_articles_page(self, user_id, limit, before=None):
+        return await self._read(get_focused_articles_page, user_id, limit, before)
+
+    async def get_article_detail(self, article_id):
+        return await self._read(get_article_detail, article_id)
+
+    async def update_user_article_statuses(self, user_id, updates):
+        if not updates:
+            return 0
+        updated = await self._write(update_user_article_statuses, user_id, updates)
+        notify_focus_changed(user_id)
+        return updated
+
+    async def get_focused_digest_signatures(self):
+        return await self._read(get_focused_digest_signatures)
+
+    async def get_articles_for_reprocess(self, since=None, source_id=None, after_id=0, limit=500):
+        return await self._read(get_articles_for_reprocess, since=since, source_id=source_id, after_id=after_id, limit=limit)
+
+    async def update_articles_content(self, rows):
+        if rows:
+            await self._write(update_articles_content, rows)
+
+    async def stream_articles_for_classification(self, after_id=0, since=None, chunk_size=5000):
+        while True:
+            rows = await self._read(get_articles_for_classification, after_id, since, chunk_size)
+            for row in rows:
+                after_id = row[0]
+                yield {
+                    'id': row[0],
+                    'title': row[1],
+                    'summary': row[2] or '',
+                    'tags': row[3].split('\t') if row[3] else []
+                }
+            if len(rows) < chunk_size:
+                return
+
+    async def update_articles_classification(self, rows):
+        if rows:
+            await self._write(update_articles_classification, rows)
@@ -0,0 +1,112 @@
+import logging
+
+import db_operations as db
+from config import get_settings
+from interface.storage import StorageInterface
+
+
+class MySQLStorage(StorageInterface):
+    """基于aiomysql连接池的存储，各操作委托给db_operations中以cur为第一个参数的函数"""
+
+    def __init__(self, pool):
+        self.pool = pool
+
+    @classmethod
+    async def open(cls):
+        return cls(await db.get_db_pool())
+
+    async def close(self):
+        self.pool.close()
+        await self.pool.wait_closed()
+        logging.info("Database pool closed")
+
+    async def check_existing_article(self, url_hash=None, html_hash=None):
+        return await db.with_read(self.pool, db.check_existing_article, url_hash=url_hash, html_hash=html_hash)
+
+    async def get_existing_url_hashes(self, url_hashes):
+        return await db.with_read(self.pool, db.get_existing_url_hashes, url_hashes)
+
+    async def save_article(self, item, url_hash, html_hash, plain_content, summary, tags, genre_id, topic_id, language, read_time):
+        return await db.with_transaction(self.pool, db.process_rss_item_transaction, item, url_hash, html_hash,
+                                         plain_content, summary, tags, genre_id, topic_id, language, read_time)
+
+    async def insert_articles_batch(self, rows):
+        return await db.with_transaction(self.pool, db.insert_articles_batch, rows)
+
+    async def fetch_rss_sources(self):
+        return await db.with_read(self.pool, db.fetch_rss_sources)
+
+    async def add_rss_sources(self, sources):
+        return await db.with_transaction(self.pool, db.add_rss_sources, sources)
+
+    async def get_feed_schedules(self):
+        return await db.with_read(self.pool, db.get_feed_schedules)
+
+    async def get_source_publish_stats(self, since):
+        return await db.with_read(self.pool, db.get_source_publish_stats, since)
+
+    async def update_feed_schedules(self, rows):
+        return await db.with_transaction(self.pool, db.update_feed_schedules, rows)
+
+    async def get_recent_articles(self, hours=24):
+        return await db.with_read(self.pool, db.get_recent_articles, hours)
+
+    async def get_all_focuses(self):
+        return await db.with_read(self.pool, db.get_all_focuses)
+
+    async def get_user_ids(self):
+        return await db.with_read(self.pool, db.get_user_ids)
+
+    async def get_focus_filters(self, focus_ids):
+        return await db.with_read(self.pool, db.get_focus_filters, focus_ids)
+
+    async def save_focus_filter(self, focus_id, content_hash, filter_json):
+        return await db.with_transaction(self.pool, db.save_focus_filter, focus_id, content_hash, filter_json)
+
+    async def get_articles_tags(self, article_ids):
+        return await db.with_read(self.pool, db.get_articles_tags, article_ids)
+
+    async def add_focused_contents_batch(self, rows):
+        await db.with_transaction(self.pool, db.add_focused_contents_batch, rows)
+        # 提交后再让缓存失效，避免并发请求在提交前重新缓存旧数据
+        for user_id in {row[0] for row in rows}:
+            db.notify_focus_changed(user_id)
+
+    async def get_focused_articles_page(self, user_id, limit, before=None):
+        return await db.with_read(self.pool, db.get_focused_articles_page, user_id, limit, before)
+
+    async def get_article_detail(self, article_id):
+        return await db.with_read(self.pool, db.get_article_detail, article_id)
+
+    async def update_user_article_statuses(self, user_id, updates):
+        updated = await db.with_transaction(self.pool, db.update_user_article_statuses, user_id, updates)
+        if updated:
+            db.notify_focus_changed(user_id)
+        return updated
+
+    async def get_focused_digest_signatures(self):
+        return await db.with_read(self.pool, db.get_focused_digest_signatures)
+
+    async def get_articles_for_reprocess(self, since=None, source_id=None, after_id=0, limit=500):
+        return await db.with_read(self.pool, db.get_articles_for_reprocess, since=since, source_id=source_id,
+                                  after_id=after_id, limit=limit)
+
+    async def update_articles_content(self, rows):
+        return await db.with_transaction(self.pool, db.update_articles_content, rows)
+
+    def stream_articles_for_classification(self, after_id=0, since=None, chunk_size=5000):
+        return db.stream_articles_for_classification(self.pool, after_id=after_id, since=since, chunk_size=chunk_size)
+
+    async def update_articles_classification(self, rows):
+        return await db.with_transaction(self.pool, db.update_articles_classification, rows)
+
+
+async def open_storage(backend=None):
+    """按 STORAGE_BACKEND 打开存储：mysql（默认）或 sqlite（嵌入式，无需数据库服务）"""
+    database = get_settings().database
+    backend = backend or database.backend
+    if backend == 'sqlite':
+        # 只有使用SQLite时才加载
+        from sqlite_storage import SQLiteStorage
+        return await SQLiteStorage.open(database.sqlite_path)
+    return await MySQLStorage.open()
@@ -0,0 +1,96 @@
+import logging
+import math
+import re
+import unicodedata
+from collections import defaultdict
+
+from metrics import counter, gauge
+from utils import get_env
+
+STORY_CLUSTERS = gauge('insightfocus_story_clusters', '最近一轮关注处理中的事件簇数量')
+STORY_DUPLICATES = counter('insightfocus_story_duplicates_total', '被归入已有事件簇、无需单独判断相关性的文章数')
+
+# 连续的中日韩文字切成相邻字对，拉丁文字与数字按词切分
+_TOKEN_RE = re.compile(r'[぀-ヿ㐀-䶿一-鿿가-힯]+|[a-z0-9]+')
+
+
+class StoryCluster:
+    """同一事件在不同来源的报道：representative用于相关性判断，结果传播给所有members"""
+
+    def __init__(self, representative, members):
+        self.representative = representative
+        self.members = members
+
+    def __len__(self):
+        return len(self.members)
+
+
+def shingles(text):
+    """把标题与摘要规范化后切成词元集合：中日韩文字取相邻字对，拉丁文字取单词，适用于中英文混排"""
+    result = set()
+    for run in _TOKEN_RE.findall(unicodedata.normalize('NFKC', text or '').lower()):
+        if run.isascii() or len(run) == 1:
+            result.add(run)
+        else:
+            result.update(run[i:i + 2] for i in range(len(run) - 1))
+    return result
+
+
+def _article_text(article, summary_chars):
+    return f"{article['title']} {(article.get('summary') or '')[:summary_chars]}"
+
+
+def cluster_stories(articles, threshold=None, max_df=None, summary_chars=300):
+    """按标题+摘要的IDF加权Jaccard相似度把文章聚成事件簇，新闻里常见的词元权重较低。
+    用倒排索引只比较共享词元的文章；出现在太多文章中的词元只与其中最可能成为代表的max_df篇配对，
+    候选数量随文章数线性增长，大量相同转载仍能连到同一个代表。
+    每个成员都必须与簇的代表直接相似（不做传递合并），A≈B、B≈C 时A与C不会因此归入同一簇"""
+    threshold = threshold if threshold is not None else get_env('STORY_CLUSTER_THRESHOLD', 0.35, float)
+    max_df = max_df or get_env('STORY_CLUSTER_MAX_DF', 50, int)
+
+    sets = [shingles(_article_text(article, summary_chars)) for article in articles]
+    index = defaultdict(list)
+    for i, shingle_set in enumerate(sets):
+        for shingle in shingle_set:
+            index[shingle].append(i)
+
+    idf = {shingle: math.log(1 + len(articles) / len(postings)) for shingle, postings in index.items()}
+    weights = [sum(idf[shingle] for shingle in shingle_set) for shingle_set in sets]
+
+    # 摘要最完整的文章优先作为代表，判断依据最充分；代表只吸收尚未归簇、且与自己直接相似的文章
+    order = sorted(range(len(articles)),
+                   key=lambda i: (-len(articles[i].get('summary') or ''), articles[i]['id']))
+    rank = {i: pos for pos, i in enumerate(order)}
+
+    candidates = set()
+    for postings in index.values():
+        if len(postings) < 2:
+            continue
+        if len(postings) <= max_df:
+            for pos, i in enumerate(postings):
+                candidates.update((i, j) for j in postings[pos + 1:])
+            continue
+        for i in sorted(postings, key=rank.get)[:max_df]:
+            candidates.update((min(i, j), max(i, j)) for j in postings if j != i)
+
+    neighbors = defaultdict(set)
+    for i, j in candidates:
+        overlap = sum(idf[shingle] for shingle in sets[i] & sets[j])
+        union = weights[i] + weights[j] - overlap
+        if union and overlap / union >= threshold:
+            neighbors[i].add(j)
+            neighbors[j].add(i)
+
+    assigned = set()
+    clusters = []
+    for i in order:
+        if i in assigned:
+            continue
+        members = [i] + sorted(j for j in neighbors[i] if j not in assigned)
+        assigned.update(members)
+        clusters.append(StoryCluster(articles[i], [articles[j] for j in members]))
+
+    STORY_CLUSTERS.set(len(clusters))
+    STORY_DUPLICATES.inc(len(articles) - len(clusters))
+    logging.info(f"{len(articles)} 篇文章聚合为 {len(clusters)} 个事件簇")
+    return clusters
@@ -4,15 +4,25 @@ import os
 from dateutil import parser
 
 from dotenv import load_dotenv
-from langdetect import detect
-from langdetect.lang_detect_exception import LangDetectException
+
+_env_loaded = False
 
 def hash_text(text):
     if text is None:
         return None
     return hashlib.sha256(text.encode('utf-8')).hexdigest()
 
+def load_env():
+    """只在首次调用时读取.env，之后的查询直接使用os.environ"""
+    global _env_loaded
+    if not _env_loaded:
+        load_dotenv()
+        _env_loaded = True
+
 def detect_language(text):
+    # langdetect加载语言模型较慢，首次检测时才导入
+    from langdetect import detect
+    from langdetect.lang_detect_exception import LangDetectException
     try:
         lang = detect(text)
         if lang == 'zh-cn':
@@ -41,8 +51,8 @@ def parse_datetime(dt_string):
         return None
     
 def get_env(key, default=None, var_type=str):
-    load_dotenv()
-    value = os.getenv(key, default)
+    load_env()
+    value = os.getenv(key)
     if value is None:
         return default
         